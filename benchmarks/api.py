@@ -0,0 +1,204 @@
+"""
+Benchmark of the FeatureCloud API layer against the in-process mock server (benchmarks/mock_server.py).
+
+Measures wall time and request counts of each fcauto subcommand and of a full project
+with N participants: create, join, contribute, monitor and download. No credentials
+or network access are needed.
+
+    python benchmarks/api.py --participants 3 --latency 0.05 --throttle 0.05 --json results.json
+
+All sites run in this process, so they share one rate limit budget per upstream,
+unlike separate nodes. --no-limits lifts the budgets to measure the server alone.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import io
+import json
+import os
+from pathlib import Path
+import tempfile
+import time
+
+from fedflow import fcauto, featurecloud_api
+from fedflow.metrics import get_metrics
+from mock_server import MockFeatureCloud
+
+
+
+def controller_url(i: int) -> str:
+    return f"http://site{i}:8000"
+
+
+
+def fresh_process():
+    """
+    Drop the in-memory state of fcauto, as if the next command ran in a new process.
+    Tokens and cached responses on disk are kept.
+    """
+    featurecloud_api.close_sessions()
+    featurecloud_api._LIMITERS.clear()
+    featurecloud_api.AppTable._shared = None
+
+
+
+def make_server(args, workdir: Path) -> MockFeatureCloud:
+    server = MockFeatureCloud(latency=args.latency, jitter=args.jitter, throttle=args.throttle,
+                              retry_after=args.retry_after, status_delay=args.status_delay, run_time=args.run_time)
+    for i in range(args.participants):
+        server.add_site(f"USER{i}", password=f"PASS{i}", controller=controller_url(i))
+        os.environ[f"USER{i}"] = f"PASS{i}"
+    workdir.mkdir(parents=True, exist_ok=True)
+    featurecloud_api.CACHE_DIR = workdir / "cache"
+    server.install()
+    return server
+
+
+
+def measure(server: MockFeatureCloud, func, *args, **kwargs) -> dict:
+    """
+    Run a function and count the requests it caused
+
+    :param server: MockFeatureCloud the requests go to
+    :param func: function to run
+    :return: wall time, number of requests and 429 responses
+    """
+    before = len(server.requests)
+    t = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func(*args, **kwargs)
+    wall = time.perf_counter() - t
+    new = server.requests[before:]
+    return {"wall": wall, "requests": len(new), "throttled": sum(1 for r in new if r[3] == 429)}
+
+
+
+def bench_subcommands(args, workdir: Path) -> dict:
+    """
+    Run each fcauto subcommand once, in the order of a project, each as a fresh process
+    """
+    server = make_server(args, workdir)
+    data = workdir / "data.csv"
+    data.write_text("x,y\n" + "1,2\n" * 1000)
+    results = {}
+
+    def run(name, argv):
+        fresh_process()
+        results[name] = measure(server, fcauto.main, argv)
+
+    run("list-apps", ["list-apps"])
+    run("create", ["create", "-u", "USER0", "-t", "mean-app", "-n", str(args.participants - 1)])
+    project_id = str(max(server.projects))
+    tokens = list(server.tokens)
+    for i, token in enumerate(tokens, start=1):
+        run(f"join ({i})" if i > 1 else "join", ["join", "-u", f"USER{i}", "-t", token, "-p", project_id])
+    run("query", ["query", "-u", "USER0", "-p", project_id])
+    for i in range(args.participants):
+        run(f"contribute ({i})" if i else "contribute", ["contribute", "-u", f"USER{i}", "-p", project_id,
+            "-d", str(data), "--controller", controller_url(i)])
+    run("monitor", ["monitor", "-u", "USER0", "-p", project_id, "-t", "60", "-i", "5",
+                    "--controller", controller_url(0)])
+    run("download", ["download", "-u", "USER0", "-p", project_id, "-o", str(workdir / "out"),
+                     "--controller", controller_url(0)])
+    run("reset", ["reset", "-u", "USER0", "-p", project_id])
+    server.uninstall()
+    return results
+
+
+
+def bench_flow(args, workdir: Path) -> dict:
+    """
+    Full project with N participants, each site acting in parallel where the workflow allows it
+    """
+    server = make_server(args, workdir)
+    data = workdir / "data.csv"
+    data.write_text("x,y\n" + "1,2\n" * 1000)
+    n = args.participants
+    phases = {}
+
+    def flow():
+        t = time.perf_counter()
+        project_id, tokens = featurecloud_api.create_project_and_tokens(username="USER0", tool="mean-app",
+                                                                        n_participants=n - 1)
+        phases["create"] = time.perf_counter() - t
+        with ThreadPoolExecutor(max_workers=max(1, n)) as pool:
+            t = time.perf_counter()
+            list(pool.map(lambda i: featurecloud_api.join_project(username=f"USER{i}", token=tokens[i - 1],
+                                                                  project_id=project_id), range(1, n)))
+            phases["join"] = time.perf_counter() - t
+
+            def contribute(i):
+                featurecloud_api.contribute_data(username=f"USER{i}", project_id=project_id, data_list=[str(data)],
+                                                 controller=controller_url(i))
+
+            # the coordinator sets the project to 'prepare' with the first upload
+            t = time.perf_counter()
+            contribute(0)
+            list(pool.map(contribute, range(1, n)))
+            phases["contribute"] = time.perf_counter() - t
+            t = time.perf_counter()
+            featurecloud_api.monitor_project(username="USER0", project_id=project_id, timeout=600, max_interval=5,
+                                             controller=controller_url(0))
+            phases["monitor"] = time.perf_counter() - t
+            t = time.perf_counter()
+            list(pool.map(lambda i: featurecloud_api.download_project(username=f"USER{i}", project_id=project_id,
+                                                                      out_dir=str(workdir / f"out{i}"),
+                                                                      controller=controller_url(i)), range(n)))
+            phases["download"] = time.perf_counter() - t
+
+    fresh_process()
+    get_metrics().reset()
+    result = measure(server, flow)
+    result["phases"] = phases
+    result["endpoints"] = dict(server.counts().most_common())
+    result["metrics"] = get_metrics().snapshot()
+    server.uninstall()
+    return result
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark of the FeatureCloud API layer against a mock server")
+    parser.add_argument("-n", "--participants", help="Number of sites, including the coordinator", type=int, default=3)
+    parser.add_argument("-l", "--latency", help="Round trip time of the mock server (in seconds)", type=float, default=0.05)
+    parser.add_argument("--jitter", help="Random extra latency (in seconds)", type=float, default=0.0)
+    parser.add_argument("--throttle", help="Probability of a 429 response", type=float, default=0.0)
+    parser.add_argument("--retry-after", help="Retry-After of 429 responses (in seconds)", type=float, default=1.0)
+    parser.add_argument("--status-delay", help="Time until status changes are visible (in seconds)", type=float, default=0.0)
+    parser.add_argument("--run-time", help="Time a project runs (in seconds)", type=float, default=2.0)
+    parser.add_argument("--no-limits", help="Lift the rate limits of fcauto", action="store_true")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args(argv)
+    if args.no_limits:
+        featurecloud_api.RATE_LIMITS = {upstream: (1000, 1) for upstream in featurecloud_api.RATE_LIMITS}
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            subcommands = bench_subcommands(args, Path(tmp) / "subcommands")
+            flow = bench_flow(args, Path(tmp) / "flow")
+        finally:
+            os.chdir(cwd)
+
+    print(f"fcauto subcommands, {args.latency * 1000:.0f} ms round trip")
+    print(f"  {'command':<16} {'requests':>8} {'429':>5} {'wall':>10}")
+    for name, res in subcommands.items():
+        print(f"  {name:<16} {res['requests']:>8} {res['throttled']:>5} {res['wall'] * 1000:7.1f} ms")
+    print(f"\nfull project, {args.participants} participants")
+    print(f"  {'total':<16} {flow['requests']:>8} {flow['throttled']:>5} {flow['wall'] * 1000:7.1f} ms")
+    for phase, wall in flow["phases"].items():
+        print(f"  {phase:<16} {'':>8} {'':>5} {wall * 1000:7.1f} ms")
+    print("\nrequests per endpoint (sum of latency and time blocked by the rate limit)")
+    print(f"  {'endpoint':<40} {'count':>5} {'retries':>7} {'latency':>10} {'blocked':>10}")
+    for e in sorted(flow["metrics"]["endpoints"], key=lambda e: -e["count"]):
+        print(f"  {e['method'] + ' ' + e['endpoint']:<40} {e['count']:>5} {e['retries']:>7} "
+              f"{e['latency'] * 1000:7.1f} ms {e['blocked'] * 1000:7.1f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "subcommands": subcommands, "flow": flow}, f, indent=2)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""
+In-process stand-in for FeatureCloud.ai and the site controllers, for tests and benchmarks.
+Not part of the fedflow package.
+"""
+import asyncio
+import base64
+from collections import Counter
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from fedflow import featurecloud_api
+from fedflow.featurecloud_api import CONTROLLER_URL, FEATURECLOUD_URL
+from fedflow.metrics import endpoint_template
+
+
+
+def make_jwt(claims: dict) -> str:
+    """
+    Unsigned JWT with the given claims, enough for token_expiry()
+
+    :param claims: payload of the token
+    :return: encoded token
+    """
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip("=")
+    return f"mock.{payload}.signature"
+
+
+
+def read_jwt(token: str) -> dict:
+    """
+    Claims of a token made by make_jwt()
+
+    :param token: encoded token
+    :return: payload, empty if the token is malformed
+    """
+    try:
+        payload = token.split(".")[1]
+        return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (IndexError, ValueError):
+        return {}
+
+
+
+class MockFeatureCloud:
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, throttle: float = 0.0, retry_after: float = 0.0,
+                 status_delay: float = 0.0, run_time: float = 0.5, controller_delay: float = 0.0,
+                 token_ttl: float = 3600, result_size: int = 64 * 1024, seed: int = 0):
+        """
+        In-process stand-in for FeatureCloud.ai and the local controllers of all sites.
+        Implements the endpoints used by featurecloud_api and serves them through httpx.MockTransport,
+        see install(). Requests to featurecloud.ai go to the website, all other hosts to the controller
+        of the site registered with add_site().
+
+        :param latency: seconds added to every response
+        :param jitter: maximum random seconds added on top of the latency
+        :param throttle: probability of answering a FeatureCloud request with 429
+        :param retry_after: Retry-After header of throttled responses
+        :param status_delay: seconds until a status change becomes visible
+        :param run_time: seconds a project stays 'running' before it is 'finished'
+        :param controller_delay: seconds after add_site() during which the controller refuses connections
+        :param token_ttl: lifetime of access tokens in seconds
+        :param result_size: size of the log and result files of a run in bytes
+        :param seed: seed of the random latency and throttling
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.status_delay = status_delay
+        self.run_time = run_time
+        self.controller_delay = controller_delay
+        self.token_ttl = token_ttl
+        self.result_size = result_size
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+        # website state
+        self.users = {}        # username -> password
+        self.sessions = {}     # access token -> username
+        self.refresh_tokens = {}
+        self.apps = {"mean-app": 1, "fc-federated-svd": 2, "fc-random-forest": 3}
+        self.apps_etag = '"apps-v1"'
+        self.purchased = {}    # username -> set of app slugs
+        self.projects = {}     # project id -> dict
+        self.tokens = {}       # participant token -> project id
+        # controllers, keyed by host:port
+        self.sites = {}
+        # (upstream, method, endpoint template, status) of every request
+        self.requests = []
+
+
+    def add_site(self, username: str, password: str = "password", controller: str = CONTROLLER_URL):
+        """
+        Register a user and the controller of their site
+
+        :param username: FeatureCloud username
+        :param password: FeatureCloud password
+        :param controller: URL of the local controller of this site
+        """
+        url = urlsplit(controller)
+        with self.lock:
+            self.users[username] = password
+            self.purchased.setdefault(username, set())
+            self.sites[f"{url.hostname}:{url.port}"] = {
+                "username": username,
+                "ready_at": time.monotonic() + self.controller_delay,
+                "uploads": {},
+            }
+
+
+    def add_project(self, coordinator: str, participants: tuple = (), name: str = "", status: str = "ready") -> int:
+        """
+        Create a project directly, e.g. to start a benchmark in a later phase
+
+        :param coordinator: username of the coordinator
+        :param participants: usernames of the other members
+        :param name: project name
+        :param status: initial status
+        :return: project id
+        """
+        with self.lock:
+            project_id = len(self.projects) + 1
+            members = {user: "participant" for user in participants}
+            members[coordinator] = "coordinator"
+            self.projects[project_id] = {
+                "id": project_id, "name": name, "status": status, "pending": None,
+                "members": members, "finalized": set(), "runs": [], "finish_at": None,
+            }
+            return project_id
+
+
+    def counts(self, upstream: str | None = None) -> Counter:
+        """
+        Number of requests per endpoint
+
+        :param upstream: 'featurecloud' or 'controller', defaults to both
+        :return: Counter of 'METHOD /endpoint/template/'
+        """
+        with self.lock:
+            return Counter(f"{method} {path}" for up, method, path, _ in self.requests
+                           if upstream is None or up == upstream)
+
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+
+    def async_transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle_async)
+
+
+    def install(self):
+        """
+        Route all requests of featurecloud_api and featurecloud_api_async of this process to this server
+        """
+        featurecloud_api.set_network(self.transport(), self.async_transport())
+
+
+    @staticmethod
+    def uninstall():
+        featurecloud_api.set_network(None, None)
+
+
+    def __enter__(self):
+        self.install()
+        return self
+
+
+    def __exit__(self, *exc):
+        self.uninstall()
+
+
+    def _delay(self) -> float:
+        with self.lock:
+            return self.latency + self.random.uniform(0, self.jitter)
+
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        time.sleep(self._delay())
+        return self.dispatch(request)
+
+
+    async def handle_async(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        await asyncio.sleep(self._delay())
+        return self.dispatch(request)
+
+
+    def dispatch(self, request: httpx.Request) -> httpx.Response:
+        """
+        Answer a request with its body already read
+
+        :param request: httpx.Request
+        :raises httpx.ConnectError: for controllers that are unknown or not ready yet
+        :return: httpx.Response
+        """
+        website = f"{request.url.scheme}://{request.url.host}" == FEATURECLOUD_URL
+        upstream = "featurecloud" if website else "controller"
+        with self.lock:
+            if website:
+                response = self._website(request)
+            else:
+                response = self._controller(request)
+            self.requests.append((upstream, request.method, endpoint_template(request.url.path), response.status_code))
+        return response
+
+
+    # website
+
+    def _new_tokens(self, username: str) -> dict:
+        now = time.time()
+        access = make_jwt({"sub": username, "exp": now + self.token_ttl, "jti": self.random.random()})
+        refresh = make_jwt({"sub": username, "exp": now + 24 * 3600, "jti": self.random.random()})
+        self.sessions[access] = username
+        self.refresh_tokens[refresh] = username
+        return {"access": access, "refresh": refresh}
+
+
+    def _authorized_user(self, request: httpx.Request) -> str | None:
+        auth = request.headers.get("Authorization", "")
+        token = auth.removeprefix("Bearer ")
+        # tokens are stateless like signed JWTs, so tokens cached by an earlier server stay valid
+        username = self.sessions.get(token) or read_jwt(token).get("sub")
+        if username not in self.users or featurecloud_api.token_expired(token, margin=0):
+            return None
+        return username
+
+
+    def _website(self, request: httpx.Request) -> httpx.Response:
+        if self.throttle and self.random.random() < self.throttle:
+            return httpx.Response(429, headers={"Retry-After": str(self.retry_after)})
+        path, method = request.url.path, request.method
+        body = json.loads(request.content) if request.content else {}
+        if path == "/api/auth/login/" and method == "POST":
+            if self.users.get(body.get("username")) != body.get("password"):
+                return httpx.Response(401, json={"detail": "Invalid credentials"})
+            return httpx.Response(200, json=self._new_tokens(body["username"]))
+        if path == "/api/auth/token/refresh/" and method == "POST":
+            refresh = body.get("refresh") or ""
+            username = self.refresh_tokens.get(refresh) or read_jwt(refresh).get("sub")
+            if featurecloud_api.token_expired(refresh, margin=0):
+                username = None
+            if username is None:
+                return httpx.Response(401, json={"detail": "Invalid refresh token"})
+            return httpx.Response(200, json={"access": self._new_tokens(username)["access"]})
+        # the app catalog is public
+        if path == "/api/apps/":
+            if request.headers.get("If-None-Match") == self.apps_etag:
+                return httpx.Response(304, headers={"ETag": self.apps_etag})
+            apps = [{"slug": slug, "id": app_id} for slug, app_id in self.apps.items()]
+            return httpx.Response(200, json=apps, headers={"ETag": self.apps_etag})
+        user = self._authorized_user(request)
+        if user is None:
+            return httpx.Response(401, json={"detail": "Not authenticated"})
+        if path == "/api/user/info/":
+            return httpx.Response(200, json={"username": user})
+        if path == "/api/site/":
+            return httpx.Response(200, json={"name": user})
+        if path == "/api/apps/purchase/":
+            return httpx.Response(200, json=[{"slug": s, "id": self.apps[s]} for s in sorted(self.purchased[user])])
+        if match := re.fullmatch(r"/api/apps/(\d+)/purchase/", path):
+            slugs = [slug for slug, app_id in self.apps.items() if app_id == int(match[1])]
+            if not slugs:
+                return httpx.Response(404)
+            if method == "POST":
+                self.purchased[user].add(slugs[0])
+            elif method == "DELETE":
+                self.purchased[user].discard(slugs[0])
+            return httpx.Response(200, json={})
+        if path == "/api/projects/" and method == "POST":
+            project_id = self.add_project(user, name=body.get("name", ""), status="init")
+            return httpx.Response(201, json={"id": project_id, "name": body.get("name", ""), "status": "init"})
+        if match := re.fullmatch(r"/api/projects/(\d+)/", path):
+            return self._project(int(match[1]), user, method, body)
+        if match := re.fullmatch(r"/api/project-tokens/(\d+)/", path):
+            project = self.projects.get(int(match[1]))
+            if project is None or project["members"].get(user) != "coordinator":
+                return httpx.Response(403)
+            token = f"{project['id']}-{len(self.tokens) + 1}-{self.random.randrange(16 ** 8):08x}"
+            self.tokens[token] = project["id"]
+            return httpx.Response(201, json={"id": len(self.tokens), "token": token, "project": project["id"]})
+        if path == "/api/project-tokens/" and method == "POST":
+            project_id = self.tokens.pop(body.get("token"), None)
+            if project_id is None:
+                return httpx.Response(404, json={"detail": "Invalid token"})
+            self.projects[project_id]["members"].setdefault(user, "participant")
+            return httpx.Response(200, json={"project": project_id})
+        return httpx.Response(404)
+
+
+    def _update(self, project: dict):
+        """
+        Apply delayed status changes and finish runs that are over
+        """
+        now = time.monotonic()
+        pending = project["pending"]
+        if pending and now >= pending[1]:
+            project["status"], project["pending"] = pending[0], None
+        if project["status"] == "running" and now >= project["finish_at"]:
+            project["status"] = "finished"
+            run = len(project["runs"]) + 1
+            project["runs"].append({"runNr": run, "startedOn": "", "logSteps": [0], "resultSteps": [0]})
+
+
+    def _set_status(self, project: dict, status: str):
+        project["pending"] = (status, time.monotonic() + self.status_delay)
+        if not self.status_delay:
+            self._update(project)
+
+
+    def _project(self, project_id: int, user: str, method: str, body: dict) -> httpx.Response:
+        project = self.projects.get(project_id)
+        if project is None or user not in project["members"]:
+            return httpx.Response(404)
+        self._update(project)
+        if method == "PUT":
+            status = body.get("status")
+            if "workflow" in body:
+                project["workflow"] = body["workflow"]
+            if status == "prepare":
+                if project["members"][user] != "coordinator" or project["status"] != "ready":
+                    return httpx.Response(400, json={"detail": f"Cannot prepare from {project['status']}"})
+                project["finalized"] = set()
+            elif status == "shutdown":
+                status = "stopped" if project["status"] == "running" else project["status"]
+            elif status == "ready":
+                project["finalized"] = set()
+            if status:
+                self._set_status(project, status)
+        elif method != "GET":
+            return httpx.Response(405)
+        data = {"id": project_id, "name": project["name"], "status": project["status"],
+                "role": project["members"][user]}
+        return httpx.Response(200, json=data)
+
+
+    # controller
+
+    def _controller(self, request: httpx.Request) -> httpx.Response:
+        site = self.sites.get(f"{request.url.host}:{request.url.port}")
+        if site is None or time.monotonic() < site["ready_at"]:
+            raise httpx.ConnectError("Connection refused", request=request)
+        path, params = request.url.path, request.url.params
+        if path == "/ping/":
+            return httpx.Response(200, text="pong")
+        project = self.projects.get(int(params.get("projectId", 0) or 0))
+        if project is None or site["username"] not in project["members"]:
+            return httpx.Response(404)
+        self._update(project)
+        if path == "/file-upload/" and request.method == "POST":
+            if project["status"] != "prepare":
+                return httpx.Response(400, text=f"Project is {project['status']}")
+            length = request.headers.get("Content-Length")
+            if length is not None and int(length) != len(request.content):
+                return httpx.Response(400, text="Content-Length mismatch")
+            if params.get("fileName"):
+                site["uploads"][params["fileName"]] = len(request.content)
+            if params.get("finalize") == "true":
+                project["finalized"].add(site["username"])
+                if project["finalized"] >= set(project["members"]):
+                    project["status"] = "running"
+                    project["finish_at"] = time.monotonic() + self.run_time
+            return httpx.Response(200, text="ok")
+        if path == "/project-runs/":
+            return httpx.Response(200, json=project["runs"])
+        if path in ("/logs-download/", "/file-download/"):
+            run = int(params.get("run", 0))
+            if run not in [r["runNr"] for r in project["runs"]]:
+                return httpx.Response(404)
+            content = (f"{path}{project['id']}/{run}/{params.get('step')}".encode() * self.result_size)[:self.result_size]
+            etag = f'"{hashlib.md5(content).hexdigest()}"'
+            if "Range" in request.headers and request.headers.get("If-Range", etag) == etag:
+                offset = int(request.headers["Range"].split("=")[1].rstrip("-"))
+                if offset >= len(content):
+                    return httpx.Response(416)
+                return httpx.Response(206, content=content[offset:], headers={"ETag": etag})
+            return httpx.Response(200, content=content, headers={"ETag": etag})
+        return httpx.Response(404)
@@ -0,0 +1,142 @@
+"""
+Startup benchmark of the fedflow and fcauto CLIs.
+
+Measures the import time of the entry points in fresh interpreters, the wall time of 'fedflow -t'
+and, for each fcauto subcommand, the number of requests and the latency until the first request
+against a mock FeatureCloud with a fixed round trip time. Subcommands run once with an empty
+cache (cold) and once with cached tokens and catalog (warm).
+
+    python benchmarks/startup.py --latency 0.05 --repeat 5
+"""
+import argparse
+import contextlib
+import io
+import os
+from pathlib import Path
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from mock_server import MockFeatureCloud
+
+
+ENTRY_POINTS = ["fedflow.cli", "fedflow.fcauto", "fedflow.featurecloud_api"]
+
+SUBCOMMANDS = {
+    "list-apps": ["list-apps"],
+    "query": ["query", "-u", "BENCH_USER", "-p", "1"],
+    "reset": ["reset", "-u", "BENCH_USER", "-p", "1"],
+    "join": ["join", "-u", "BENCH_USER", "-t", "token", "-p", "1"],
+    "create": ["create", "-u", "BENCH_USER", "-t", "mean-app", "-n", "2"],
+}
+
+
+
+def import_time(module: str, repeat: int) -> float:
+    """
+    Time the import of a module in fresh interpreters
+
+    :param module: dotted module name
+    :param repeat: number of interpreters
+    :return: median import time in seconds
+    """
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        times.append(float(out.stdout.strip()))
+    return statistics.median(times)
+
+
+
+def template_time(repeat: int) -> float:
+    """
+    Time 'fedflow -t' end to end, including interpreter startup
+
+    :param repeat: number of runs
+    :return: median wall time in seconds
+    """
+    times = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for _ in range(repeat):
+            t = time.perf_counter()
+            subprocess.run([sys.executable, "-m", "fedflow.cli", "-t"], cwd=tmp, capture_output=True, check=True)
+            times.append(time.perf_counter() - t)
+    return statistics.median(times)
+
+
+
+def run_subcommand(argv: list[str], latency: float, cache_dir: Path) -> dict:
+    """
+    Run an fcauto subcommand in this process against the mock upstream
+
+    :param argv: arguments of fcauto
+    :param latency: round trip time of the mock
+    :param cache_dir: fcauto cache directory, reused between runs
+    :return: request count, time to first request and wall time
+    """
+    from fedflow import fcauto, featurecloud_api
+
+    server = MockFeatureCloud(latency=latency)
+    server.add_site("BENCH_USER")
+    server.tokens["token"] = server.add_project("BENCH_USER")
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(time.perf_counter())
+        return server.handle(request)
+
+    # fresh process state, only the on-disk cache is kept
+    # the rate limit budget is reset as if the previous command ran a while ago
+    shutil.rmtree(cache_dir / "ratelimit", ignore_errors=True)
+    featurecloud_api.CACHE_DIR = cache_dir
+    featurecloud_api._LIMITERS.clear()
+    featurecloud_api.AppTable._shared = None
+    featurecloud_api.set_network(httpx.MockTransport(handler))
+    t = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        fcauto.main(argv)
+    wall = time.perf_counter() - t
+    featurecloud_api.set_network(None)
+    first = sent[0] - t if sent else None
+    return {"requests": len(sent), "first": first, "wall": wall,
+            "paths": [f"{method} {path}" for _, method, path, _ in server.requests]}
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Startup benchmark of fedflow and fcauto")
+    parser.add_argument("-l", "--latency", help="Round trip time of the mock upstream (in seconds)", type=float, default=0.05)
+    parser.add_argument("-r", "--repeat", help="Number of interpreters per import measurement", type=int, default=5)
+    parser.add_argument("-v", "--verbose", help="Print the requests of each subcommand", action="store_true")
+    args = parser.parse_args(argv)
+
+    print("import time (median)")
+    for module in ENTRY_POINTS:
+        print(f"  {module:<28} {import_time(module, args.repeat) * 1000:8.1f} ms")
+    print(f"  {'fedflow -t (wall)':<28} {template_time(args.repeat) * 1000:8.1f} ms")
+
+    print(f"\nfcauto subcommands, {args.latency * 1000:.0f} ms round trip")
+    print(f"  {'command':<12} {'cache':<6} {'requests':>8} {'first req':>10} {'wall':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        os.environ["BENCH_USER"] = "password"
+        for name, cmd in SUBCOMMANDS.items():
+            cache_dir = Path(tmp) / f"cache_{name}"
+            for label in ("cold", "warm"):
+                res = run_subcommand(cmd, latency=args.latency, cache_dir=cache_dir)
+                first = f"{res['first'] * 1000:8.1f} ms" if res["first"] is not None else f"{'-':>11}"
+                print(f"  {name:<12} {label:<6} {res['requests']:>8} {first:>10} {res['wall'] * 1000:7.1f} ms")
+                if args.verbose:
+                    for path in res["paths"]:
+                        print(f"      {path}")
+
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,210 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from glob import glob
+import importlib
+import io
+import json
 from pathlib import Path
+import re
+import hashlib
 import shutil
 import shlex
+import subprocess
+import sys
 import tarfile
+import time
+
+from fedflow.agent import AGENT_TIMEOUT, RemoteAgent
+from fedflow.featurecloud_api import CONTROLLER_URL, PREPARE_TIMEOUT
+from fedflow.logger import log
+from fedflow.utils import DigestCache, file_digest, human_size
+
+
+
+# fingerprint of the installation in the venv of a node, written by install_package
+INSTALL_MARKER = ".venv/.fedflow_install"
+# local wheels of fedflow and its dependencies, one directory per platform of the nodes
+WHEELHOUSE = Path("dist/wheelhouse")
+# prints the install marker (digests of the fedflow wheel and of the dependency set)
+# and the python version, machine and libc of a node
+INSTALL_PROBE = (f"cat {INSTALL_MARKER} 2>/dev/null; echo; python3 -c 'import platform, sys; "
+                 "print(f\"{sys.version_info[0]}.{sys.version_info[1]}\", platform.machine(), *platform.libc_ver())'")
+# hashes of the data files on a node, written by distribute_data
+DATA_MANIFEST = ".fedflow_manifest.json"
+# sets and prints the controller URL of a node as fcauto resolves it: from the .env, the environment or the default
+CONTROLLER_URL_PROBE = "; ".join([
+    "url=$(sed -n 's/^FEDFLOW_CONTROLLER_URL=//p' .env 2>/dev/null | tail -n 1)",
+    f"url=${{url:-${{FEDFLOW_CONTROLLER_URL:-{CONTROLLER_URL}}}}}",
+    "echo url=$url",
+])
+# prints state, image, mounts and health of the FeatureCloud controller of a node as key=value lines
+CONTROLLER_PROBE = "; ".join([
+    "echo running=$(docker inspect -f '{{.State.Running}}' fc-controller 2>/dev/null)",
+    "echo image=$(docker inspect -f '{{.Image}}' fc-controller 2>/dev/null)",
+    "echo latest=$(docker image inspect -f '{{.Id}}' featurecloud.ai/controller 2>/dev/null)",
+    "echo mounts=$(docker inspect -f '{{range .Mounts}}{{.Source}} {{end}}' fc-controller 2>/dev/null)",
+    "echo data_dir=$PWD/data_fc",
+    CONTROLLER_URL_PROBE,
+    'echo healthy=$(curl -sf -m 2 -o /dev/null "${url%/}/ping/" && echo true)',
+])
+# remote compression command and local tarfile mode of each archive compression
+ARCHIVE_COMPRESSION = {
+    "none": ("", "r|"),
+    "gzip": (" | gzip -c", "r|gz"),
+    "zstd": (" | zstd -q -c", "r|"),
+}
+
+
+
+def build_wheelhouse(requirement: str, target: str, dest: Path) -> list[Path] | None:
+    """
+    Download the wheels of a requirement and all its dependencies for the platform of some nodes.
+    The wheelhouse is reused as long as the requirement is unchanged.
+
+    :param requirement: pip requirement, e.g. 'dist/fedflow-0.1-py3-none-any.whl[http2]'
+    :param target: python version, machine and libc of the nodes, e.g. '3.12 x86_64 glibc 2.39'
+    :param dest: directory of the wheelhouse
+    :return: paths of the wheels, None if no complete set of wheels exists for the target
+    """
+    version, machine, *libc = target.split()
+    if libc[:1] != ["glibc"]:
+        log(f"No wheelhouse for {target}, only glibc platforms are supported")
+        return None
+    key = f"{requirement} {file_digest(requirement.split('[')[0])}"
+    key_file = dest / ".requirement"
+    if key_file.is_file() and key_file.read_text() == key:
+        return sorted(dest.glob("*.whl"))
+    shutil.rmtree(dest, ignore_errors=True)
+    dest.mkdir(parents=True)
+    # pip takes custom platforms literally, so every older manylinux tag the node supports is listed
+    glibc_major, glibc_minor = (int(v) for v in libc[1].split(".")[:2])
+    platforms = [f"manylinux_{glibc_major}_{minor}_{machine}" for minor in range(glibc_minor, 16, -1)]
+    platforms.append(f"manylinux2014_{machine}")
+    cmd = [sys.executable, "-m", "pip", "download", requirement, "--dest", str(dest), "--only-binary=:all:",
+           "--python-version", version, "--implementation", "cp", "-q"]
+    for platform in platforms:
+        cmd += ["--platform", platform]
+    res = subprocess.run(cmd, capture_output=True, text=True)
+    if res.returncode != 0:
+        err = res.stderr.strip().splitlines()
+        log(f"Could not build a wheelhouse for {target}: {err[-1] if err else res.returncode}")
+        return None
+    key_file.write_text(key)
+    return sorted(dest.glob("*.whl"))
+
+
+
+def controller_mismatch(probe: str) -> str | None:
+    """
+    Check whether a running controller can be reused: it answers pings, runs the local
+    controller image and has the data directory of fedflow mounted.
+
+    :param probe: output of CONTROLLER_PROBE
+    :return: why the controller can't be reused, None if it can
+    """
+    state = dict(line.split("=", 1) for line in probe.splitlines() if "=" in line)
+    if state.get("running") != "true":
+        return "controller is not running"
+    if state.get("healthy") != "true":
+        return "controller does not answer"
+    if state.get("image") != state.get("latest"):
+        return "controller image is outdated"
+    if state.get("data_dir") not in state.get("mounts", "").split():
+        return "controller uses a different data directory"
+    return None
+
+
+
+def zstd_module():
+    """
+    :return: zstd module of the standard library (Python 3.14+) or the zstandard package, None if neither is installed
+    """
+    for name in ("compression.zstd", "zstandard"):
+        try:
+            return importlib.import_module(name)
+        except ImportError:
+            continue
+    return None
+
+
+
+class CountingReader:
+
+    def __init__(self, f):
+        """
+        File wrapper that counts the bytes read from it
+
+        :param f: binary file object
+        """
+        self.f = f
+        self.bytes = 0
+
+
+    def read(self, n: int = -1) -> bytes:
+        data = self.f.read(n)
+        self.bytes += len(data)
+        return data
+
+
+
+def archive_command(paths: list[str], exclude: list[str] | None = None, compression: str = "none") -> str:
+    """
+    Shell command that writes a tar archive of some paths to stdout.
+    Missing paths are skipped, so include filters may name runs that don't exist.
+
+    :param paths: paths to archive, relative to the home directory
+    :param exclude: tar patterns of members to leave out, e.g. '*.tar'
+    :param compression: one of ARCHIVE_COMPRESSION
+    :return: command line
+    """
+    cmd = "set -o pipefail; sudo tar -cf - --ignore-failed-read"
+    for pattern in exclude or []:
+        cmd += f" --exclude={shlex.quote(pattern)}"
+    cmd += " -- " + " ".join(shlex.quote(p) for p in paths)
+    return cmd + ARCHIVE_COMPRESSION[compression][0]
 
 
 
+def stream_archive(cxn, command: str, dest: Path, compression: str = "none") -> tuple[int, int]:
+    """
+    Run an archiving command on a node and extract its output locally as it arrives
+    over the SSH channel, without a temporary archive on either side.
+
+    :param cxn: fabric Connection of the node
+    :param command: command that writes a tar archive to stdout, see archive_command
+    :param dest: local directory to extract to
+    :param compression: one of ARCHIVE_COMPRESSION, as used in the command
+    :raises RuntimeError: if the command fails on the node
+    :return: number of extracted members and bytes received
+    """
+    cxn.open()
+    channel = cxn.client.get_transport().open_session()
+    try:
+        channel.exec_command(command)
+        reader = CountingReader(channel.makefile("rb"))
+        source = reader
+        if compression == "zstd":
+            zstd = zstd_module()
+            source = zstd.ZstdFile(reader) if hasattr(zstd, "ZstdFile") else zstd.ZstdDecompressor().stream_reader(reader)
+        try:
+            with tarfile.open(fileobj=source, mode=ARCHIVE_COMPRESSION[compression][1]) as tar:
+                tar.extractall(dest)
+                n_members = len(tar.getmembers())
+        except Exception as e:
+            # a failed remote command leaves an empty or cut off stream, its error explains why
+            status = channel.recv_exit_status()
+            if status == 0:
+                raise
+            err = channel.makefile_stderr("rb").read().decode(errors="replace").strip()
+            raise RuntimeError(f"archiving failed on {cxn.host} (exit status {status}): {err}") from e
+        status = channel.recv_exit_status()
+        if status != 0:
+            err = channel.makefile_stderr("rb").read().decode(errors="replace").strip()
+            raise RuntimeError(f"archiving failed on {cxn.host} (exit status {status}): {err}")
+    finally:
+        channel.close()
+    return n_members, reader.bytes
+
+
 
 class ClientManager:
 
@@ -26,6 +225,8 @@ class ClientManager:
         # # remotes are separated into participants and coordinator
         self.participants = []
         self.coordinator = []
+        # persistent fcauto agents, keyed by connection
+        self.agents = {}
         # add some info from the config file to each connection
         for cxn_t, cxn_s, cinfo in zip(threadg, serialg, clients):
             user = cinfo.fc_username
@@ -43,6 +244,81 @@ class ClientManager:
         
 
 
+    @staticmethod
+    def _cxn_key(cxn) -> str:
+        return f"{cxn.user}@{cxn.host}:{cxn.port}"
+
+
+    def _agent(self, cxn) -> RemoteAgent | None:
+        """
+        Get the running agent of a node, if agents were started
+
+        :param cxn: fabric Connection of the node
+        :return: RemoteAgent or None
+        """
+        if not self.agents:
+            return None
+        return self.agents.get(self._cxn_key(cxn))
+
+
+    def start_agents(self) -> None:
+        """
+        Start a persistent fcauto agent on all nodes. Subsequent project commands
+        are sent to the agents instead of starting a new fcauto process each time.
+        """
+        def start(cxn):
+            agent = RemoteAgent(cxn)
+            agent.start()
+            return agent
+
+        with ThreadPoolExecutor(max_workers=max(1, len(self.threadg))) as pool:
+            agents = list(pool.map(start, self.threadg))
+        for cxn, agent in zip(self.threadg, agents):
+            self.agents[self._cxn_key(cxn)] = agent
+
+
+    def stop_agents(self) -> None:
+        """
+        Shut down all agents.
+        """
+        for agent in self.agents.values():
+            agent.close()
+        self.agents = {}
+
+
+    @staticmethod
+    def _run_on_nodes(func, nodes, action: str, jobs: int = 8, describe=None) -> dict:
+        """
+        Run a function for several nodes concurrently. All nodes are attempted before failures are reported.
+
+        :param func: function of a fabric Connection, returning the stats of the node
+        :param nodes: fabric Connections
+        :param action: what the nodes do, for messages, e.g. 'receive their data'
+        :param jobs: maximum number of nodes at the same time
+        :param describe: function that formats the stats of a node for the log
+        :raises RuntimeError: If func failed for any node, listing each failed site
+        :return: return values of func, keyed by node (user@host:port)
+        """
+        report, failed = {}, {}
+        with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(nodes)))) as pool:
+            futures = {pool.submit(func, cxn): cxn for cxn in nodes}
+            for future in as_completed(futures):
+                cxn = futures[future]
+                # nodes behind one host differ in user or port
+                key = ClientManager._cxn_key(cxn)
+                try:
+                    report[key] = future.result()
+                    if describe:
+                        log(f"{cxn.host}: {describe(report[key])}")
+                except Exception as e:
+                    log(f"{cxn.host}: failed to {action}: {e}")
+                    failed[key] = str(e).strip().splitlines()[-1] if str(e).strip() else repr(e)
+        if failed:
+            summary = "; ".join(f"{host}: {err}" for host, err in failed.items())
+            raise RuntimeError(f"{len(failed)}/{len(nodes)} nodes failed to {action}: {summary}")
+        return report
+
+
     def ping(self) -> None:
         """
         Ping all nodes to check connectivity.
@@ -61,43 +337,223 @@ class ClientManager:
         self.threadg.put(script_path, Path(script_path).name)
         cmd = f"bash {Path(script_path).name}"
         self.threadg.run(cmd)
-    
 
-    def install_package(self, reinstall: bool = False, nodeps: bool = False) -> None:
+
+    def provision(self, script_path: str, check: str, reprovision: bool = False, jobs: int = 8) -> dict:
+        """
+        Run the provision script on all nodes that aren't provisioned with it yet.
+        The check costs a single command per node, the script is only sent to nodes that need it.
+
+        :param script_path: path to the provision script
+        :param check: shell command that prints 'provisioned' if a node is up to date
+        :param reprovision: whether to run the script on all nodes regardless of the check
+        :param jobs: maximum number of nodes to provision at the same time
+        :raises RuntimeError: If provisioning failed on any node, listing each failed site
+        :return: whether the script ran and seconds of each node, keyed by node (user@host:port)
+        """
+        assert Path(script_path).is_file(), f"{script_path} is not a file."
+        name = Path(script_path).name
+
+        def provision(cxn):
+            start = time.monotonic()
+            if not reprovision and str(cxn.run(check, hide=True).stdout).strip() == "provisioned":
+                return {"ran": False, "seconds": time.monotonic() - start}
+            cxn.put(script_path, name)
+            cxn.run(f"FEDFLOW_REPROVISION={int(reprovision)} bash {name}")
+            return {"ran": True, "seconds": time.monotonic() - start}
+
+        def describe(stats):
+            state = "provisioned" if stats["ran"] else "already provisioned, skipped"
+            return f"{state} in {stats['seconds']:.1f}s"
+
+        return self._run_on_nodes(provision, nodes=self.threadg, action="provision", jobs=jobs, describe=describe)
+
+
+    def install_package(self, reinstall: bool = False, nodeps: bool = False, extras: list[str] | None = None,
+                        offline: bool = True, jobs: int = 8) -> dict:
         """
         Install the package on all nodes.
         TODO this is used because the package is not on PyPI, so the wheel is transferred and installed locally.
-        
+        Nodes whose venv already holds the same wheel and dependency set are skipped.
+        With offline, the wheels of all dependencies are downloaded once into a local wheelhouse
+        per node platform, pushed to the nodes (only those they don't have yet) and installed without PyPI.
+        If no wheelhouse can be built for a platform, its nodes install from PyPI.
+
         :param reinstall: whether to force reinstall the package
         :param nodeps: whether to skip installing dependencies
+        :param extras: optional dependencies to install, e.g. ['http2']
+        :param offline: whether to install from a pushed wheelhouse instead of PyPI
+        :param jobs: maximum number of nodes to install on at the same time
+        :raises RuntimeError: If the installation failed on any node, listing each failed site
+        :return: whether the package was installed, wheels sent and seconds of each node, keyed by node (user@host:port)
         """
         # find the wheel file for installation
         whl = glob("dist/fedflow-*.whl")[0]
         whl_name = Path(whl).name
-        self.threadg.put(whl, remote=whl_name)
-        self.threadg.run("python3 -m venv .venv")
-        install_cmd = f"source .venv/bin/activate && pip install {whl_name}"
-        if reinstall:
-            install_cmd += " --force-reinstall"
-        if nodeps:
-            install_cmd += " --no-deps"
-        self.threadg.run(install_cmd)
-        
+        suffix = f"[{','.join(extras)}]" if extras else ""
+
+        def probe(cxn):
+            marker, _, target = str(cxn.run(INSTALL_PROBE, hide=True).stdout).strip("\n").rpartition("\n")
+            wheel, _, env = marker.strip().partition(" ")
+            return {"wheel": wheel, "env": env, "target": target.strip()}
+
+        probes = self._run_on_nodes(probe, nodes=self.threadg, action="report their installation", jobs=jobs)
+        wheelhouses = {}
+        if offline and not nodeps:
+            for target in sorted({p["target"] for p in probes.values()}):
+                dest = WHEELHOUSE / "-".join(target.split())
+                wheelhouses[target] = build_wheelhouse(f"{whl}{suffix}", target=target, dest=dest)
+                if wheelhouses[target] is None:
+                    log(f"No wheelhouse for nodes with {target}, they install the dependencies from PyPI")
+        wheel_digest = file_digest(whl)
+
+        def install(cxn):
+            start = time.monotonic()
+            target = probes[self._cxn_key(cxn)]["target"]
+            wheels = wheelhouses.get(target)
+            lock = sorted(w.name for w in wheels) if wheels else "pypi"
+            env = hashlib.sha256(json.dumps([extras or [], nodeps, lock]).encode()).hexdigest()
+            installed = probes[self._cxn_key(cxn)]
+            if (installed["wheel"], installed["env"]) == (wheel_digest, env) and not reinstall:
+                return {"installed": False, "wheels": 0, "seconds": time.monotonic() - start}
+            cxn.run("[ -x .venv/bin/python ] || python3 -m venv .venv", hide=True)
+            sent = 0
+            if wheels:
+                present = set(str(cxn.run("mkdir -p wheelhouse && ls wheelhouse", hide=True).stdout).split())
+                for wheel in wheels:
+                    # wheels from PyPI never change under the same name, the fedflow wheel might
+                    if wheel.name not in present or wheel.name == whl_name:
+                        cxn.put(str(wheel), remote=f"wheelhouse/{wheel.name}")
+                        sent += 1
+                remote_whl = f"wheelhouse/{whl_name}"
+                pip = "source .venv/bin/activate && pip install --no-index --find-links wheelhouse"
+            else:
+                cxn.put(whl, remote=whl_name)
+                sent = 1
+                remote_whl = whl_name
+                pip = "source .venv/bin/activate && pip install"
+            install_cmd = f"{pip} {shlex.quote(remote_whl + suffix)}"
+            if reinstall:
+                install_cmd += " --force-reinstall"
+            if nodeps:
+                install_cmd += " --no-deps"
+            cxn.run(install_cmd)
+            # pip keeps an installed fedflow of the same version, a rebuilt wheel has to be forced
+            if installed["wheel"] != wheel_digest and not reinstall:
+                cxn.run(f"{pip} --force-reinstall --no-deps {shlex.quote(remote_whl)}")
+            cxn.run(f"echo {wheel_digest} {env} > {INSTALL_MARKER}", hide=True)
+            return {"installed": True, "wheels": sent, "seconds": time.monotonic() - start}
+
+        def describe(stats):
+            if not stats["installed"]:
+                return "fedflow is up to date"
+            return f"installed fedflow, sent {stats['wheels']} wheel(s), in {stats['seconds']:.1f}s"
+
+        return self._run_on_nodes(install, nodes=self.threadg, action="install fedflow", jobs=jobs, describe=describe)
+
+
+    def distribute_data(self, sync: bool = True, jobs: int = 8) -> dict:
+        """
+        Load the data defined in the config file onto all nodes, concurrently across nodes.
+        With sync, files whose content is already on a node are skipped. Each node keeps a manifest
+        of the hashes of its files, an entry is only trusted while size and modification time
+        of the remote file are unchanged. All nodes are attempted before failures are reported.
+
+        :param sync: skip files that are already on a node, otherwise upload all files
+        :param jobs: maximum number of nodes to upload to at the same time
+        :raises RuntimeError: If the upload failed on any node, listing each failed site
+        :return: uploaded and skipped files, bytes and seconds of each node, keyed by node (user@host:port)
+        """
+        digests = {}
+        if sync:
+            # hash each local file once, unchanged files are taken from the cache of the previous run
+            cache = DigestCache()
+            paths = sorted({str(p) for cxn in self.threadg for p in cxn['data']})
+            with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(paths)))) as pool:
+                digests = dict(zip(paths, pool.map(cache.digest, paths)))
+            cache.save()
+
+        def upload(cxn):
+            start = time.monotonic()
+            files = {Path(p).name: str(p) for p in cxn['data']}
+            manifest = self._read_manifest(cxn, names=list(files)) if sync else {}
+            uploaded, skipped, size = [], [], 0
+            for name, local_path in files.items():
+                if sync and manifest.get(name, {}).get("sha256") == digests[local_path]:
+                    skipped.append(name)
+                    continue
+                cxn.put(local_path, remote=name)
+                uploaded.append(name)
+                size += Path(local_path).stat().st_size
+            if sync and uploaded:
+                self._write_manifest(cxn, manifest=manifest, digests={n: digests[files[n]] for n in uploaded})
+            return {"uploaded": uploaded, "skipped": skipped, "bytes": size, "seconds": time.monotonic() - start}
+
+        def describe(stats):
+            return (f"uploaded {len(stats['uploaded'])} file(s), {human_size(stats['bytes'])}, "
+                    f"{len(stats['skipped'])} unchanged, in {stats['seconds']:.1f}s")
+
+        return self._run_on_nodes(upload, nodes=self.threadg, action="receive their data", jobs=jobs, describe=describe)
+
+
+    @staticmethod
+    def _stat_remote(cxn, names: list[str]) -> dict:
+        """
+        :param cxn: fabric Connection of the node
+        :param names: file names in the home directory of the node
+        :return: size and modification time of the existing files, keyed by name
+        """
+        if not names:
+            return {}
+        files = " ".join(shlex.quote(n) for n in names)
+        res = cxn.run(f"stat -c '%s %Y %n' -- {files} 2>/dev/null; true", hide=True)
+        stats = {}
+        for line in str(res.stdout).splitlines():
+            size, mtime, name = line.split(" ", 2)
+            stats[name] = {"size": int(size), "mtime": int(mtime)}
+        return stats
+
+
+    def _read_manifest(self, cxn, names: list[str]) -> dict:
+        """
+        Entries of the data manifest of a node that still describe the files on it
 
-    def distribute_data(self) -> None:
+        :param cxn: fabric Connection of the node
+        :param names: file names to look up
+        :return: manifest entries, keyed by file name
         """
-        Load the data defined in the config file onto all nodes.
+        res = cxn.run(f"cat {DATA_MANIFEST} 2>/dev/null; true", hide=True)
+        try:
+            manifest = json.loads(str(res.stdout))
+        except ValueError:
+            manifest = {}
+        stats = self._stat_remote(cxn, names=[n for n in names if n in manifest])
+        return {name: entry for name, entry in manifest.items()
+                if name in stats and stats[name] == {"size": entry.get("size"), "mtime": entry.get("mtime")}}
+
+
+    def _write_manifest(self, cxn, manifest: dict, digests: dict):
         """
-        for cxn in self.threadg:
-            for local_path in cxn['data']:    
-                cxn.put(local_path, remote=Path(local_path).name)
+        Record the hashes of newly uploaded files in the data manifest of a node
+
+        :param cxn: fabric Connection of the node
+        :param manifest: valid entries of the current manifest
+        :param digests: hashes of the uploaded files, keyed by file name
+        """
+        stats = self._stat_remote(cxn, names=list(digests))
+        manifest = dict(manifest)
+        for name, sha256 in digests.items():
+            if name in stats:
+                manifest[name] = {"sha256": sha256, **stats[name]}
+        cxn.put(io.BytesIO(json.dumps(manifest).encode()), remote=DATA_MANIFEST)
 
 
-    def distribute_credentials(self, fc_creds: dict) -> None:
+    def distribute_credentials(self, fc_creds: dict, env: dict | None = None) -> None:
         """
         Transfer the credentials of the Featurecloud accounts to the remotes.
 
         :param fc_creds: dictionary of Featurecloud credentials
+        :param env: further variables for fcauto, e.g. connection settings
         """
         for cxn in self.threadg:
             fc_user = cxn['fc_username']
@@ -105,28 +561,45 @@ class ClientManager:
             assert fc_user != '', "Featurecloud username is empty."
             assert fc_pass != '', f"Featurecloud password for user {fc_user} not found."
             cmd = f'echo {shlex.quote(fc_user)}={shlex.quote(fc_pass)} > .env'
+            for key, value in (env or {}).items():
+                cmd += f' && echo {shlex.quote(key)}={shlex.quote(value)} >> .env'
             cxn.run(cmd, hide=True)
 
 
-    def start_featurecloud_controllers(self) -> None:
+    def start_featurecloud_controllers(self, reuse: bool = False, jobs: int = 8) -> dict:
         """
         Start the Featurecloud controller on all remotes.
+        With reuse, a running controller is kept if it is healthy, runs the current image
+        and uses the data directory of fedflow, only the other nodes are (re)started.
+
+        :param reuse: whether to keep running controllers that match
+        :param jobs: maximum number of nodes to start at the same time
+        :raises RuntimeError: If a controller is not running afterwards, listing each failed site
+        :return: whether the controller was reused and seconds of each node, keyed by node (user@host:port)
         """
-        self.stop_featurecloud_controllers()
-        cmd = f"source .venv/bin/activate && featurecloud controller start --data-dir data_fc"
-        self.threadg.run(f'echo "$(hostname): starting fc controller..." && {cmd}')
-        # check status
-        cmd = "source .venv/bin/activate && featurecloud controller status"
-        results =self.threadg.run(cmd)
-        ok = True
-        failed = []
-        for cxn, result in results.items():
-            stdout = result.stdout
-            if "running" not in str(stdout).lower():
-                ok = False
-                failed.append(cxn.host)
-        assert ok, f'[{", ".join(failed)}] Failed to start FeatureCloud controller.'
-                
+        def start(cxn):
+            start = time.monotonic()
+            if reuse:
+                reason = controller_mismatch(str(cxn.run(CONTROLLER_PROBE, hide=True).stdout))
+                if reason is None:
+                    return {"reused": True, "seconds": time.monotonic() - start}
+                log(f"{cxn.host}: not reusing the fc controller, {reason}")
+            cxn.run("source .venv/bin/activate && featurecloud controller stop", hide=True)
+            log(f"{cxn.host}: starting fc controller...")
+            cxn.run("source .venv/bin/activate && featurecloud controller start --data-dir data_fc")
+            # check status
+            status = cxn.run("source .venv/bin/activate && featurecloud controller status", hide=True)
+            if "running" not in str(status.stdout).lower():
+                raise RuntimeError("FeatureCloud controller is not running")
+            return {"reused": False, "seconds": time.monotonic() - start}
+
+        def describe(stats):
+            state = "reused running fc controller" if stats["reused"] else "started fc controller"
+            return f"{state} in {stats['seconds']:.1f}s"
+
+        return self._run_on_nodes(start, nodes=self.threadg, action="start the FeatureCloud controller", jobs=jobs,
+                                  describe=describe)
+
 
     def stop_featurecloud_controllers(self) -> None:
         """
@@ -136,12 +609,24 @@ class ClientManager:
         self.threadg.run(f'echo "$(hostname): stopping fc controller..." && {cmd}')
         
 
-    def reset_clients(self,) -> None:
+    def reset_clients(self, keep_controller: bool = False, project_id: int | str | None = None) -> None:
         """
         Reset all remotes by stopping any stray docker processes
         and removing all featurecloud data.
+        With keep_controller, the controller container and data directory are kept
+        and only the workflow data of the project (all projects if not given) is removed.
+
+        :param keep_controller: whether to keep the controller running for reuse
+        :param project_id: project whose workflow data is removed with keep_controller
         """
         self.threadg.run('echo "Resetting $(hostname)..."')
+        if keep_controller:
+            # stop app containers, but not the controller
+            stop_apps = "docker ps --format '{{.ID}} {{.Names}}' | awk '$2 != \"fc-controller\" {print $1}' | xargs -r docker stop"
+            self.threadg.run(stop_apps)
+            workflows = f"data_fc/workflows/Project_{project_id}" if project_id else "data_fc/workflows"
+            self.threadg.run(f"[ -d {workflows} ] && [ ! -L {workflows} ] && sudo rm -rf {workflows}", warn=True)
+            return
         # stop docker containers
         stop_docker = "docker ps -q | xargs -r docker stop"
         self.threadg.run(stop_docker)
@@ -166,27 +651,55 @@ class ClientManager:
         coord_cxn = self.coordinator[0]
         fc_user = coord_cxn['fc_username']
         n_participants = len(self.participants)
-        cmd = f"source .venv/bin/activate && fcauto create -u {fc_user} -t {tool} -n {n_participants}"
-        res = coord_cxn.run(f'echo "$(hostname): creating project with tool {tool}..." && {cmd}')
-        # parse output for project ID and tokens
-        lines = str(res.stdout).splitlines()
-        project_id = None
-        tokens = []
-        for line in lines:
-            if line.startswith("PROJECT:"):
-                project_id = line.split("PROJECT:")[-1].strip()
-            elif line.startswith("TOKEN:"):
-                token = line.split("TOKEN:")[-1].strip()
-                tokens.append(token)
+        agent = self._agent(coord_cxn)
+        if agent:
+            log(f"{coord_cxn.host}: creating project with tool {tool}...")
+            res = agent.call("create", username=fc_user, tool=tool, num=n_participants)
+            project_id, tokens = res["project_id"], res["tokens"]
+        else:
+            cmd = f"source .venv/bin/activate && fcauto create -u {fc_user} -t {tool} -n {n_participants}"
+            res = coord_cxn.run(f'echo "$(hostname): creating project with tool {tool}..." && {cmd}')
+            # parse output for project ID and tokens
+            lines = str(res.stdout).splitlines()
+            project_id = None
+            tokens = []
+            for line in lines:
+                if line.startswith("PROJECT:"):
+                    project_id = line.split("PROJECT:")[-1].strip()
+                elif line.startswith("TOKEN:"):
+                    token = line.split("TOKEN:")[-1].strip()
+                    tokens.append(token)
         if project_id is None or len(tokens) != n_participants:
             raise ValueError("Failed to create project or retrieve tokens.")
         
-        # use tokens to join project from participant nodes
-        for cxn, token in zip(self.participants, tokens):
+        # use tokens to join project from all participant nodes in parallel
+        self.join_project(project_id=project_id, tokens=tokens)
+        return project_id
+
+
+    def join_project(self, project_id: str, tokens: list[str]) -> None:
+        """
+        Join a project from all participant nodes concurrently, one token per node.
+        All joins are attempted before failures are reported.
+
+        :param project_id: ID of the Featurecloud project
+        :param tokens: participant tokens, in the order of self.participants
+        :raises RuntimeError: If any participant failed to join, listing each failed site
+        """
+        token_of = {self._cxn_key(cxn): token for cxn, token in zip(self.participants, tokens)}
+
+        def join(cxn):
             fc_user = cxn['fc_username']
+            token = token_of[self._cxn_key(cxn)]
+            agent = self._agent(cxn)
+            if agent:
+                agent.call("join", username=fc_user, token=token, project_id=project_id)
+                return
             cmd = f"source .venv/bin/activate && fcauto join -t {token} -u {fc_user} -p {project_id}"
             cxn.run(f'echo "$(hostname): joining project {project_id}..." && {cmd}')
-        return project_id
+
+        self._run_on_nodes(join, nodes=self.participants[:len(tokens)], action=f"join project {project_id}",
+                           jobs=len(self.participants), describe=lambda _: f"joined project {project_id}")
 
 
     def contribute_data_to_project(self, project_id: str) -> None:
@@ -200,6 +713,12 @@ class ClientManager:
             fc_user = cxn['fc_username']
             # create a list of data paths to contribute
             data_paths = cxn['data']
+            agent = self._agent(cxn)
+            if agent:
+                log(f"{cxn.host}: contributing data to project {project_id}...")
+                agent.call("contribute", username=fc_user, project_id=project_id,
+                           data=[Path(path).name for path in data_paths])
+                continue
             data_args = ' '.join([f"{Path(path).name}" for path in data_paths])
             cmd = f"source .venv/bin/activate && fcauto contribute -u {fc_user} -p {project_id} -d {data_args}"
             cxn.run(f'echo "$(hostname): contributing data to project {project_id}..." && {cmd}')
@@ -217,37 +736,118 @@ class ClientManager:
         """
         cxn = coordinator[0]
         fc_user = cxn['fc_username']
+        agent = self._agent(cxn)
+        if agent:
+            # the monitor ends within its own timeouts, its reply is awaited that long on top of the usual timeout
+            status = agent.call("monitor", username=fc_user, project_id=project_id, timeout=timeout,
+                                call_timeout=timeout + PREPARE_TIMEOUT + AGENT_TIMEOUT)
+            log(f"{cxn.host}: project {project_id} finished with status {status['status']}")
+            return
         cmd = f"source .venv/bin/activate && fcauto monitor -u {fc_user} -p {project_id} -t {timeout}"
         cxn.run(cmd)
         
 
-    def fetch_results(self, outdir, pid):
+    def fetch_results(self, outdir, pid, mode: str = "api", jobs: int = 8, include: list[str] | None = None,
+                      exclude: list[str] | None = None, compression: str = "none") -> dict:
         """
-        Fetch results from nodes
+        Fetch results from all nodes concurrently. In mode 'api', each node downloads the logs and results
+        of the latest run from its controller and only these files are transferred.
+        Mode 'archive' streams the data_fc directory of the controller as a tar archive through SSH instead,
+        optionally limited to some of its paths.
+        The result of the last step is copied to <outdir>/results_<fc_username>.zip in both modes.
+        All nodes are attempted before failures are reported.
 
         :param outdir: local directory to save results to
         :param pid: ID of the Featurecloud project
+        :param mode: 'api' or 'archive'
+        :param jobs: maximum number of nodes to fetch from at the same time
+        :param include: archive mode, paths within data_fc to transfer, '{pid}' is replaced by the project ID,
+            e.g. 'workflows/Project_{pid}/', defaults to all of data_fc
+        :param exclude: archive mode, tar patterns of members to leave out, e.g. '*.tar'
+        :param compression: archive mode, 'none', 'gzip' or 'zstd'. Result zips are already compressed.
+        :raises RuntimeError: If fetching failed on any node, listing each failed site
+        :return: seconds, bytes and number of files transferred from each node, keyed by node (user@host:port)
         """
-        for cxn in self.threadg:
-            fcuser = cxn["fc_username"]
-            local_dir = Path(f"{outdir}/{fcuser}")
-            local_dir.mkdir(parents=True, exist_ok=True)
-            archive_name = Path('data_fc.tar.gz')
-            local_archive = local_dir / archive_name
-            # Create archive remotely
-            cxn.run(f"sudo tar -czf {archive_name} data_fc/")
-            # Transfer archive
-            cxn.get(archive_name, str(local_archive))
-            # Extract locally
-            with tarfile.open(local_archive, "r:gz") as tar:
-                tar.extractall(local_dir)
-            # cleanup
-            cxn.run(f"rm -f {archive_name}")
-            local_archive.unlink()
-            # move the zip file with the actual results to a more convenient path
-            raw_zip = Path(outdir) / fcuser / f"data_fc/workflows/Project_{pid}/Run_1/results_pr{pid}_run1_step1.zip"
-            new_zip = Path(outdir) / f"results_{fcuser}.zip"
-            if raw_zip.is_file():
-                shutil.copy2(raw_zip, new_zip)
+        if compression == "zstd" and zstd_module() is None:
+            log("zstd requested but neither compression.zstd nor zstandard is available, using gzip")
+            compression = "gzip"
+
+        def fetch(cxn):
+            start = time.monotonic()
+            if mode == "archive":
+                n_files, size = self._fetch_archive(cxn, outdir=outdir, pid=pid, include=include, exclude=exclude,
+                                                    compression=compression)
+            else:
+                n_files, size = self._fetch_run_files(cxn, outdir=outdir, pid=pid)
+            return {"seconds": time.monotonic() - start, "bytes": size, "files": n_files}
+
+        def describe(stats):
+            return f"fetched {stats['files']} file(s), {human_size(stats['bytes'])} in {stats['seconds']:.1f}s"
+
+        return self._run_on_nodes(fetch, nodes=self.threadg, action=f"return results of project {pid}", jobs=jobs,
+                                  describe=describe)
+
+
+    def _fetch_run_files(self, cxn, outdir, pid) -> tuple[int, int]:
+        """
+        Download the files of the latest run through the controller of a node and transfer them
+
+        :param cxn: fabric Connection of the node
+        :param outdir: local directory to save results to
+        :param pid: ID of the Featurecloud project
+        :return: number of files and bytes transferred
+        """
+        fcuser = cxn["fc_username"]
+        local_dir = Path(f"{outdir}/{fcuser}")
+        local_dir.mkdir(parents=True, exist_ok=True)
+        remote_dir = f"fedflow_results/{pid}"
+        agent = self._agent(cxn)
+        if agent:
+            log(f"{cxn.host}: downloading results of project {pid}...")
+            files = agent.call("download", username=fcuser, project_id=pid, out_dir=remote_dir)["files"]
+        else:
+            cmd = f"source .venv/bin/activate && fcauto download -u {fcuser} -p {pid} -o {remote_dir}"
+            res = cxn.run(f'echo "$(hostname): downloading results of project {pid}..." && {cmd}')
+            files = [line.split("FILE:")[-1].strip() for line in str(res.stdout).splitlines() if line.startswith("FILE:")]
+        local_files = []
+        for remote_file in files:
+            local_file = local_dir / Path(remote_file).name
+            cxn.get(remote_file, str(local_file))
+            local_files.append(local_file)
+        # files are named p<project>_r<run>_s<step>.<ext>, keep the result of the last step
+        zips = sorted((f for f in local_files if f.suffix == ".zip"), key=lambda f: int(f.stem.rsplit("_s", 1)[-1]))
+        if zips:
+            shutil.copy2(zips[-1], Path(outdir) / f"results_{fcuser}.zip")
+        else:
+            log(f"{cxn.host}: no results found for project {pid}")
+        return len(local_files), sum(f.stat().st_size for f in local_files)
+
+
+    def _fetch_archive(self, cxn, outdir, pid, include: list[str] | None = None, exclude: list[str] | None = None,
+                       compression: str = "none") -> tuple[int, int]:
+        """
+        Stream (parts of) the data_fc directory of a node and extract it locally
+
+        :param cxn: fabric Connection of the node
+        :param outdir: local directory to save results to
+        :param pid: ID of the Featurecloud project
+        :param include: paths within data_fc to transfer, defaults to all of data_fc
+        :param exclude: tar patterns of members to leave out
+        :param compression: 'none', 'gzip' or 'zstd'
+        :return: number of files and bytes transferred
+        """
+        fcuser = cxn["fc_username"]
+        local_dir = Path(f"{outdir}/{fcuser}")
+        local_dir.mkdir(parents=True, exist_ok=True)
+        paths = [f"data_fc/{p.format(pid=pid).lstrip('/')}" for p in include] if include else ["data_fc/"]
+        command = archive_command(paths=paths, exclude=exclude, compression=compression)
+        n_files, size = stream_archive(cxn, command=command, dest=local_dir, compression=compression)
+        # copy the result of the latest run and last step to a more convenient path
+        pattern = re.compile(rf"results_pr{pid}_run(\d+)_step(\d+)\.zip")
+        project_dir = local_dir / f"data_fc/workflows/Project_{pid}"
+        zips = [(tuple(map(int, m.groups())), f) for f in project_dir.glob("Run_*/*.zip") if (m := pattern.fullmatch(f.name))]
+        if zips:
+            shutil.copy2(max(zips)[1], Path(outdir) / f"results_{fcuser}.zip")
+        return n_files, size
 
 
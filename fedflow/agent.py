@@ -0,0 +1,275 @@
+import inspect
+import json
+import os
+import socket
+import sys
+import threading
+
+from fedflow import __version__
+from fedflow import featurecloud_api
+from fedflow.logger import log
+
+
+
+AGENT_COMMAND = "source .venv/bin/activate && exec fcauto agent"
+# seconds to wait for the reply of an agent, generous for large uploads and downloads
+AGENT_TIMEOUT = 60 * 60
+# seconds to wait for an agent to confirm its shutdown
+SHUTDOWN_TIMEOUT = 10
+
+
+
+class AgentError(Exception):
+    pass
+
+
+
+class Agent:
+
+    def __init__(self):
+        """
+        Long-lived fcauto process on a client node. Keeps logged-in users,
+        the controller client and all caches warm between commands.
+        Commands arrive as JSON-RPC 2.0 requests, one per line.
+        """
+        self.users = {}
+        self.running = False
+        self.methods = {
+            "ping": self.ping,
+            "create": self.create,
+            "join": self.join,
+            "contribute": self.contribute,
+            "monitor": self.monitor,
+            "query": self.query,
+            "download": self.download,
+            "reset": self.reset,
+            "shutdown": self.shutdown,
+        }
+
+
+    def _user(self, username: str):
+        """
+        Get a logged-in user, created on first use
+
+        :param username: FeatureCloud username
+        :return: User instance
+        """
+        user = self.users.get(username)
+        if user is None:
+            user = featurecloud_api.User(username=username)
+            self.users[username] = user
+        return user
+
+
+    def ping(self) -> dict:
+        return {"pid": os.getpid(), "version": __version__}
+
+
+    def create(self, username: str, tool: str, num: int) -> dict:
+        project_id, tokens = featurecloud_api.create_project_and_tokens(
+            username=username, tool=tool, n_participants=num, user=self._user(username))
+        return {"project_id": project_id, "tokens": tokens}
+
+
+    def join(self, username: str, token: str, project_id: str) -> dict:
+        project_id = featurecloud_api.join_project(
+            username=username, token=token, project_id=project_id, user=self._user(username))
+        return {"project_id": project_id}
+
+
+    def contribute(self, username: str, project_id: str, data: list[str], jobs: int = 1,
+                   controller: str | None = None) -> dict:
+        results = featurecloud_api.contribute_data(
+            username=username, project_id=project_id, data_list=data, jobs=jobs, controller=controller,
+            user=self._user(username))
+        return {"files": results}
+
+
+    def monitor(self, username: str, project_id: str, timeout: int = 60, max_interval: float = 60,
+                controller: str | None = None,
+                prepare_timeout: float | None = featurecloud_api.PREPARE_TIMEOUT) -> dict:
+        status = featurecloud_api.monitor_project(
+            username=username, project_id=project_id, timeout=timeout, max_interval=max_interval,
+            controller=controller, user=self._user(username), prepare_timeout=prepare_timeout)
+        return {"status": status}
+
+
+    def query(self, username: str, project_id: str) -> dict:
+        status = featurecloud_api.query_project(username=username, project_id=project_id, user=self._user(username))
+        return {"status": status}
+
+
+    def download(self, username: str, project_id: str, out_dir: str, runs: str | list[int] = "latest",
+                 controller: str | None = None, force: bool = False) -> dict:
+        files = featurecloud_api.download_project(
+            username=username, project_id=project_id, out_dir=out_dir, runs=runs, controller=controller,
+            user=self._user(username), force=force)
+        return {"files": files}
+
+
+    def reset(self, username: str, project_id: str) -> dict:
+        featurecloud_api.reset_project(username=username, project_id=project_id, user=self._user(username))
+        return {"status": "ready"}
+
+
+    def shutdown(self):
+        self.running = False
+
+
+    def handle(self, line: str) -> dict:
+        """
+        Execute a single JSON-RPC request
+
+        :param line: json encoded request
+        :return: JSON-RPC response
+        """
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return {"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": f"Parse error: {e}"}}
+        request_id = request.get("id")
+        method = self.methods.get(request.get("method"))
+        if method is None:
+            error = {"code": -32601, "message": f"Method not found: {request.get('method')}"}
+            return {"jsonrpc": "2.0", "id": request_id, "error": error}
+        params = request.get("params", {})
+        try:
+            # only a mismatch with the signature is an invalid request, errors inside the method are not
+            inspect.signature(method).bind(**params)
+        except TypeError as e:
+            return {"jsonrpc": "2.0", "id": request_id, "error": {"code": -32602, "message": f"Invalid params: {e}"}}
+        try:
+            result = method(**params)
+        except Exception as e:
+            return {"jsonrpc": "2.0", "id": request_id, "error": {"code": -32000, "message": f"{type(e).__name__}: {e}"}}
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+
+    def serve(self, instream=None, outstream=None):
+        """
+        Answer requests until 'shutdown' is received or the input is closed.
+        stdout is reserved for the protocol, everything else is printed to stderr.
+
+        :param instream: stream of requests, defaults to stdin
+        :param outstream: stream of responses, defaults to stdout
+        """
+        instream = instream or sys.stdin
+        outstream = outstream or sys.stdout
+        stdout, sys.stdout = sys.stdout, sys.stderr
+        self.running = True
+        try:
+            for line in instream:
+                if not line.strip():
+                    continue
+                response = self.handle(line)
+                outstream.write(json.dumps(response) + "\n")
+                outstream.flush()
+                if not self.running:
+                    break
+        finally:
+            sys.stdout = stdout
+
+
+
+class RemoteAgent:
+
+    def __init__(self, cxn, command: str = AGENT_COMMAND, timeout: float | None = AGENT_TIMEOUT):
+        """
+        Client of an Agent on a remote node. Requests are sent over
+        a separate channel of the existing SSH connection.
+
+        :param cxn: fabric Connection of the node
+        :param command: shell command that starts the agent
+        :param timeout: seconds to wait for a reply, None to wait indefinitely
+        """
+        self.cxn = cxn
+        self.command = command
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.next_id = 0
+        self.channel = None
+
+
+    def start(self):
+        """
+        Start the agent process and wait for it to answer
+        """
+        self.cxn.open()
+        self.channel = self.cxn.client.get_transport().open_session()
+        self.channel.exec_command(self.command)
+        self.stdin = self.channel.makefile_stdin("wb")
+        self.stdout = self.channel.makefile("rb")
+        stderr = threading.Thread(target=self._forward_stderr, daemon=True)
+        stderr.start()
+        info = self.call("ping")
+        log(f"{self.cxn.host}: fedflow agent {info['version']} running (pid {info['pid']})")
+
+
+    def _forward_stderr(self):
+        stderr = self.channel.makefile_stderr("rb")
+        while True:
+            try:
+                line = stderr.readline()
+            except socket.timeout:
+                # the channel timeout is meant for replies, stderr is read until the channel closes
+                continue
+            if not line:
+                break
+            log(f"[{self.cxn.host}] {line.decode(errors='replace').rstrip()}")
+
+
+    def call(self, method: str, call_timeout: float | None = None, **params):
+        """
+        Send a request and wait for its response
+
+        :param method: name of the Agent method
+        :param call_timeout: seconds to wait for the reply to this request, defaults to the timeout of the agent
+        :raises AgentError: if the agent reports an error, exits or doesn't reply in time
+        :return: result of the method
+        """
+        timeout = call_timeout if call_timeout is not None else self.timeout
+        with self.lock:
+            if self.channel is None:
+                raise AgentError(f"{self.cxn.host}: agent is not running, can't call '{method}'")
+            self.next_id += 1
+            request_id = self.next_id
+            request = {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+            self.channel.settimeout(timeout)
+            try:
+                self.stdin.write((json.dumps(request) + "\n").encode())
+                self.stdin.flush()
+                while True:
+                    line = self.stdout.readline()
+                    if not line:
+                        raise AgentError(f"{self.cxn.host}: agent exited during '{method}'")
+                    response = json.loads(line)
+                    if response.get("id") == request_id:
+                        break
+            except socket.timeout:
+                # a late reply could be cut off anywhere, so the channel isn't used again
+                self.channel.close()
+                self.channel = None
+                raise AgentError(f"{self.cxn.host}: agent did not reply to '{method}' within {timeout}s") from None
+        if "error" in response:
+            raise AgentError(f"{self.cxn.host}: {method} failed: {response['error']['message']}")
+        return response["result"]
+
+
+    def close(self):
+        """
+        Ask the agent to exit and close the channel
+        """
+        if self.channel is None:
+            return
+        try:
+            self.call("shutdown", call_timeout=SHUTDOWN_TIMEOUT)
+        except (AgentError, OSError):
+            pass
+        if self.channel is not None:
+            self.channel.close()
+            self.channel = None
+
+
+
+def serve():
+    Agent().serve()
@@ -3,12 +3,15 @@ from datetime import datetime
 from pathlib import Path
 from time import sleep
 import sys
+from typing import TYPE_CHECKING
 
 from fedflow.logger import setup_logging, log
 from fedflow.config import Config
-from fedflow.VagrantManager import VagrantManager
-from fedflow.ClientManager import ClientManager
-from fedflow.provision import write_provision_script
+from fedflow.provision import provision_check, write_provision_script
+
+# fabric and the managers are imported on first use, so that e.g. 'fedflow -t' starts quickly
+if TYPE_CHECKING:
+    from fedflow.ClientManager import ClientManager
 
 
 
@@ -17,12 +20,14 @@ def get_args(argv=None) -> argparse.Namespace:
      group = parser.add_mutually_exclusive_group(required=True)
      group.add_argument("-c", "--config", help="Path to the config file")
      group.add_argument("-t", "--template", help="Generate template config", action="store_true", default=False)
+     parser.add_argument("--reprovision", help="Provision clients even if they are up to date", action="store_true", default=False)
      args = parser.parse_args(argv)
      return args
 
 
 
 def get_client_connections(conf: Config):
+    from fedflow.ClientManager import ClientManager
     if not conf.config.sim:
         # construct connection group from config
         log('Connecting to remote clients defined in config...')
@@ -30,6 +35,7 @@ def get_client_connections(conf: Config):
     else:
         # construct connection group from vagrant
         log('Setting up Vagrant VMs...')
+        from fedflow.VagrantManager import VagrantManager
         nnodes = len(conf.config.clients)
         vms = VagrantManager(num_nodes=nnodes)
         vms.launch()
@@ -41,29 +47,33 @@ def get_client_connections(conf: Config):
     return clients
 
 
-def prep_clients(clients: ClientManager, conf: Config):
+def prep_clients(clients: "ClientManager", conf: Config, reprovision: bool = False):
     log("Provisioning...")
-    clients.run_bash_script(script_path=write_provision_script())
+    clients.provision(script_path=write_provision_script(), check=provision_check(), reprovision=reprovision)
     log("Resetting clients...")
-    clients.reset_clients()
+    clients.reset_clients(keep_controller=conf.reuse_controller, project_id=conf.config.project_id)
     log("Distributing credentials to clients...")
-    clients.distribute_credentials(fc_creds=conf.fc_creds)
+    clients.distribute_credentials(fc_creds=conf.fc_creds, env=conf.http.env())
     log("Distributing data to clients...")
-    clients.distribute_data()
+    clients.distribute_data(sync=conf.sync_data)
     log("Installing fedflow package on clients...")
-    clients.install_package(reinstall=conf.reinstall, nodeps=conf.nodeps)
+    clients.install_package(reinstall=conf.reinstall, nodeps=conf.nodeps, extras=["http2"] if conf.http.http2 else None,
+                            offline=conf.offline_install)
     log("Starting FeatureCloud controllers on clients...")
-    clients.start_featurecloud_controllers()
+    clients.start_featurecloud_controllers(reuse=conf.reuse_controller)
+    if conf.agent:
+        log("Starting fcauto agents on clients...")
+        clients.start_agents()
 
 
-def prep_project(clients: ClientManager, conf: Config) -> str:
+def prep_project(clients: "ClientManager", conf: Config) -> str:
     project_id = None
     # attach featurecloud project
     if conf.config.project_id:
         # attach to existing project
         return str(conf.config.project_id)
     elif conf.config.tool:
-        # create and join new project - serially
+        # create new project, participants join in parallel
         log("Creating and joining FeatureCloud project...")
         project_id = clients.create_and_join_project(tool=conf.config.tool)
         return str(project_id)
@@ -72,7 +82,8 @@ def prep_project(clients: ClientManager, conf: Config) -> str:
     
 
 
-def run_project(clients: ClientManager, project_id: str, timeout: int, outdir: str):
+def run_project(clients: "ClientManager", project_id: str, timeout: int, outdir: str, results: str = "api",
+                archive: dict | None = None):
     # contribute data to project
     # once all participants have contributed, the project is started
     log("Contributing data to FeatureCloud project...")
@@ -82,12 +93,15 @@ def run_project(clients: ClientManager, project_id: str, timeout: int, outdir: s
     clients.monitor_project_run(coordinator=clients.coordinator, project_id=project_id, timeout=timeout)
     sleep(10)
     # download outcome from all clients
-    clients.fetch_results(outdir=outdir, pid=project_id)
+    clients.fetch_results(outdir=outdir, pid=project_id, mode=results, **(archive or {}))
 
 
-def cleanup(clients: ClientManager, conf: Config):
-    # stop fc controller and vms
-    clients.stop_featurecloud_controllers()
+def cleanup(clients: "ClientManager", conf: Config):
+    # stop agents, fc controller and vms
+    clients.stop_agents()
+    # a controller kept for reuse stays warm for the next run
+    if not conf.reuse_controller:
+        clients.stop_featurecloud_controllers()
     if conf.config.sim:
         log("Suspending Vagrant VMs...")
         # VagrantManager.suspend()
@@ -114,7 +128,7 @@ def main(argv=None):
         log("Vagrant VMs launched. Exiting.")
         return
     # provision, reset, distribute creds and data, install fedflow, start fc controllers
-    prep_clients(clients=clients, conf=conf)
+    prep_clients(clients=clients, conf=conf, reprovision=args.reprovision)
     # get or create featurecloud project
     project_id = prep_project(clients=clients, conf=conf)
     # contribute data, monitor run, download results
@@ -122,7 +136,9 @@ def main(argv=None):
         clients=clients,
         project_id=project_id,
         timeout=conf.timeout,
-        outdir=conf.config.outdir
+        outdir=conf.config.outdir,
+        results=conf.results,
+        archive=conf.archive.model_dump(),
     )
     # stop fc controllers, halt vagrant vms
     cleanup(clients=clients, conf=conf)
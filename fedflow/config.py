@@ -2,21 +2,58 @@ import os
 import sys
 from pathlib import Path
 import tomllib
+from typing import TYPE_CHECKING, Literal
 
-from fabric import SerialGroup, ThreadingGroup
 from dotenv import load_dotenv
 from pydantic import BaseModel, ValidationError
 import tomli_w # type: ignore
 
 from fedflow.logger import log
 
+if TYPE_CHECKING:
+    from fabric import SerialGroup, ThreadingGroup
+
+
+
+class HttpConfig(BaseModel):
+    http2: bool = False
+    max_connections: int | None = None
+    max_keepalive: int | None = None
+    keepalive_expiry: float | None = None
+    connect_timeout: float | None = None
+    read_timeout: float | None = None
+    write_timeout: float | None = None
+    pool_timeout: float | None = None
+
+    def env(self) -> dict[str, str]:
+        """
+        Environment variables that pass the set options to fcauto on the clients,
+        see featurecloud_api.HttpSettings
+
+        :return: dictionary of FEDFLOW_* variables
+        """
+        return {f"FEDFLOW_{name.upper()}": str(value) for name, value in self.model_dump().items()
+                if value is not None and value is not False}
+
+
+class ArchiveConfig(BaseModel):
+    include: list[str] = []
+    exclude: list[str] = []
+    compression: Literal["none", "gzip", "zstd"] = "none"
 
 
 class DebugConfig(BaseModel):
-    reinstall: bool = True
+    reinstall: bool = False
     nodeps: bool = False
+    offline_install: bool = True
     timeout: int = 60 * 60
     vmonly: bool = False
+    agent: bool = False
+    sync_data: bool = True
+    reuse_controller: bool = False
+    results: Literal["api", "archive"] = "api"
+    archive: ArchiveConfig = ArchiveConfig()
+    http: HttpConfig = HttpConfig()
 
 
 class ClientConfig(BaseModel):
@@ -67,14 +104,28 @@ class Config:
         if self.config.debug:
             self.reinstall = self.config.debug.reinstall
             self.nodeps = self.config.debug.nodeps
+            self.offline_install = self.config.debug.offline_install
             self.timeout = self.config.debug.timeout
             self.vmonly = self.config.debug.vmonly
+            self.agent = self.config.debug.agent
+            self.sync_data = self.config.debug.sync_data
+            self.reuse_controller = self.config.debug.reuse_controller
+            self.results = self.config.debug.results
+            self.archive = self.config.debug.archive
+            self.http = self.config.debug.http
         else:
             debug = DebugConfig()
             self.reinstall = debug.reinstall
             self.nodeps = debug.nodeps
+            self.offline_install = debug.offline_install
             self.timeout = debug.timeout
             self.vmonly = debug.vmonly
+            self.agent = debug.agent
+            self.sync_data = debug.sync_data
+            self.reuse_controller = debug.reuse_controller
+            self.results = debug.results
+            self.archive = debug.archive
+            self.http = debug.http
 
 
     def _load_config(self, path: Path) -> GeneralConfig:
@@ -139,13 +190,15 @@ class Config:
     
 
     
-    def construct_connection_group(self) -> tuple[SerialGroup, ThreadingGroup]:
+    def construct_connection_group(self) -> tuple["SerialGroup", "ThreadingGroup"]:
         """
         Generate a group of fabric Connections from the info in the config file.
         This is used when the target remotes are actual machines instead of vagrant VMs.
 
         :return: SerialGroup of fabric Connections
         """
+        # fabric is only imported once connections are needed
+        from fabric import SerialGroup, ThreadingGroup
         # generate the client strings
         client_strings = self._construct_client_strings()
         # grab ssh keys for connect_kwargs
@@ -1,7 +1,5 @@
 import argparse
 
-import fedflow.featurecloud_api as featurecloud_api
-
 
 
 def get_args(argv=None) -> argparse.Namespace:
@@ -12,6 +10,12 @@ def get_args(argv=None) -> argparse.Namespace:
     common = argparse.ArgumentParser(add_help=False)
     common.add_argument("-u", "--user", help="Username on FeatureCloud")
     common.add_argument("-p", "--project", help="FeatureCloud project ID")
+    # arguments of subcommands that talk to the local controller
+    controller = argparse.ArgumentParser(add_help=False)
+    controller.add_argument("--controller", help="URL of the local FeatureCloud controller, "
+                            "defaults to $FEDFLOW_CONTROLLER_URL or http://localhost:8000")
+    controller.add_argument("--controller-timeout", help="Time to wait for the controller to answer (in seconds)",
+                            type=float, default=60)
     
     # parsers for subcommands
     create = sub.add_parser(
@@ -27,7 +31,7 @@ def get_args(argv=None) -> argparse.Namespace:
     monitor = sub.add_parser(
         "monitor", 
         help="Monitor a running FeatureCloud project", 
-        parents=[common]
+        parents=[common, controller]
     )
     query = sub.add_parser(  # noqa: F841
         "query", 
@@ -37,17 +41,26 @@ def get_args(argv=None) -> argparse.Namespace:
     contribute = sub.add_parser(
         "contribute", 
         help="Contribute data to a FeatureCloud project",
-        parents=[common]
+        parents=[common, controller]
+    )
+    download = sub.add_parser(
+        "download",
+        help="Download logs and results of a FeatureCloud project from the local controller",
+        parents=[common, controller]
     )
     reset = sub.add_parser(  # noqa: F841
         "reset", 
         help="Reset a FeatureCloud project to status 'ready' ",
         parents=[common]
     )
-    list_apps = sub.add_parser(     # noqa: F841
+    list_apps = sub.add_parser(
         "list-apps",
         help="List available apps on FeatureCloud",
     )
+    sub.add_parser(
+        "agent",
+        help="Serve fcauto commands as JSON-RPC over stdin/stdout",
+    )
 
     # additional arguments for each subcommand
     create.add_argument("-t", "--tool", help="Tool to use in project")
@@ -55,7 +68,15 @@ def get_args(argv=None) -> argparse.Namespace:
                          type=int, default=0)
     join.add_argument("-t", "--token", help="Token to join project")
     contribute.add_argument("-d", "--data", help="Paths of data to contribute. Can be multiple arguments.", nargs='+')
+    contribute.add_argument("-j", "--jobs", help="Number of files to upload concurrently", type=int, default=1)
     monitor.add_argument("-t", "--timeout", help="Maximum time to wait for project to finish (in seconds)", type=int, default=60)
+    monitor.add_argument("-i", "--max-interval", help="Longest time between status queries (in seconds)", type=float, default=60)
+    monitor.add_argument("--prepare-timeout", help="Maximum time the project may stay in 'prepare' (in seconds)", type=int, default=1800)
+    download.add_argument("-o", "--out-dir", help="Directory to save the files to", default="results")
+    download.add_argument("-r", "--runs", help="'latest', 'all' or comma-separated run numbers", default="latest")
+    download.add_argument("-j", "--jobs", help="Number of files to download concurrently", type=int, default=4)
+    download.add_argument("-f", "--force", help="Download files again that exist in the output directory", action="store_true", default=False)
+    list_apps.add_argument("-r", "--refresh", help="Revalidate the cached app list", action="store_true", default=False)
     #
     args = parser.parse_args(argv)
     return args
@@ -65,6 +86,8 @@ def get_args(argv=None) -> argparse.Namespace:
 
 def main(argv=None):
     args = get_args(argv)
+    # httpx and friends are only loaded once the arguments are valid
+    import fedflow.featurecloud_api as featurecloud_api
 
     if args.cmd == "create":
         featurecloud_api.create_project_and_tokens(
@@ -83,6 +106,10 @@ def main(argv=None):
             username=args.user,
             project_id=args.project,
             timeout=args.timeout,
+            max_interval=args.max_interval,
+            prepare_timeout=args.prepare_timeout,
+            controller=args.controller,
+            controller_timeout=args.controller_timeout,
         )
     elif args.cmd == "query":
         featurecloud_api.query_project(
@@ -94,6 +121,21 @@ def main(argv=None):
             username=args.user,
             project_id=args.project,
             data_list=args.data,
+            jobs=args.jobs,
+            controller=args.controller,
+            controller_timeout=args.controller_timeout,
+        )
+    elif args.cmd == "download":
+        runs = args.runs if args.runs in ("latest", "all") else [int(r) for r in args.runs.split(",")]
+        featurecloud_api.download_project(
+            username=args.user,
+            project_id=args.project,
+            out_dir=args.out_dir,
+            runs=runs,
+            jobs=args.jobs,
+            controller=args.controller,
+            controller_timeout=args.controller_timeout,
+            force=args.force,
         )
     elif args.cmd == "reset":
         featurecloud_api.reset_project(
@@ -101,7 +143,10 @@ def main(argv=None):
             project_id=args.project,
         )
     elif args.cmd == "list-apps":
-        featurecloud_api.list_apps()
+        featurecloud_api.list_apps(refresh=args.refresh)
+    elif args.cmd == "agent":
+        from fedflow.agent import serve
+        serve()
 
 
 
@@ -1,58 +1,634 @@
+import base64
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+try:
+    import fcntl
+except ImportError:  # not available on Windows, limits are per process there
+    fcntl = None
+import hashlib
+from importlib.util import find_spec
+import json
 import os
 from pathlib import Path
+import random
+import tempfile
+import threading
 import time
 
 import httpx
 from dotenv import load_dotenv
 
-from fedflow.logger import log
-from fedflow.utils import randstr
+from fedflow.logger import log, logger
+from fedflow.metrics import MetricsTransport, add_blocked, endpoint_template
+from fedflow.utils import CACHE_DIR, randstr, TransferProgress, wait_for
 
 
 
-load_dotenv(dotenv_path='.env', override=True)
-        
-
 DEFAULT_HEADERS = {
     "User-Agent": "fedflow (https://github.com/W-L/fedflow)"
 }
 
+FEATURECLOUD_URL = "https://featurecloud.ai"
+# the local controller, $FEDFLOW_CONTROLLER_URL sets a different one (e.g. if port 8000 is taken), see controller_url()
+CONTROLLER_URL = "http://localhost:8000"
+# seconds to wait for a starting controller to answer
+CONTROLLER_TIMEOUT = 60
+
+# size of the blocks that are streamed to and from the controller
+CHUNK_SIZE = 1024 * 1024
+# deadline in seconds for status changes to be picked up by the server
+STATUS_TIMEOUT = 30
+# seconds a fetched project resource is shared by all status and role checks
+SNAPSHOT_TTL = 1.0
+# states in which a project is expected to change on its own
+ACTIVE_STATES = ["prepare", "running"]
+# 'prepare' ends as soon as all participants have uploaded, so keep polling it quickly
+PHASE_MAX_INTERVAL = {"prepare": 5}
+# seconds a project may stay in 'prepare' while the apps are pulled, before monitoring gives up
+PREPARE_TIMEOUT = 30 * 60
+# seconds before cached responses are revalidated with the server
+CATALOG_TTL = 24 * 60 * 60
+ENTITLEMENT_TTL = 10 * 60
+
+# request budgets (requests, seconds) of each upstream
+RATE_LIMITS = {"featurecloud": (3, 1), "controller": (3, 1)}
+# the adaptive rate stays within these factors of the configured budget, it only ever slows down from it
+RATE_BOUNDS = (0.1, 1.0)
+# rate is reduced when the average latency of an endpoint exceeds this multiple of its baseline
+LATENCY_FACTOR = 3
+# share of each slower response by which the baseline of an endpoint drifts up
+BASELINE_DECAY = 0.01
+# retries of throttled (429), unavailable (5xx) or failed requests
+MAX_RETRIES = 4
+RETRY_STATUS = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# connection settings, overridden by the environment variables in HttpSettings.from_env()
+HTTP_DEFAULTS = {
+    "http2": False,
+    "max_connections": 100,
+    "max_keepalive": 20,
+    "keepalive_expiry": 5.0,
+    "connect_timeout": 5.0,
+    "read_timeout": 5.0,
+    "write_timeout": 5.0,
+    "pool_timeout": 5.0,
+}
+
+# process-wide connection pools, keyed by upstream base URL
+_TRANSPORTS: dict[str, httpx.BaseTransport] = {}
+# async connection pools, keyed by upstream base URL and event loop, see featurecloud_api_async.get_async_transport()
+_ASYNC_TRANSPORTS: dict[tuple, httpx.AsyncBaseTransport] = {}
+_CLIENTS: dict[str, httpx.Client] = {}
+_LIMITERS: dict[str, "RateLimiter"] = {}
+_CONTROLLERS: dict[str, "Controller"] = {}
+_SESSION_LOCK = threading.Lock()
+# transports that replace the network, e.g. benchmarks/mock_server.py, see set_network()
+_NETWORK: httpx.BaseTransport | None = None
+_ASYNC_NETWORK: httpx.AsyncBaseTransport | None = None
+# connection settings of this process, see get_http_settings()
+_HTTP_SETTINGS: "HttpSettings | None" = None
+
+
+
+def upstream_of(base_url: str) -> str:
+    """
+    Name of the rate limit budget of a base URL
+
+    :param base_url: base URL of the upstream
+    :return: key of RATE_LIMITS
+    """
+    return "featurecloud" if base_url == FEATURECLOUD_URL else "controller"
+
+
+
+def controller_url() -> str:
+    """
+    Address of the local controller, from $FEDFLOW_CONTROLLER_URL in the environment or the .env file.
+    Resolved on use, since the .env file written by fedflow is only read once a command runs.
+
+    :return: base URL of the controller, defaults to CONTROLLER_URL
+    """
+    load_dotenv(dotenv_path='.env', override=True)
+    return os.getenv("FEDFLOW_CONTROLLER_URL", CONTROLLER_URL)
+
+
+
+class HttpSettings:
+
+    def __init__(self, http2: bool = False, max_connections: int = 100, max_keepalive: int = 20,
+                 keepalive_expiry: float = 5.0, connect_timeout: float = 5.0, read_timeout: float = 5.0,
+                 write_timeout: float = 5.0, pool_timeout: float = 5.0):
+        """
+        Connection settings of the httpx clients. HTTP/2 multiplexes concurrent requests
+        to featurecloud.ai over one connection, it needs the optional h2 package
+        (pip install fedflow-featurecloud[http2]) and falls back to HTTP/1.1 without it.
+        Plain http:// upstreams like the local controller always use HTTP/1.1.
+
+        :param http2: whether to negotiate HTTP/2 with TLS upstreams
+        :param max_connections: connections per upstream
+        :param max_keepalive: idle connections kept open per upstream
+        :param keepalive_expiry: seconds an idle connection is kept open
+        :param connect_timeout: seconds to establish a connection
+        :param read_timeout: seconds to wait for data from the server
+        :param write_timeout: seconds to wait until data can be sent
+        :param pool_timeout: seconds to wait for a free connection of the pool
+        """
+        if http2 and find_spec("h2") is None:
+            log("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.pool_timeout = pool_timeout
+
+
+    @classmethod
+    def from_env(cls):
+        """
+        Settings from the environment, e.g. FEDFLOW_HTTP2=1 or FEDFLOW_READ_TIMEOUT=30,
+        falling back to HTTP_DEFAULTS. The variables are also read from the .env file of a node.
+
+        :return: HttpSettings
+        """
+        settings = {}
+        for name, default in HTTP_DEFAULTS.items():
+            value = os.getenv(f"FEDFLOW_{name.upper()}")
+            if value is None:
+                settings[name] = default
+            elif isinstance(default, bool):
+                settings[name] = value.lower() in ("1", "true", "yes", "on")
+            else:
+                settings[name] = type(default)(value)
+        return cls(**settings)
+
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive,
+                            keepalive_expiry=self.keepalive_expiry)
+
+
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(connect=self.connect_timeout, read=self.read_timeout, write=self.write_timeout,
+                             pool=self.pool_timeout)
+
+
+
+def get_http_settings() -> HttpSettings:
+    """
+    Get the connection settings of this process. They are resolved from the environment
+    on first use, so that a missing h2 package is only reported once.
+
+    :return: shared HttpSettings
+    """
+    global _HTTP_SETTINGS
+    with _SESSION_LOCK:
+        if _HTTP_SETTINGS is None:
+            _HTTP_SETTINGS = HttpSettings.from_env()
+        return _HTTP_SETTINGS
+
+
+
+def get_transport(base_url: str) -> httpx.BaseTransport:
+    """
+    Get the shared transport (i.e. connection pool) for an upstream.
+    Clients built on the same transport reuse its TCP/TLS connections.
+
+    :param base_url: base URL of the upstream
+    :return: shared transport, retrying throttled requests and recording their metrics
+    """
+    upstream = upstream_of(base_url)
+    limiter = get_limiter(upstream)
+    settings = get_http_settings()
+    with _SESSION_LOCK:
+        transport = _TRANSPORTS.get(base_url)
+        if transport is None:
+            network = _NETWORK or httpx.HTTPTransport(http2=settings.http2, limits=settings.limits())
+            transport = MetricsTransport(RetryTransport(transport=network, limiter=limiter), upstream=upstream)
+            _TRANSPORTS[base_url] = transport
+        return transport
+
+
+
+def new_client(base_url: str, headers: dict | None = None) -> httpx.Client:
+    """
+    Create a client with its own headers (e.g. user authorization) on the shared pool of an upstream.
+
+    :param base_url: base URL of the upstream
+    :param headers: headers of this client
+    :return: httpx.Client
+    """
+    return httpx.Client(base_url=base_url, headers=headers, transport=get_transport(base_url),
+                        timeout=get_http_settings().timeout())
+
+
+
+def get_client(base_url: str, headers: dict | None = None) -> httpx.Client:
+    """
+    Get the process-wide client for an upstream that doesn't carry per-user state.
+
+    :param base_url: base URL of the upstream
+    :param headers: headers used if the client is created by this call
+    :return: shared httpx.Client
+    """
+    client = _CLIENTS.get(base_url)
+    if client is None:
+        client = new_client(base_url=base_url, headers=headers)
+        with _SESSION_LOCK:
+            client = _CLIENTS.setdefault(base_url, client)
+    return client
+
+
+
+def close_sessions():
+    """
+    Close all shared clients and connection pools of this process.
+    New sessions resolve the connection settings again.
+    """
+    global _HTTP_SETTINGS
+    with _SESSION_LOCK:
+        for transport in _TRANSPORTS.values():
+            transport.close()
+        _TRANSPORTS.clear()
+        for (_, loop), transport in _ASYNC_TRANSPORTS.items():
+            # pools of a finished or currently running event loop can't be awaited here, they are dropped
+            if loop is not None and not loop.is_closed() and not loop.is_running():
+                loop.run_until_complete(transport.aclose())
+        _ASYNC_TRANSPORTS.clear()
+        _CLIENTS.clear()
+        _CONTROLLERS.clear()
+        _HTTP_SETTINGS = None
+
+
+
+def set_network(transport: httpx.BaseTransport | None, async_transport: httpx.AsyncBaseTransport | None = None):
+    """
+    Send all requests of this process through the given transports instead of the network,
+    e.g. to an in-process mock server. Retries and rate limits still apply on top.
+    Existing sessions are closed, so that no client keeps the previous transport.
+
+    :param transport: transport for sync clients, None to restore the network
+    :param async_transport: transport for async clients, None to restore the network
+    """
+    global _NETWORK, _ASYNC_NETWORK
+    close_sessions()
+    _NETWORK, _ASYNC_NETWORK = transport, async_transport
+
 
 
 
 
 class RateLimiter:
 
-    def __init__(self, rate: int = 3, per: int = 1):
+    def __init__(self, rate: int = 3, per: int = 1, name: str | None = None):
         """
+        Token bucket that is safe to use from several threads.
+        Named limiters also share their budget with other processes
+        on the same host through a locked state file.
+
         :param rate: Max requests per unit time
         :param per: seconds
+        :param name: name of the budget shared across processes, None for a process-local budget
         """
         self.rate = rate
         self.per = per
+        self.min_rate = rate * RATE_BOUNDS[0]
+        self.max_rate = rate * RATE_BOUNDS[1]
         self.allowance = rate
-        self.last_check = time.monotonic()
-
+        self.last_check = time.time()
+        self.lock = threading.Lock()
+        # state of the adaptive rate: average and baseline latency of each endpoint
+        self.latency = {}
+        self.base_latency = {}
+        self.last_decrease = 0.0
+        self.last_change = 0.0
+        self.path = None
+        if name is not None and fcntl is not None:
+            self.path = CACHE_DIR / "ratelimit" / f"{name}.json"
+
+
+
+    def _take(self, allowance: float, last_check: float, now: float) -> tuple[float, float]:
+        """
+        Refill the bucket and take one request from it. 
+        The allowance can go negative, so that concurrent callers queue up behind each other.
+
+        :param allowance: requests left in the bucket at last_check
+        :param last_check: time of the last update
+        :param now: current time
+        :return: new allowance and time to sleep before the request may be sent
+        """
+        elapsed = max(now - last_check, 0)
+        allowance = min(allowance + elapsed * (self.rate / self.per), self.rate)
+        allowance -= 1
+        sleep_time = -allowance * (self.per / self.rate) if allowance < 0 else 0.0
+        return allowance, sleep_time
+
+
+    def _reserve_shared(self, now: float) -> float:
+        self.path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+        with open(self.path, "a+") as f:
+            # the lock is released when the file is closed
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                state = json.loads(f.read())
+                allowance, last_check = state["allowance"], state["last_check"]
+                # adopt the adaptive rate of other processes if it changed more recently
+                if state.get("changed", 0) > self.last_change:
+                    self.rate = state["rate"]
+                    self.last_change = state["changed"]
+            except (ValueError, KeyError):
+                allowance, last_check = self.rate, now
+            allowance, sleep_time = self._take(allowance, last_check, now)
+            f.seek(0)
+            f.truncate()
+            state = {"allowance": allowance, "last_check": now, "rate": self.rate, "changed": self.last_change}
+            json.dump(state, f)
+            f.flush()
+        return sleep_time
+
+
+    def reserve(self) -> float:
+        """
+        Take one request from the budget
+
+        :return: time to sleep before the request may be sent
+        """
+        with self.lock:
+            now = time.time()
+            if self.path is not None:
+                try:
+                    return self._reserve_shared(now)
+                except OSError as e:
+                    log(f"Shared rate limit unavailable ({e}), using process-local budget")
+                    self.path = None
+            self.allowance, sleep_time = self._take(self.allowance, self.last_check, now)
+            self.last_check = now
+            return sleep_time
 
 
     def wait(self):
-        now = time.monotonic()
-        elapsed = now - self.last_check
-        self.last_check = now
+        start = time.monotonic()
+        sleep_time = self.reserve()
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+        add_blocked(time.monotonic() - start)
+
+
+    def adapt(self, throttled: bool = False, latency: float | None = None, endpoint: str = ""):
+        """
+        Adjust the rate (AIMD): additive increase while responses are healthy,
+        multiplicative decrease when the server throttles or latency rises.
+        Latency is compared per endpoint with a baseline that follows the fastest responses
+        and drifts up slowly, so that a single fast response doesn't make all others count as slow.
+
+        :param throttled: whether the server rejected the request (429/503)
+        :param latency: duration of the request in seconds, None for transfers whose duration depends on their size
+        :param endpoint: endpoint template of the request, e.g. '/api/projects/{id}/'
+        """
+        with self.lock:
+            slow = False
+            if latency is not None:
+                average = self.latency.get(endpoint, latency)
+                base = self.base_latency.get(endpoint, latency)
+                self.latency[endpoint] = average = 0.8 * average + 0.2 * latency
+                self.base_latency[endpoint] = base = latency if latency < base else base + BASELINE_DECAY * (latency - base)
+                slow = average > LATENCY_FACTOR * max(base, 0.05)
+            now = time.time()
+            # back off at most once per window, responses of one burst arrive together
+            if (throttled or slow) and now - self.last_decrease >= self.per:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.last_decrease = now
+                logger.debug(f"Request rate reduced to {self.rate:.2f}/{self.per}s")
+            elif throttled or slow:
+                return
+            else:
+                self.rate = min(self.max_rate, self.rate + 1 / max(self.rate, 1))
+            self.last_change = now
+
+
+
+def get_limiter(upstream: str) -> RateLimiter:
+    """
+    Get the rate limiter of an upstream. All clients of this process and
+    other fedflow processes on the same host draw from the same budget.
 
-        self.allowance += elapsed * (self.rate / self.per)
-        self.allowance = min(self.allowance, self.rate)
+    :param upstream: one of the keys of RATE_LIMITS
+    :return: shared RateLimiter
+    """
+    with _SESSION_LOCK:
+        limiter = _LIMITERS.get(upstream)
+        if limiter is None:
+            rate, per = RATE_LIMITS[upstream]
+            limiter = RateLimiter(rate=rate, per=per, name=upstream)
+            _LIMITERS[upstream] = limiter
+        return limiter
 
-        if self.allowance < 1:
-            sleep_time = (1 - self.allowance) * (self.per / self.rate)
-            time.sleep(sleep_time)
-            self.allowance = 0
-        else:
-            self.allowance -= 1
 
 
 
 
+def retry_after(response: httpx.Response) -> float | None:
+    """
+    Parse the Retry-After header of a response
+
+    :param response: response of the server
+    :return: seconds to wait, None if the header is missing or invalid
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+
+class RetryPolicy:
+
+    def __init__(self, limiter: RateLimiter, max_retries: int = MAX_RETRIES, base_delay: float = 0.5,
+                 max_delay: float = 60):
+        """
+        Decide which requests are retried and for how long to back off.
+        Only requests with a replayable body are retried. Non-idempotent methods
+        are only retried if the server can't have acted on them (429, connection errors).
+        Requests with the extension {"retry": False} are never retried, e.g. probes with their own loop.
+
+        :param limiter: rate limiter of the upstream, adapted to every response
+        :param max_retries: maximum number of retries per request
+        :param base_delay: backoff before the first retry in seconds
+        :param max_delay: longest backoff, also the longest Retry-After that is honoured
+        """
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+
+    def backoff(self, attempt: int) -> float:
+        # exponential backoff with jitter, so that throttled clients don't retry in lockstep
+        return random.uniform(0.5, 1.0) * min(self.max_delay, self.base_delay * 2 ** attempt)
+
+
+    def observe(self, request: httpx.Request, response: httpx.Response, elapsed: float):
+        # the duration of uploads and downloads says more about their size than about the server
+        transfer = request.extensions.get("transfer", False) or not isinstance(request.stream, httpx.ByteStream)
+        self.limiter.adapt(throttled=response.status_code in (429, 503), latency=None if transfer else elapsed,
+                           endpoint=endpoint_template(request.url.path))
+
+
+    def retry_response(self, request: httpx.Request, response: httpx.Response, attempt: int) -> float | None:
+        """
+        :return: seconds to wait before retrying, None if the response is final
+        """
+        if attempt >= self.max_retries or response.status_code not in RETRY_STATUS:
+            return None
+        if not request.extensions.get("retry", True):
+            return None
+        if not isinstance(request.stream, httpx.ByteStream):
+            return None
+        if response.status_code != 429 and request.method not in IDEMPOTENT_METHODS:
+            return None
+        delay = self.backoff(attempt)
+        hint = retry_after(response)
+        if hint is None:
+            return delay
+        return max(delay, hint) if hint <= self.max_delay else None
+
+
+    def retry_error(self, request: httpx.Request, error: httpx.TransportError, attempt: int) -> float | None:
+        """
+        :return: seconds to wait before retrying, None if the error is final
+        """
+        if attempt >= self.max_retries or not isinstance(request.stream, httpx.ByteStream):
+            return None
+        if not request.extensions.get("retry", True):
+            return None
+        # the request never reached the server, safe to repeat for all methods
+        unsent = isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+        if unsent or request.method in IDEMPOTENT_METHODS:
+            return self.backoff(attempt)
+        return None
+
+
+
+class RetryTransport(httpx.BaseTransport):
+
+    def __init__(self, transport: httpx.BaseTransport, limiter: RateLimiter, policy: RetryPolicy | None = None):
+        """
+        Transport wrapper that retries throttled and failed requests
+        and feeds response times into the adaptive rate limit.
+
+        :param transport: transport that sends the requests
+        :param limiter: rate limiter of the upstream
+        :param policy: RetryPolicy, defaults to one with the given limiter
+        """
+        self.transport = transport
+        self.limiter = limiter
+        self.policy = policy or RetryPolicy(limiter=limiter)
+
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.TransportError as e:
+                delay = self.policy.retry_error(request, e, attempt)
+                if delay is None:
+                    raise
+                log(f"{request.method} {request.url.path} failed ({e!r}), retrying in {delay:.1f}s")
+            else:
+                self.policy.observe(request, response, time.monotonic() - start)
+                delay = self.policy.retry_response(request, response, attempt)
+                if delay is None:
+                    return response
+                response.close()
+                log(f"{request.method} {request.url.path} returned {response.status_code}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            self.limiter.wait()
+            attempt += 1
+            request.extensions["retries"] = attempt
+
+
+    def close(self):
+        self.transport.close()
+
+
+
+class ProjectSnapshot:
+
+    def __init__(self, fetch, ttl: float = SNAPSHOT_TTL):
+        """
+        Short-lived copy of a project resource. Reads within the TTL share one response,
+        concurrent reads of a stale snapshot wait for a single in-flight request.
+
+        :param fetch: function without arguments returning the json of the project
+        :param ttl: seconds until the snapshot is fetched again
+        """
+        self.fetch = fetch
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.data = None
+        self.fetched = 0.0
+        self.pending = None
+        # bumped by every write, responses of requests started before are not stored
+        self.generation = 0
+
+
+    def get(self) -> dict:
+        """
+        Get the project, fetching it if the snapshot is stale
+
+        :return: json of the project
+        """
+        with self.lock:
+            if self.data is not None and time.monotonic() - self.fetched < self.ttl:
+                return self.data
+            pending = self.pending
+            leader = pending is None
+            if leader:
+                pending = self.pending = Future()
+                generation = self.generation
+        if not leader:
+            return pending.result()
+        try:
+            data = self.fetch()
+        except BaseException as e:
+            with self.lock:
+                if self.pending is pending:
+                    self.pending = None
+            pending.set_exception(e)
+            raise
+        with self.lock:
+            if self.generation == generation:
+                self.data, self.fetched = data, time.monotonic()
+            if self.pending is pending:
+                self.pending = None
+        pending.set_result(data)
+        return data
+
+
+    def invalidate(self):
+        """
+        Drop the snapshot after a write, the next read fetches the project again
+        """
+        with self.lock:
+            self.data = None
+            self.pending = None
+            self.generation += 1
+
 
 
 class Controller:
@@ -61,31 +637,79 @@ class Controller:
     Class for the communication with the local FeatureCloud controller
     """
 
-    def __init__(self, host: str ="http://localhost:8000"):
+    def __init__(self, host: str | None = None):
         """
-        Initialize connection to the local controller   
+        Initialize connection to the local controller. Use get_controller() to share it.
 
-        :param host: The host URL of the local controller
+        :param host: The host URL of the local controller, defaults to controller_url()
         """
-        self.client = httpx.Client(base_url=host)
-        self.host = host
-        self.limiter = RateLimiter() 
+        self.host = host or controller_url()
+        self.client = get_client(base_url=self.host)
+        self.limiter = get_limiter("controller")
+        self.ready = False
+
+
+    def _ping(self) -> bool:
+        try:
+            self.limiter.wait()
+            # a single probe, waiting is up to the caller
+            r = self.client.get(f"{self.host}/ping/", timeout=2, extensions={"retry": False})
+            return r.status_code == 200
+        except httpx.RequestError:
+            return False
 
 
     def controller_is_running(self) -> bool:
         """
         Check whether the FeatureCloud controller is running
 
-        :return: _description_
+        :return: True if the controller answers the ping
         """
-        try:
-            self.limiter.wait()
-            r = self.client.get(f"{self.host}/ping/", timeout=2)
-            return r.status_code == 200
-        except httpx.RequestError:
+        running = self._ping()
+        if not running:
             err_msg = "FeatureCloud controller is not running. Make sure to start it first."
             log(err_msg)
-            return False
+        return running
+
+
+    def wait_until_ready(self, timeout: float = CONTROLLER_TIMEOUT, interval: float = 0.5,
+                         max_interval: float = 5) -> bool:
+        """
+        Wait for the controller to answer, e.g. while its container is still starting.
+        Once it answered, later calls return immediately.
+
+        :param timeout: seconds until giving up
+        :param interval: seconds before the first re-check, increased after every failed ping
+        :param max_interval: longest time between pings
+        :raises TimeoutError: if the controller doesn't answer within the timeout
+        :return: True once the controller is ready
+        """
+        if self.ready:
+            return True
+        if not self._ping():
+            log(f"Waiting up to {timeout}s for the FeatureCloud controller at {self.host}...")
+            wait_for(self._ping, timeout=timeout, interval=interval, max_interval=max_interval,
+                     desc=f"FeatureCloud controller at {self.host}")
+        self.ready = True
+        return True
+
+
+
+def get_controller(host: str | None = None) -> Controller:
+    """
+    Get the shared Controller of this process
+
+    :param host: The host URL of the local controller, defaults to controller_url()
+    :return: Controller instance
+    """
+    host = host or controller_url()
+    with _SESSION_LOCK:
+        controller = _CONTROLLERS.get(host)
+    if controller is None:
+        controller = Controller(host=host)
+        with _SESSION_LOCK:
+            controller = _CONTROLLERS.setdefault(host, controller)
+    return controller
 
 
 
@@ -97,7 +721,9 @@ class Project:
 
     def __init__(self, client: httpx.Client):
         self.client = client
-        self.limiter = RateLimiter()
+        self.limiter = get_limiter("featurecloud")
+        # status and role checks share one recent GET of the project
+        self.snapshot = ProjectSnapshot(fetch=self._fetch)
         
 
         
@@ -199,22 +825,30 @@ class Project:
         self.limiter.wait()
         r = self.client.put(f"/api/projects/{self.project_id}/", json=payload)
         r.raise_for_status()
+        self.snapshot.invalidate()
         return r.json()
 
 
-    def create_project_tokens(self, n: int = 0) -> list[dict]:
+    def _create_project_token(self) -> dict:
+        self.limiter.wait()
+        r = self.client.post(f"/api/project-tokens/{self.project_id}/", json={"cmd": "create"})
+        r.raise_for_status()
+        return r.json()   # contains id, token, project, etc.
+
+
+    def create_project_tokens(self, n: int = 0, jobs: int = 8) -> list[dict]:
         """
         Create project tokens for the current project.
+        Requests are issued concurrently, the shared limiter keeps them within the rate budget.
 
         :param n: number of tokens to generate, defaults to 0
+        :param jobs: maximum number of concurrent requests, defaults to 8
         :return: list of tokens
         """
-        tokens = []
-        for _ in range(n):
-            self.limiter.wait()
-            r = self.client.post(f"/api/project-tokens/{self.project_id}/", json={"cmd": "create"})
-            r.raise_for_status()
-            tokens.append(r.json())   # contains id, token, project, etc.
+        if n <= 0:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(n, jobs))) as pool:
+            tokens = list(pool.map(lambda _: self._create_project_token(), range(n)))
         return tokens
     
 
@@ -229,6 +863,14 @@ class Project:
         self.limiter.wait()
         r = self.client.post("/api/project-tokens/", json=payload)
         r.raise_for_status()
+        self.snapshot.invalidate()
+        return r.json()
+
+
+    def _fetch(self) -> dict:
+        self.limiter.wait()
+        r = self.client.get(f"/api/projects/{self.project_id}/")
+        r.raise_for_status()      # raise error if project doesn't exist
         return r.json()
 
 
@@ -238,14 +880,22 @@ class Project:
 
         :return: status description string
         """
-        self.limiter.wait()
-        r = self.client.get(f"/api/projects/{self.project_id}/")
-        r.raise_for_status()
-        data = r.json()
+        data = self.snapshot.get()
         status = data.get("status")
         return status
 
 
+    def get_role(self) -> str:
+        """
+        Query the role of the user in the project, e.g. 'coordinator'
+
+        :return: role description string
+        """
+        data = self.snapshot.get()
+        role = data.get("role")
+        return role
+
+
     def set_status(self, status: str):
         """
         Set a status on the project. E.g. used to reset a project
@@ -257,6 +907,7 @@ class Project:
         status_change = {"status": status}
         r = self.client.put(f"/api/projects/{self.project_id}/", json=status_change)
         r.raise_for_status()
+        self.snapshot.invalidate()
         return r.json()
     
 
@@ -289,20 +940,41 @@ class Project:
         :return: boolean marker
         """
         self.set_status("ready")
-        assert self.is_ready(), "Failed to reset project to ready."
+        wait_for(self.is_ready, timeout=STATUS_TIMEOUT, desc=f"project {self.project_id} to be 'ready'")
         return True
 
 
 
 class AppTable:
 
-    def __init__(self):
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, refresh: bool = False):
         """
         Class to represent the app table on FeatureCloud
+
+        :param refresh: revalidate the cached app list regardless of its age
         """
-        self.client = httpx.Client(base_url="https://featurecloud.ai", headers=DEFAULT_HEADERS)
-        self.limiter = RateLimiter()
+        self.client = get_client(base_url=FEATURECLOUD_URL, headers=DEFAULT_HEADERS)
+        self.limiter = get_limiter("featurecloud")
+        self.cache = ResponseCache(name="apps", ttl=CATALOG_TTL)
+        if refresh:
+            self.cache.expire()
         self.apps = self._get_app_list()
+
+
+    @classmethod
+    def shared(cls):
+        """
+        Get the app table of this process. The catalog is only downloaded once.
+
+        :return: AppTable instance
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
         
 
     def _get_app_list(self) -> dict:
@@ -311,16 +983,268 @@ class AppTable:
 
         :return: dict of app slugs and their IDs
         """
-        self.limiter.wait()
-        r = self.client.get("/api/apps/")
-        r.raise_for_status()
-        apps = r.json()
+        apps = self.cache.get(client=self.client, url="/api/apps/", limiter=self.limiter)
         # get dict of slugs to IDs
         apps = {app["slug"]: app["id"] for app in apps}
         return apps
 
 
 
+def token_expiry(token: str) -> float | None:
+    """
+    Read the expiry time from the payload of a JWT without verifying it
+
+    :param token: encoded JWT
+    :return: unix time of expiry, None if the token carries no expiry
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return float(claims["exp"])
+    except (IndexError, KeyError, ValueError, TypeError):
+        return None
+
+
+
+def token_expired(token: str | None, margin: int = 30) -> bool:
+    """
+    Check whether a token is missing or expires within a safety margin.
+    Tokens without readable expiry are assumed valid, the server rejects them if not.
+
+    :param token: encoded JWT
+    :param margin: seconds before the actual expiry to consider the token expired
+    :return: True if the token can't be used anymore
+    """
+    if not token:
+        return True
+    expiry = token_expiry(token)
+    if expiry is None:
+        return False
+    return expiry - margin < time.time()
+
+
+
+def cache_key(name: str) -> str:
+    """
+    Hash a name (e.g. a username, which are email addresses) into a safe filename
+
+    :param name: name to hash
+    :return: hex digest
+    """
+    return hashlib.sha256(name.encode()).hexdigest()[:32]
+
+
+
+def write_private(path: Path, data: dict):
+    """
+    Atomically write json to a file that is only accessible by the owner
+
+    :param path: file to write
+    :param data: json-serialisable data
+    """
+    path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+    # a unique temporary file per writer, several processes may save the same cache entry
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+
+class TokenCache:
+
+    def __init__(self, username: str, cache_dir: Path | None = None):
+        """
+        On-disk cache of the auth tokens of a FeatureCloud user.
+        Files are only readable by the owner.
+
+        :param username: name on FeatureCloud.ai
+        :param cache_dir: directory of the cache, defaults to CACHE_DIR
+        """
+        self.username = username
+        self.cache_dir = Path(cache_dir or CACHE_DIR) / "tokens"
+        self.path = self.cache_dir / f"{cache_key(username)}.json"
+
+
+    def load(self) -> dict | None:
+        """
+        Load cached tokens of the user
+
+        :return: dict with access and refresh token, None if nothing is cached
+        """
+        try:
+            with open(self.path) as f:
+                tokens = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if tokens.get("username") != self.username:
+            return None
+        return tokens
+
+
+    def save(self, access: str, refresh: str | None):
+        """
+        Write the tokens of the user to the cache
+
+        :param access: access token
+        :param refresh: refresh token
+        """
+        tokens = {"username": self.username, "access": access, "refresh": refresh}
+        write_private(self.path, tokens)
+
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+
+class ResponseCache:
+
+    def __init__(self, name: str, ttl: float, cache_dir: Path | None = None):
+        """
+        On-disk cache of a json GET response. Fresh entries are served locally, 
+        stale ones are revalidated with ETag/Last-Modified where the server supports it.
+
+        :param name: name of the cache entry
+        :param ttl: seconds an entry is used without asking the server
+        :param cache_dir: directory of the cache, defaults to CACHE_DIR
+        """
+        self.ttl = ttl
+        self.path = Path(cache_dir or CACHE_DIR) / "http" / f"{name}.json"
+
+
+    def _load(self) -> dict | None:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+    def get(self, client: httpx.Client, url: str, limiter: RateLimiter):
+        """
+        Get the json body of a response, from the cache if possible
+
+        :param client: client to send the request with
+        :param url: URL to GET
+        :param limiter: rate limiter of the caller
+        :return: json response
+        """
+        entry = self._load()
+        if entry and time.time() - entry["fetched"] < self.ttl:
+            return entry["data"]
+        limiter.wait()
+        r = client.get(url, headers=self._validators(entry))
+        return self._store(r, entry)
+
+
+    @staticmethod
+    def _validators(entry: dict | None) -> dict:
+        """
+        Conditional request headers for revalidating a cache entry
+
+        :param entry: cached entry, None if there is none
+        :return: dict of headers
+        """
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+
+    def _store(self, r: httpx.Response, entry: dict | None):
+        """
+        Update the cache with the response of a (conditional) request
+
+        :param r: response to the request
+        :param entry: cached entry the request was sent for, None if there is none
+        :return: json response
+        """
+        if r.status_code == 304 and entry:
+            entry["fetched"] = time.time()
+            write_private(self.path, entry)
+            return entry["data"]
+        r.raise_for_status()
+        entry = {
+            "fetched": time.time(),
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "data": r.json(),
+        }
+        write_private(self.path, entry)
+        return entry["data"]
+
+
+    def expire(self):
+        """
+        Mark the entry as stale, it is revalidated on the next access
+        """
+        entry = self._load()
+        if entry:
+            entry["fetched"] = 0
+            write_private(self.path, entry)
+
+
+    def invalidate(self):
+        """
+        Drop the entry, e.g. after a write that changed the resource
+        """
+        self.path.unlink(missing_ok=True)
+
+
+
+class UserAuth(httpx.Auth):
+
+    requires_response_body = True
+
+    def __init__(self, user):
+        """
+        Attach the access token of a user to requests.
+        Expired tokens are renewed before sending, rejected ones (401) after.
+
+        :param user: User instance
+        """
+        self.user = user
+
+
+    def auth_flow(self, request: httpx.Request):
+        if token_expired(self.user.access):
+            yield from self._renew()
+        request.headers["Authorization"] = f"Bearer {self.user.access}"
+        response = yield request
+        if response.status_code == 401:
+            yield from self._renew()
+            request.headers["Authorization"] = f"Bearer {self.user.access}"
+            yield request
+
+
+    def _renew(self):
+        """
+        Refresh the access token if possible, otherwise log in with the password
+        """
+        user = self.user
+        if not token_expired(user.refresh):
+            log(f"Refreshing token of user {user.username}...")
+            user.limiter.wait()
+            response = yield user._refresh_request()
+            if response.status_code == 200:
+                user._set_tokens(response.json())
+                return
+        log(f"Logging in user {user.username}...")
+        user.limiter.wait()
+        response = yield user._login_request()
+        response.raise_for_status()
+        user._set_tokens(response.json())
+
+
+
 class User: 
 
     def __init__(self, username: str):
@@ -329,47 +1253,97 @@ class User:
 
         :param username: name on FeatureCloud.ai
         """
-        self.client = httpx.Client(base_url="https://featurecloud.ai", headers=DEFAULT_HEADERS)
+        # the .env file also holds connection settings, so it is read before the client is created
         load_dotenv(dotenv_path='.env', override=True)
+        self.client = new_client(base_url=FEATURECLOUD_URL, headers=DEFAULT_HEADERS)
+        self.client.auth = UserAuth(user=self)
         self.username = username
         self.password = os.getenv(f"{username}")
         assert self.password is not None, f"Credentials for {username} not found."
         self.access = None
         self.refresh = None
-        self.limiter = RateLimiter()
-        # login as soon as user is created
-        self.login()
-        self.is_logged_in()
-        self.get_site_info()
-        # get the app list
-        self.apps = AppTable().apps
+        self.tokens = TokenCache(username=username)
+        self.purchased = ResponseCache(name=f"purchased_{cache_key(username)}", ttl=ENTITLEMENT_TTL)
+        self.limiter = get_limiter("featurecloud")
+        self.site_info = None
+        # authenticate as soon as user is created, free if a cached token is valid
+        # everything else is fetched once a command needs it
+        self.authenticate()
+
+
+    @property
+    def apps(self) -> dict:
+        """
+        Apps on FeatureCloud, loaded on first access
+
+        :return: dictionary of app slugs and IDs
+        """
+        return AppTable.shared().apps
         
 
 
+    def authenticate(self):
+        """
+        Reuse cached tokens if they are still valid, refresh them if possible,
+        and only log in with the password otherwise.
+        """
+        cached = self.tokens.load()
+        if cached:
+            self.access, self.refresh = cached["access"], cached["refresh"]
+        if not token_expired(self.access):
+            log(f"Using cached token of user {self.username}")
+            return
+        if not token_expired(self.refresh):
+            try:
+                self.refresh_token()
+                return
+            except httpx.HTTPStatusError:
+                log(f"Failed to refresh token of user {self.username}")
+        self.login()
+
+
+    def _set_tokens(self, data: dict):
+        """
+        Store new tokens from a login or refresh response
+
+        :param data: json response of the auth endpoint
+        """
+        self.access = data["access"]
+        # the refresh token is only rotated on login
+        self.refresh = data.get("refresh", self.refresh)
+        self.tokens.save(access=self.access, refresh=self.refresh)
+
+
+    def _login_request(self) -> httpx.Request:
+        return self.client.build_request(
+            "POST", "/api/auth/login/", json={"username": self.username, "password": self.password})
+
+
+    def _refresh_request(self) -> httpx.Request:
+        return self.client.build_request(
+            "POST", "/api/auth/token/refresh/", json={"refresh": self.refresh})
+
+
     def login(self):
         """
         Login as this user
         """
         log(f"Logging in user {self.username}...")
         self.limiter.wait()
-        r = self.client.post("/api/auth/login/",
-                             json={"username": self.username, "password": self.password})
+        # auth endpoints are called without the (possibly stale) bearer token
+        r = self.client.send(self._login_request(), auth=None)
         r.raise_for_status()
-        data = r.json()
-        self.access = data["access"]
-        self.refresh = data["refresh"]
-        self.client.headers["Authorization"] = f"Bearer {self.access}"
+        self._set_tokens(r.json())
         
 
     def refresh_token(self):
         """
-        Method to refresh a temporary token. Currently unused.
+        Use the refresh token to get a new access token
         """
         self.limiter.wait()
-        r = self.client.post("/api/auth/token/refresh/", json={"refresh": self.refresh})
+        r = self.client.send(self._refresh_request(), auth=None)
         r.raise_for_status()
-        self.access = r.json()["access"]
-        self.client.headers["Authorization"] = f"Bearer {self.access}"
+        self._set_tokens(r.json())
 
 
     def is_logged_in(self) -> bool:
@@ -404,6 +1378,18 @@ class User:
             f.write(r.text)
         assert Path("data_fc/site_info.json").exists(), "Failed to write site_info.json"
         return site_info
+
+
+    def ensure_site_info(self) -> dict:
+        """
+        Write the site_info.json marker once per user.
+        Only commands that involve the local controller need it.
+
+        :return: json snippet
+        """
+        if self.site_info is None:
+            self.site_info = self.get_site_info()
+        return self.site_info
     
 
     def get_purchased_apps(self) -> dict:
@@ -412,10 +1398,7 @@ class User:
 
         :return: dict of app slugs and IDs
         """
-        self.limiter.wait()
-        r = self.client.get("/api/apps/purchase/")
-        r.raise_for_status()
-        apps = r.json()
+        apps = self.purchased.get(client=self.client, url="/api/apps/purchase/", limiter=self.limiter)
         # get dict of slugs to IDs
         apps = {app["slug"]: app["id"] for app in apps}
         return apps
@@ -450,8 +1433,8 @@ class User:
         app_id = self.apps.get(slug)
         self.limiter.wait()
         r = self.client.post(f"/api/apps/{app_id}/purchase/")
+        self.purchased.invalidate()
         r.raise_for_status()
-        assert self.owns_app(slug), f"Failed to purchase app {slug} for user {self.username}."
         return True
     
 
@@ -471,24 +1454,68 @@ class User:
         # remove app from purchased apps
         self.limiter.wait()
         r = self.client.delete(f"/api/apps/{app_id}/purchase/")
+        self.purchased.invalidate()
         r.raise_for_status()
-        assert not self.owns_app(slug), f"Failed to remove app {slug} for user {self.username}."
         return True
 
 
 
+class PollSchedule:
+
+    def __init__(self, min_interval: float = 1, max_interval: float = 60, backoff: float = 1.5,
+                 jitter: float = 0.2, phase_max: dict | None = None):
+        """
+        Adaptive intervals for status polling: short right after a transition,
+        growing exponentially while nothing changes, with random jitter so that
+        several participants don't poll in lockstep.
+
+        :param min_interval: seconds between polls after a transition
+        :param max_interval: upper bound of the interval
+        :param backoff: factor to increase the interval after each unchanged poll
+        :param jitter: relative random variation of each interval
+        :param phase_max: upper bound of the interval for specific states, defaults to PHASE_MAX_INTERVAL
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.phase_max = PHASE_MAX_INTERVAL if phase_max is None else phase_max
+        self.interval = min_interval
+
+
+    def reset(self):
+        self.interval = self.min_interval
+
+
+    def next(self, status: str) -> float:
+        """
+        Get the time to sleep before the next poll
+
+        :param status: current status of the project
+        :return: seconds to sleep
+        """
+        delay = self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+        cap = min(self.phase_max.get(status, self.max_interval), self.max_interval)
+        self.interval = min(self.interval * self.backoff, cap)
+        return delay
+
+
+
 class FCC:
 
-    def __init__(self, user: User, project: Project):
+    def __init__(self, user: User, project: Project, controller: Controller | None = None,
+                 controller_timeout: float = CONTROLLER_TIMEOUT):
         """
         Class to represent a User acting within a specific project
 
         :param user: User instance
         :param project: Project instance
+        :param controller: local controller, defaults to the shared one of this process
+        :param controller_timeout: seconds to wait for the controller to answer
         """
-        # verify that controller is running
-        self.controller = Controller()
-        assert self.controller.controller_is_running()
+        # wait for the controller, it may still be starting up
+        self.controller = controller or get_controller()
+        self.controller.wait_until_ready(timeout=controller_timeout)
         # attach objects
         self.project = project
         self.user = user
@@ -500,20 +1527,55 @@ class FCC:
 
         :return: True if user is coordinator
         """
-        self.user.limiter.wait()
-        r = self.user.client.get(f"/api/projects/{self.project.project_id}/")
-        r.raise_for_status()      # raise error if project doesn't exist
-        data = r.json()
-        role = data.get("role")
+        # the role is part of the same project resource as the status
+        role = self.project.get_role()
         is_coordinator = role == "coordinator"
         return is_coordinator
 
 
-    def upload_files(self, filepaths: list[str]) -> dict:
+    def _upload_file(self, path: Path, headers: dict) -> str:
+        """
+        Stream a single file to the controller without loading it into memory
+
+        :param path: path of the file to upload
+        :param headers: request headers
+        :return: response text of the controller
+        """
+        size = path.stat().st_size
+        progress = TransferProgress(label=f"Upload {path.name}", total=size)
+        params = {
+            "projectId": self.project.project_id,
+            "fileName": path.name,
+            "finalize": "",
+            "consent": ""
+        }
+
+        def read_chunks(f):
+            while chunk := f.read(CHUNK_SIZE):
+                progress.update(len(chunk))
+                yield chunk
+
+        with open(path, "rb") as f:
+            # files are 'uploaded' to the controller, not to FeatureCloud
+            # with a known length the body is sent as a plain stream rather than chunked encoding
+            self.controller.limiter.wait()
+            r = self.controller.client.post(
+                "/file-upload/",
+                params=params,
+                content=read_chunks(f),
+                headers={**headers, "Content-Length": str(size)}
+            )
+            r.raise_for_status()
+        progress.finish()
+        return r.text
+
+
+    def upload_files(self, filepaths: list[str], jobs: int = 1) -> dict:
         """
         Upload files to a project as a specific FeatureCloud User
 
         :param filepaths: paths to the files to upload
+        :param jobs: number of files to upload concurrently, defaults to 1
         :raises PermissionError: First data upload needs to be done from the coordinator
         :return: dict of booleans for each uploaded file
         """
@@ -536,83 +1598,111 @@ class FCC:
             # if not try to progress to 'prepare' state    
             log(f"Project {self.project.project_id} not in 'prepare' mode. Setting it now as coordinator.")
             self.project.set_status("prepare")
-            time.sleep(2)  # wait a bit for status to update
-            assert self.project.is_prepping(), "Failed to set project to 'prepare' mode."
+            # poll until the status change is visible instead of sleeping a fixed time
+            wait_for(self.project.is_prepping, timeout=STATUS_TIMEOUT,
+                     desc=f"project {self.project.project_id} to be in 'prepare' mode")
 
-        # collect confirmations from all uploads
-        results = {}
         headers = {
             "Origin": "https://featurecloud.ai",
             "Accept": "application/json, text/plain, */*"
         }
         
-        # upload all data
-        for filepath in filepaths:
-            path = Path(filepath)
-            file_name = path.name
-            params = {
-                "projectId": self.project.project_id,
-                "fileName": file_name,
-                "finalize": "",
-                "consent": ""
-            }
-            with open(path, "rb") as f:
-                # files are 'uploaded' to the controller, not to FeatureCloud
-                r = self.controller.client.post("/file-upload/", params=params, content=f.read(), headers=headers)
-                r.raise_for_status()
-                results[file_name] = r.text  # or r.json() if backend returns JSON
-            time.sleep(2)  # to avoid overwhelming the server
+        # upload all data and collect confirmations
+        paths = [Path(filepath) for filepath in filepaths]
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            responses = pool.map(lambda path: self._upload_file(path=path, headers=headers), paths)
+            results = {path.name: text for path, text in zip(paths, responses)}
 
         # finalize upload from this participant
         # setting the 'finalize' flag finishes the upload from a single participant
-        time.sleep(2)
         params = {
             "projectId": self.project.project_id,
             "fileName": "",     
             "finalize": "true", # triggers processing
             "consent": ""       
         }
+        self.controller.limiter.wait()
         r = self.controller.client.post("/file-upload/", params=params, headers=headers, content=b"")
         r.raise_for_status()
-        time.sleep(2)
         return results
 
 
-    def monitor_project(self, interval: int = 5, timeout: int = 60) -> str:
+    def watch_status(self, timeout: float | None = None, schedule: PollSchedule | None = None,
+                     prepare_timeout: float | None = PREPARE_TIMEOUT):
+        """
+        Poll the project status adaptively and yield each transition as it happens.
+        Stops after the project leaves the 'prepare' and 'running' states.
+
+        :param timeout: maximum time to watch in seconds after the project leaves 'prepare', defaults to no limit
+        :param schedule: PollSchedule for the polling intervals
+        :param prepare_timeout: maximum time in seconds the project may stay in 'prepare', None for no limit
+        :raises TimeoutError: if the project is still active after the timeout, or still in 'prepare'
+        :yield: tuples of (previous status, new status), previous is None for the first query
+        """
+        schedule = schedule or PollSchedule()
+        prepare_deadline = time.monotonic() + prepare_timeout if prepare_timeout is not None else None
+        deadline = None
+        previous = None
+        while True:
+            status = self.project.get_status()
+            if status != previous:
+                yield previous, status
+                previous = status
+                schedule.reset()
+            if status not in ACTIVE_STATES:
+                return
+            delay = schedule.next(status)
+            if status == "prepare":
+                # pulling the apps can take long, so 'prepare' has its own timeout
+                limit, reason = prepare_deadline, f"did not leave 'prepare' within {prepare_timeout} seconds"
+            else:
+                if deadline is None and timeout is not None:
+                    deadline = time.monotonic() + timeout
+                limit, reason = deadline, f"did not finish within {timeout} seconds"
+            if limit is not None:
+                remaining = limit - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Project {self.project.project_id} {reason}.")
+                delay = min(delay, remaining)
+            time.sleep(delay)
+
+
+    def monitor_project(self, timeout: int = 60, schedule: PollSchedule | None = None, callback=None,
+                        prepare_timeout: float | None = PREPARE_TIMEOUT) -> str:
         """
         Poll the project status until it changes from 'running'.
+        Polls are fast after transitions and back off while the status is unchanged.
 
-        :param interval: time between queries, defaults to 5
-        :param timeout: maximum time to wait for project to finish, defaults to 60
+        :param timeout: maximum time to wait for the running project to finish, defaults to 60
+        :param schedule: PollSchedule for the polling intervals
+        :param callback: called with (previous, status) on every status transition
+        :param prepare_timeout: maximum time to wait for the project to leave 'prepare', None for no limit
         :raises TimeoutError: if not finishing within timeout
         :return: final status
         """
-        start_time = time.time()
-        
-        while True:
-            # query the project status
-            status = self.project.get_status()
-            log(f"Project {self.project.project_id} status: {status}")
-            
-            if status == 'prepare':
-                time.sleep(interval)
-                continue
-            
-            if status != "running":
-                log(f"Project {self.project.project_id} ended with status: {status}")
-                return status  # finished, failed, or any other state
-            
-            if time.time() - start_time > timeout:
+        status = None
+        try:
+            for previous, status in self.watch_status(timeout=timeout, schedule=schedule,
+                                                      prepare_timeout=prepare_timeout):
+                log(f"Project {self.project.project_id} status: {status}")
+                if callback is not None:
+                    callback(previous, status)
+        except TimeoutError:
+            if self.project.get_status() == "running":
                 # stop the project through the api
                 self.project.set_status("shutdown")
-                time.sleep(5)
-                status = self.project.get_status()
-                if status == "stopped":
-                    self.project.reset_project()
 
-                raise TimeoutError(f"Project {self.project.project_id} did not finish within {timeout} seconds.")
+                def stopped_status():
+                    status = self.project.get_status()
+                    return status if status != "running" else None
 
-            time.sleep(interval)
+                status = wait_for(stopped_status, timeout=STATUS_TIMEOUT,
+                                  desc=f"project {self.project.project_id} to shut down")
+                if status == "stopped":
+                    self.project.reset_project()
+            raise
+        log(f"Project {self.project.project_id} ended with status: {status}")
+        return status  # finished, failed, or any other state
 
 
 
@@ -629,76 +1719,157 @@ class FCC:
 
 
 
-    def _download_file(self, endpoint: str, filetype: str, out_dir: str, run: int, step: int) -> Path:
+    def _download_file(self, endpoint: str, filetype: str, out_dir: str, run: int, step: int,
+                       retries: int = 3, force: bool = False) -> Path:
         """
-        Generic method to download a file from the controller client
+        Generic method to download a file from the controller client.
+        The response is streamed to a .part file, which is resumed with a Range request
+        after an interruption if the controller supports it.
+        The ETag or Last-Modified header of the response is stored next to the .part file and sent
+        as If-Range on resume, so the controller sends the whole file again if it has changed.
+        A .part file without a stored validator is downloaded from the start.
+        Existing complete files are kept as they are unless force is set.
 
         :param endpoint: URL endpoint to query
         :param filetype: Differs for logs and results
         :param out_dir: Directory to store output in
         :param run: Which number of run to download from
         :param step: Which step of project to download for
+        :param retries: number of resume attempts after connection errors
+        :param force: whether to download the file again even if it exists
         :return: Path of the downloaded file
         """
         params = {"projectId": self.project.project_id, "step": step, "run": run}
-        r = self.controller.client.get(endpoint, params=params)
-        r.raise_for_status()
-
         filename = f"p{self.project.project_id}_r{run}_s{step}.{filetype}"
         filepath = Path(out_dir) / filename
-        with open(filepath, "wb") as f:
-            f.write(r.content)
+        partpath = filepath.with_name(filename + ".part")
+        tagpath = filepath.with_name(filename + ".part.tag")
+        if filepath.is_file() and not force:
+            log(f"Already downloaded {filepath}")
+            return filepath
+        # a .part file of an earlier download is only resumed if the controller can check it is unchanged
+        validator = tagpath.read_text() if tagpath.is_file() and not force else None
+        if validator is None:
+            partpath.unlink(missing_ok=True)
+
+        for attempt in range(retries + 1):
+            offset = partpath.stat().st_size if partpath.is_file() else 0
+            headers = {}
+            if offset:
+                headers["Range"] = f"bytes={offset}-"
+                if validator:
+                    headers["If-Range"] = validator
+            try:
+                self.controller.limiter.wait()
+                with self.controller.client.stream("GET", endpoint, params=params, headers=headers,
+                                                   extensions={"transfer": True}) as r:
+                    if r.status_code == 416:
+                        # nothing left to fetch, the part file is complete
+                        break
+                    r.raise_for_status()
+                    # controller may ignore the range, or the file changed, and it sends the whole file
+                    resumed = r.status_code == 206
+                    validator = (r.headers.get("ETag") or r.headers.get("Last-Modified")
+                                 or (validator if resumed else None))
+                    if validator:
+                        tagpath.write_text(validator)
+                    else:
+                        tagpath.unlink(missing_ok=True)
+                    length = r.headers.get("Content-Length")
+                    total = int(length) + (offset if resumed else 0) if length else None
+                    progress = TransferProgress(label=f"Download {filename}", total=total)
+                    progress.update(offset if resumed else 0)
+                    with open(partpath, "ab" if resumed else "wb") as f:
+                        for chunk in r.iter_bytes(CHUNK_SIZE):
+                            f.write(chunk)
+                            progress.update(len(chunk))
+                progress.finish()
+                break
+            except httpx.TransportError as e:
+                if attempt == retries:
+                    raise
+                log(f"Download of {filename} interrupted ({e}), resuming...")
+
+        partpath.replace(filepath)
+        tagpath.unlink(missing_ok=True)
         log(f"Downloaded {filepath}")
         return filepath
-    
 
-    def download_outcome(self, out_dir: str) -> list[str]:
+
+    def download_outcome(self, out_dir: str, runs: str | list[int] = "latest", jobs: int = 4,
+                         force: bool = False) -> list[str]:
         """
-        Download the log and result files of the most recent run of the attached project.
+        Download the log and result files of runs of the attached project.
+        All steps of the selected runs are downloaded concurrently.
 
         :param out_dir: Directory to save the output at
+        :param runs: 'latest', 'all' or a list of run numbers, defaults to 'latest'
+        :param jobs: maximum number of concurrent downloads, defaults to 4
+        :param force: whether to download files again that exist in out_dir
         :return: list of downloaded files
         """
         Path(out_dir).mkdir(exist_ok=True, parents=True)
-        runs = self._get_project_runs()
+        project_runs = self._get_project_runs()
         log(f"Downloading files for project {self.project.project_id}...")
-        most_recent = runs[0]  # assuming runs are sorted by recency
-        log(f"Found {len(runs)} run(s). Downloading most recent run, started on {most_recent['startedOn']}")
-        # download log files    
-        downloaded = []   
-        for step in most_recent.get("logSteps", []):
-            logpath = self._download_file(
-                endpoint="/logs-download/",
-                filetype="log",
-                out_dir=out_dir,
-                run=most_recent['runNr'],
-                step=step
-            ) 
-            downloaded.append(str(logpath))
-        # download result files
-        for step in most_recent.get("resultSteps", []):
-            resultpath = self._download_file(
-                endpoint="/file-download/",
-                filetype="zip",
-                out_dir=out_dir,
-                run=most_recent['runNr'],
-                step=step
-            )
-            downloaded.append(str(resultpath))
+        selected = select_runs(project_runs=project_runs, runs=runs)
+        log(f"Found {len(project_runs)} run(s). Downloading run(s) {[run['runNr'] for run in selected]}")
+        # collect log and result files of all selected runs
+        downloads = []
+        for run in selected:
+            for step in run.get("logSteps", []):
+                downloads.append(("/logs-download/", "log", run['runNr'], step))
+            for step in run.get("resultSteps", []):
+                downloads.append(("/file-download/", "zip", run['runNr'], step))
+
+        def fetch(download):
+            endpoint, filetype, run_nr, step = download
+            return self._download_file(endpoint=endpoint, filetype=filetype, out_dir=out_dir, run=run_nr, step=step,
+                                       force=force)
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            downloaded = [str(path) for path in pool.map(fetch, downloads)]
         return downloaded
 
 
 
+def select_runs(project_runs: list[dict], runs: str | list[int] = "latest") -> list[dict]:
+    """
+    Select runs of a project from the response of the controller
+
+    :param project_runs: runs as returned by /project-runs/
+    :param runs: 'latest', 'all' or a list of run numbers
+    :raises ValueError: if the project has no runs or a requested run doesn't exist
+    :return: list of selected runs
+    """
+    if not project_runs:
+        raise ValueError("Project has no runs to download.")
+    if runs == "latest":
+        return [max(project_runs, key=lambda run: run["runNr"])]
+    if runs == "all":
+        return list(project_runs)
+    wanted = {int(r) for r in runs}
+    selected = [run for run in project_runs if run["runNr"] in wanted]
+    missing = wanted - {run["runNr"] for run in selected}
+    if missing:
+        raise ValueError(f"Run(s) {sorted(missing)} not found, available: {[run['runNr'] for run in project_runs]}")
+    return selected
+
+
+
 # The following functions are used by the subcommands in the command-line interface
-def create_project_and_tokens(username: str, tool: str, n_participants: int):
+def create_project_and_tokens(username: str, tool: str, n_participants: int,
+                              user: User | None = None) -> tuple[str, list[str]]:
     """
     Create a new project on Featurecloud.ai and generate participant tokens.
 
     :param username: Username of the user creating the project.
     :param tool: Tool to be used in the project.
     :param n_participants: Number of participant tokens to create.
+    :param user: logged-in User to reuse, e.g. in the agent
+    :return: project ID and participant tokens
     """
-    user = User(username=username)
+    user = user or User(username=username)
+    user.ensure_site_info()
     # check if user owns the app otherwise purchase it
     app_id = user.apps.get(tool)
     if app_id is None:
@@ -714,109 +1885,154 @@ def create_project_and_tokens(username: str, tool: str, n_participants: int):
     for t in tokens:
         log(f"TOKEN: {t['token']}")
     log("\n")
+    return str(new_proj.project_id), [t['token'] for t in tokens]
 
 
 
 
-def contribute_data(username: str, project_id: str, data_list: list[str]):
+def contribute_data(username: str, project_id: str, data_list: list[str], jobs: int = 1,
+                    controller: str | None = None, controller_timeout: float = CONTROLLER_TIMEOUT,
+                    user: User | None = None) -> dict:
     """
     Contribute data to a project
 
     :param username: username of the user contributing data
     :param project_id: ID of the project to contribute data to
     :param data_list: List of paths to be contributed
+    :param jobs: number of files to upload concurrently
+    :param controller: URL of the local controller, defaults to controller_url()
+    :param controller_timeout: seconds to wait for the controller to answer
+    :param user: logged-in User to reuse, e.g. in the agent
+    :return: responses of the controller for each file
     """
-    user = User(username=username)
+    user = user or User(username=username)
+    user.ensure_site_info()
     proj = Project.from_project_id(project_id=project_id, client=user.client)    
-    fcc = FCC(user=user, project=proj)
+    fcc = FCC(user=user, project=proj, controller=get_controller(controller), controller_timeout=controller_timeout)
     # upload all files in data_path
     # finalisation of upload is triggered at the end
-    fcc.upload_files(filepaths=data_list)
+    results = fcc.upload_files(filepaths=data_list, jobs=jobs)
     # the project starts when all participants have uploaded their data
     print(f"{username} uploaded data to project {project_id}")
+    return results
 
 
 
-def join_project(username: str, token: str, project_id: str):
+def join_project(username: str, token: str, project_id: str, user: User | None = None) -> str:
     """
     Join a FeatureCloud project using a token generated during project creation.
 
     :param username: FeatureCloud username
     :param token: Project participation token
     :param project_id: Numeric ID of the project to join
+    :param user: logged-in User to reuse, e.g. in the agent
+    :return: ID of the joined project
     """
-    user = User(username=username)
+    user = user or User(username=username)
+    user.ensure_site_info()
     joined_proj = Project.from_token(token=token, project_id=project_id, client=user.client)
     log(f"{username} joined project: {joined_proj.project_id}")
+    return str(joined_proj.project_id)
 
 
 
-def monitor_project(username: str, project_id: str, timeout: int = 60):
+def monitor_project(username: str, project_id: str, timeout: int = 60, max_interval: float = 60,
+                    controller: str | None = None, controller_timeout: float = CONTROLLER_TIMEOUT,
+                    user: User | None = None, prepare_timeout: float | None = PREPARE_TIMEOUT) -> str:
     """
     Monitor a running FeatureCloud project until status changes from 'running'.
 
     :param username: FeatureCloud username
     :param project_id: ID of the project to monitor
-    :param timeout: maximum time to wait for project to finish, defaults to 60
+    :param timeout: maximum time to wait for the running project to finish, defaults to 60
+    :param max_interval: longest time between status queries, defaults to 60
+    :param controller: URL of the local controller, defaults to controller_url()
+    :param controller_timeout: seconds to wait for the controller to answer
+    :param user: logged-in User to reuse, e.g. in the agent
+    :param prepare_timeout: maximum time to wait for the project to leave 'prepare', None for no limit
+    :return: final status
     """
-    user = User(username=username)
+    user = user or User(username=username)
+    user.ensure_site_info()
     proj = Project.from_project_id(project_id=project_id, client=user.client)    
-    fcc = FCC(user=user, project=proj)
+    fcc = FCC(user=user, project=proj, controller=get_controller(controller), controller_timeout=controller_timeout)
     # monitor the project run
-    final_status = fcc.monitor_project(timeout=timeout)
+    final_status = fcc.monitor_project(timeout=timeout, schedule=PollSchedule(max_interval=max_interval),
+                                       prepare_timeout=prepare_timeout)
     print(f"Project {project_id} status: {final_status}")
+    return final_status
    
 
 
-def query_project(username: str, project_id: str):
+def query_project(username: str, project_id: str, user: User | None = None) -> str:
     """
     Query the status of a FeatureCloud project.
 
     :param username: FeatureCloud username
     :param project_id: ID of the project to monitor
+    :param user: logged-in User to reuse, e.g. in the agent
+    :return: status of the project
     """
-    user = User(username=username)
+    user = user or User(username=username)
     proj = Project.from_project_id(project_id=project_id, client=user.client)    
     status = proj.get_status()
     log(f"{status}")
+    return status
     
     
     
-def download_project(username: str, project_id: str, out_dir: str):
+def download_project(username: str, project_id: str, out_dir: str, runs: str | list[int] = "latest",
+                     jobs: int = 4, controller: str | None = None, controller_timeout: float = CONTROLLER_TIMEOUT,
+                     user: User | None = None, force: bool = False) -> list[str]:
     """
-    Download logs and results of the most recent run of a FeatureCloud project.
+    Download logs and results of runs of a FeatureCloud project.
 
     :param username: FeatureCloud username
     :param project_id: ID of the project to download from
     :param out_dir: Directory to save the output at
+    :param runs: 'latest', 'all' or a list of run numbers
+    :param jobs: maximum number of concurrent downloads
+    :param controller: URL of the local controller, defaults to controller_url()
+    :param controller_timeout: seconds to wait for the controller to answer
+    :param user: logged-in User to reuse, e.g. in the agent
+    :param force: whether to download files again that exist in out_dir
+    :return: paths of the downloaded files
     """
-    user = User(username=username)
+    user = user or User(username=username)
+    user.ensure_site_info()
     proj = Project.from_project_id(project_id=project_id, client=user.client)    
-    fcc = FCC(user=user, project=proj)
-    downloaded_files = fcc.download_outcome(out_dir=out_dir)
-    log(f"Downloaded files to {out_dir}: \n{downloaded_files}")
+    fcc = FCC(user=user, project=proj, controller=get_controller(controller), controller_timeout=controller_timeout)
+    downloaded_files = fcc.download_outcome(out_dir=out_dir, runs=runs, jobs=jobs, force=force)
+    log(f"Downloaded {len(downloaded_files)} file(s) to {out_dir}")
+    # one line per file, parsed by ClientManager.fetch_results
+    for path in downloaded_files:
+        log(f"FILE: {path}")
+    return downloaded_files
 
 
 
-def reset_project(username: str, project_id: str):
+def reset_project(username: str, project_id: str, user: User | None = None):
     """
     Reset a FeatureCloud project to 'ready' status.
 
     :param username: FeatureCloud username
     :param project_id: ID of the project to reset
+    :param user: logged-in User to reuse, e.g. in the agent
     """
-    user = User(username=username)
+    user = user or User(username=username)
     proj = Project.from_project_id(project_id=project_id, client=user.client)    
     proj.reset_project()
     log(f"Project {project_id} has been reset to 'ready' status.")
 
 
 
-def list_apps():
+def list_apps(refresh: bool = False):
     """
     List available apps on FeatureCloud.ai
+
+    :param refresh: revalidate the cached app list with the server
     """
-    apps = AppTable().apps.keys()
+    apps = AppTable(refresh=refresh).apps.keys()
     for app in apps:
         log(f"{app}")
 
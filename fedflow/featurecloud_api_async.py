@@ -0,0 +1,1157 @@
+import asyncio
+import os
+from pathlib import Path
+import time
+
+import httpx
+from dotenv import load_dotenv
+
+from fedflow.logger import log
+from fedflow.metrics import AsyncMetricsTransport, add_blocked
+from fedflow.utils import poll_delays, randstr, TransferProgress
+from fedflow import featurecloud_api
+from fedflow.featurecloud_api import (
+    ACTIVE_STATES, CATALOG_TTL, CHUNK_SIZE, CONTROLLER_TIMEOUT, DEFAULT_HEADERS, ENTITLEMENT_TTL,
+    FEATURECLOUD_URL, PREPARE_TIMEOUT, SNAPSHOT_TTL, STATUS_TIMEOUT, PollSchedule, ResponseCache, RetryPolicy,
+    TokenCache, UserAuth, cache_key, controller_url, get_limiter, select_runs, token_expired, upstream_of
+)
+
+
+
+async def async_wait_for(condition, timeout: float = 30, interval: float = 0.2, backoff: float = 1.5,
+                         max_interval: float = 5, desc: str = "condition"):
+    """
+    Async counterpart of utils.wait_for, the condition is a coroutine function
+
+    :param condition: coroutine function without arguments
+    :param timeout: seconds until giving up
+    :param interval: seconds before the first re-check
+    :param backoff: factor to increase the interval after each check
+    :param max_interval: upper bound of the interval
+    :param desc: description of the condition for the error message
+    :raises TimeoutError: if the condition is not met within the timeout
+    :return: the truthy value returned by the condition
+    """
+    delays = poll_delays(timeout=timeout, interval=interval, backoff=backoff, max_interval=max_interval, desc=desc)
+    while True:
+        result = await condition()
+        if result:
+            return result
+        await asyncio.sleep(next(delays))
+
+
+
+
+class AsyncRateLimiter:
+
+    def __init__(self, upstream: str):
+        """
+        Async view on the shared rate limiter of an upstream. 
+        Waiting tasks yield to the event loop instead of blocking the thread.
+
+        :param upstream: one of the keys of RATE_LIMITS
+        """
+        self.limiter = get_limiter(upstream)
+
+
+    async def wait(self):
+        start = time.monotonic()
+        if self.limiter.path is not None:
+            # the shared budget takes a file lock, which must not stall the event loop
+            sleep_time = await asyncio.to_thread(self.limiter.reserve)
+        else:
+            sleep_time = self.limiter.reserve()
+        if sleep_time > 0:
+            await asyncio.sleep(sleep_time)
+        add_blocked(time.monotonic() - start)
+
+
+
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, limiter: AsyncRateLimiter):
+        """
+        Async counterpart of featurecloud_api.RetryTransport
+
+        :param transport: transport that sends the requests
+        :param limiter: async view on the rate limiter of the upstream
+        """
+        self.transport = transport
+        self.limiter = limiter
+        self.policy = RetryPolicy(limiter=limiter.limiter)
+
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            try:
+                response = await self.transport.handle_async_request(request)
+            except httpx.TransportError as e:
+                delay = self.policy.retry_error(request, e, attempt)
+                if delay is None:
+                    raise
+                log(f"{request.method} {request.url.path} failed ({e!r}), retrying in {delay:.1f}s")
+            else:
+                self.policy.observe(request, response, time.monotonic() - start)
+                delay = self.policy.retry_response(request, response, attempt)
+                if delay is None:
+                    return response
+                await response.aclose()
+                log(f"{request.method} {request.url.path} returned {response.status_code}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            await self.limiter.wait()
+            attempt += 1
+            request.extensions["retries"] = attempt
+
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+
+class SharedAsyncTransport(httpx.AsyncBaseTransport):
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        """
+        View of a client on a shared async connection pool.
+        Closing the client leaves the pool open, it is closed by featurecloud_api.close_sessions().
+
+        :param transport: shared pool from get_async_transport()
+        """
+        self.transport = transport
+
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self.transport.handle_async_request(request)
+
+
+    async def aclose(self):
+        pass
+
+
+
+def get_async_transport(base_url: str) -> httpx.AsyncBaseTransport:
+    """
+    Get the shared async connection pool for an upstream.
+    Connections belong to the event loop they were opened in, so each loop has its own pool.
+
+    :param base_url: base URL of the upstream
+    :return: shared transport
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    settings = featurecloud_api.get_http_settings()
+    with featurecloud_api._SESSION_LOCK:
+        transports = featurecloud_api._ASYNC_TRANSPORTS
+        # pools of finished event loops can't be used anymore
+        for key in [key for key in transports if key[1] is not None and key[1].is_closed()]:
+            del transports[key]
+        transport = transports.get((base_url, loop))
+        if transport is None:
+            transport = featurecloud_api._ASYNC_NETWORK or httpx.AsyncHTTPTransport(
+                http2=settings.http2, limits=settings.limits())
+            transports[(base_url, loop)] = transport
+        return transport
+
+
+
+def new_async_client(base_url: str, headers: dict | None = None) -> httpx.AsyncClient:
+    """
+    Create an async client on the shared pool of an upstream,
+    which retries throttled requests within the budget of the upstream
+
+    :param base_url: base URL of the upstream
+    :param headers: headers of this client
+    :return: httpx.AsyncClient
+    """
+    upstream = upstream_of(base_url)
+    limiter = AsyncRateLimiter(upstream)
+    network = SharedAsyncTransport(get_async_transport(base_url))
+    transport = AsyncMetricsTransport(AsyncRetryTransport(transport=network, limiter=limiter), upstream=upstream)
+    return httpx.AsyncClient(base_url=base_url, headers=headers, transport=transport,
+                             timeout=featurecloud_api.get_http_settings().timeout())
+
+
+
+class AsyncProjectSnapshot:
+
+    def __init__(self, fetch, ttl: float = SNAPSHOT_TTL):
+        """
+        Async counterpart of featurecloud_api.ProjectSnapshot.
+        Concurrent reads of a stale snapshot await a single in-flight request.
+
+        :param fetch: coroutine function without arguments returning the json of the project
+        :param ttl: seconds until the snapshot is fetched again
+        """
+        self.fetch = fetch
+        self.ttl = ttl
+        self.data = None
+        self.fetched = 0.0
+        self.pending = None
+        self.generation = 0
+
+
+    async def get(self) -> dict:
+        """
+        Get the project, fetching it if the snapshot is stale
+
+        :return: json of the project
+        """
+        if self.data is not None and time.monotonic() - self.fetched < self.ttl:
+            return self.data
+        if self.pending is None:
+            self.pending = asyncio.ensure_future(self._refresh(self.generation))
+        # shielded, so that one cancelled caller doesn't cancel the request of the others
+        return await asyncio.shield(self.pending)
+
+
+    async def _refresh(self, generation: int) -> dict:
+        try:
+            data = await self.fetch()
+            if self.generation == generation:
+                self.data, self.fetched = data, time.monotonic()
+            return data
+        finally:
+            if self.generation == generation:
+                self.pending = None
+
+
+    def invalidate(self):
+        """
+        Drop the snapshot after a write, the next read fetches the project again
+        """
+        self.data = None
+        self.pending = None
+        self.generation += 1
+
+
+
+class AsyncController:
+
+    """
+    Async communication with the local FeatureCloud controller
+    """
+
+    def __init__(self, host: str | None = None):
+        """
+        Initialize connection to the local controller
+
+        :param host: The host URL of the local controller, defaults to controller_url()
+        """
+        self.host = host or controller_url()
+        self.client = new_async_client(base_url=self.host)
+        self.limiter = AsyncRateLimiter("controller")
+        self.ready = False
+
+
+    async def _ping(self) -> bool:
+        try:
+            await self.limiter.wait()
+            r = await self.client.get(f"{self.host}/ping/", timeout=2, extensions={"retry": False})
+            return r.status_code == 200
+        except httpx.RequestError:
+            return False
+
+
+    async def controller_is_running(self) -> bool:
+        """
+        Check whether the FeatureCloud controller is running
+
+        :return: True if the controller answers the ping
+        """
+        running = await self._ping()
+        if not running:
+            err_msg = "FeatureCloud controller is not running. Make sure to start it first."
+            log(err_msg)
+        return running
+
+
+    async def wait_until_ready(self, timeout: float = CONTROLLER_TIMEOUT, interval: float = 0.5,
+                               max_interval: float = 5) -> bool:
+        """
+        Async counterpart of featurecloud_api.Controller.wait_until_ready
+
+        :param timeout: seconds until giving up
+        :param interval: seconds before the first re-check, increased after every failed ping
+        :param max_interval: longest time between pings
+        :raises TimeoutError: if the controller doesn't answer within the timeout
+        :return: True once the controller is ready
+        """
+        if self.ready:
+            return True
+        if not await self._ping():
+            log(f"Waiting up to {timeout}s for the FeatureCloud controller at {self.host}...")
+            await async_wait_for(self._ping, timeout=timeout, interval=interval, max_interval=max_interval,
+                                 desc=f"FeatureCloud controller at {self.host}")
+        self.ready = True
+        return True
+
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+
+class AsyncProject:
+
+    """
+    Async counterpart of featurecloud_api.Project
+    """
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.limiter = AsyncRateLimiter("featurecloud")
+        self.snapshot = AsyncProjectSnapshot(fetch=self._fetch)
+
+
+    @classmethod
+    async def from_project_id(cls, project_id: str, client: httpx.AsyncClient):
+        """
+        Attach to an existing FeatureCloud project by numeric ID
+
+        :param project_id: Persistent numeric ID of project
+        :param client: httpx.AsyncClient connection of AsyncUser
+        :return: AsyncProject instance
+        """
+        proj = cls(client=client)
+        proj.project_id = project_id
+        log(f"Using existing project {proj.project_id}.")
+        log(f"Project status: {await proj.get_status()}")
+        return proj
+
+
+    @classmethod
+    async def from_tool(cls, app_id: int, client: httpx.AsyncClient):
+        """
+        Create a new Featurecloud project from the ID of an app
+
+        :param app_id: ID of app on FeatureCloud
+        :param client: httpx.AsyncClient connection of AsyncUser
+        :return: AsyncProject instance
+        """
+        proj = cls(client=client)
+        await proj.create_new_project()
+        await proj.set_project_workflow(app_id=app_id)
+        log(f"Created new project {proj.project_id} {proj.project_name}")
+        log(f"Project status: {await proj.get_status()}")
+        return proj
+
+
+    @classmethod
+    async def from_token(cls, token: str, project_id: str, client: httpx.AsyncClient):
+        """
+        Instantiate a project by joining it with a token.
+
+        :param token: Participant token used to join
+        :param project_id: Numeric ID of the project
+        :param client: httpx.AsyncClient connection of AsyncUser
+        :return: AsyncProject instance
+        """
+        proj = cls(client=client)
+        await proj.join_project(token=token)
+        proj.project_id = project_id
+        log(f"Joined existing project {proj.project_id} via token.")
+        log(f"Project status: {await proj.get_status()}")
+        return proj
+
+
+    async def create_new_project(self):
+        """
+        Create a new FeatureCloud project with a randomized name.
+        """
+        self.project_name = randstr()
+        new_proj = {
+            "name": self.project_name,
+            "description": "",
+            "status": ""
+        }
+        await self.limiter.wait()
+        r = await self.client.post("/api/projects/", json=new_proj)
+        r.raise_for_status()
+        data = r.json()
+        self.project_id = data.get("id")
+
+
+    async def set_project_workflow(self, app_id: int):
+        """
+        Set an app to use in the workflow of a project.
+
+        :param app_id: ID of the tool to use
+        :return: json response
+        """
+        payload = {
+            "id": self.project_id,
+            "name": self.project_name,
+            "description": "",
+            "status": "ready",
+            "workflow": [
+                {
+                    "id": 0,
+                    "projectId": self.project_id,
+                    "federatedApp": {
+                        "id": app_id
+                    },
+                    "order": 0,
+                    "versionCertificationLevel": 1
+                }
+            ]
+        }
+        await self.limiter.wait()
+        r = await self.client.put(f"/api/projects/{self.project_id}/", json=payload)
+        r.raise_for_status()
+        self.snapshot.invalidate()
+        return r.json()
+
+
+    async def _create_project_token(self) -> dict:
+        await self.limiter.wait()
+        r = await self.client.post(f"/api/project-tokens/{self.project_id}/", json={"cmd": "create"})
+        r.raise_for_status()
+        return r.json()
+
+
+    async def create_project_tokens(self, n: int = 0) -> list[dict]:
+        """
+        Create project tokens for the current project.
+        Requests are issued concurrently, the limiter still bounds the rate.
+
+        :param n: number of tokens to generate, defaults to 0
+        :return: list of tokens
+        """
+        tokens = await asyncio.gather(*[self._create_project_token() for _ in range(n)])
+        return list(tokens)
+
+
+    async def join_project(self, token: str):
+        """
+        Use a project token to join
+
+        :param token: Participant token
+        :return: json string
+        """
+        payload = {"token": token, "cmd": "join"}
+        await self.limiter.wait()
+        r = await self.client.post("/api/project-tokens/", json=payload)
+        r.raise_for_status()
+        self.snapshot.invalidate()
+        return r.json()
+
+
+    async def _fetch(self) -> dict:
+        await self.limiter.wait()
+        r = await self.client.get(f"/api/projects/{self.project_id}/")
+        r.raise_for_status()
+        return r.json()
+
+
+    async def get_status(self) -> str:
+        """
+        Query the status of the project.
+
+        :return: status description string
+        """
+        data = await self.snapshot.get()
+        return data.get("status")
+
+
+    async def get_role(self) -> str:
+        """
+        Query the role of the user in the project, e.g. 'coordinator'
+
+        :return: role description string
+        """
+        data = await self.snapshot.get()
+        return data.get("role")
+
+
+    async def set_status(self, status: str):
+        """
+        Set a status on the project. E.g. used to reset a project
+
+        :param status: string describing the status
+        :return: json response
+        """
+        await self.limiter.wait()
+        r = await self.client.put(f"/api/projects/{self.project_id}/", json={"status": status})
+        r.raise_for_status()
+        self.snapshot.invalidate()
+        return r.json()
+
+
+    async def is_ready(self) -> bool:
+        return await self.get_status() == "ready"
+
+
+    async def is_prepping(self) -> bool:
+        return await self.get_status() == "prepare"
+
+
+    async def reset_project(self) -> bool:
+        """
+        Set the status to 'ready'. E.g. used to reset a failed or finished project
+
+        :return: boolean marker
+        """
+        await self.set_status("ready")
+        await async_wait_for(self.is_ready, timeout=STATUS_TIMEOUT, desc=f"project {self.project_id} to be 'ready'")
+        return True
+
+
+
+class AsyncResponseCache(ResponseCache):
+
+    async def get(self, client: httpx.AsyncClient, url: str, limiter: AsyncRateLimiter):
+        """
+        Async counterpart of ResponseCache.get, sharing its entries on disk
+
+        :param client: async client to send the request with
+        :param url: URL to GET
+        :param limiter: rate limiter of the caller
+        :return: json response
+        """
+        entry = self._load()
+        if entry and time.time() - entry["fetched"] < self.ttl:
+            return entry["data"]
+        await limiter.wait()
+        r = await client.get(url, headers=self._validators(entry))
+        return self._store(r, entry)
+
+
+
+class AsyncAppTable:
+
+    _shared = None
+    _pending = None
+
+    def __init__(self):
+        """
+        Async app table on FeatureCloud. Use AsyncAppTable.shared() to fetch the apps.
+        """
+        self.client = new_async_client(base_url=FEATURECLOUD_URL, headers=DEFAULT_HEADERS)
+        self.limiter = AsyncRateLimiter("featurecloud")
+        self.cache = AsyncResponseCache(name="apps", ttl=CATALOG_TTL)
+        self.apps = {}
+
+
+    @classmethod
+    async def create(cls):
+        table = cls()
+        try:
+            table.apps = await table._get_app_list()
+        finally:
+            await table.client.aclose()
+        return table
+
+
+    @classmethod
+    async def shared(cls):
+        """
+        Get the app table of this process. Concurrent callers await a single download of the catalog.
+
+        :return: AsyncAppTable instance
+        """
+        if cls._shared is not None:
+            return cls._shared
+        if cls._pending is None:
+            cls._pending = asyncio.ensure_future(cls._create_shared())
+        return await asyncio.shield(cls._pending)
+
+
+    @classmethod
+    async def _create_shared(cls):
+        try:
+            cls._shared = await cls.create()
+            return cls._shared
+        finally:
+            cls._pending = None
+
+
+    async def _get_app_list(self) -> dict:
+        """
+        Get the list of available apps on FeatureCloud.ai
+
+        :return: dict of app slugs and their IDs
+        """
+        apps = await self.cache.get(client=self.client, url="/api/apps/", limiter=self.limiter)
+        return {app["slug"]: app["id"] for app in apps}
+
+
+
+class AsyncUserAuth(UserAuth):
+
+    def __init__(self, user):
+        """
+        Attach the access token of an async user to requests.
+        Renewals wait for the rate limiter without blocking the event loop.
+
+        :param user: AsyncUser instance
+        """
+        super().__init__(user=user)
+
+
+    async def async_auth_flow(self, request: httpx.Request):
+        user = self.user
+        renew = token_expired(user.access)
+        # at most one retry after a rejected token (401)
+        for _ in range(2):
+            if renew:
+                response = None
+                if not token_expired(user.refresh):
+                    log(f"Refreshing token of user {user.username}...")
+                    await user.limiter.wait()
+                    response = yield user._refresh_request()
+                    await response.aread()
+                if response is None or response.status_code != 200:
+                    log(f"Logging in user {user.username}...")
+                    await user.limiter.wait()
+                    response = yield user._login_request()
+                    await response.aread()
+                    response.raise_for_status()
+                user._set_tokens(response.json())
+            request.headers["Authorization"] = f"Bearer {user.access}"
+            response = yield request
+            if response.status_code != 401:
+                return
+            renew = True
+
+
+
+class AsyncUser:
+
+    def __init__(self, username: str):
+        """
+        Async FeatureCloud user account. Use AsyncUser.create() to log in.
+
+        :param username: name on FeatureCloud.ai
+        """
+        load_dotenv(dotenv_path='.env', override=True)
+        self.client = new_async_client(base_url=FEATURECLOUD_URL, headers=DEFAULT_HEADERS)
+        self.client.auth = AsyncUserAuth(user=self)
+        self.username = username
+        self.password = os.getenv(f"{username}")
+        assert self.password is not None, f"Credentials for {username} not found."
+        self.access = None
+        self.refresh = None
+        self.tokens = TokenCache(username=username)
+        self.purchased = AsyncResponseCache(name=f"purchased_{cache_key(username)}", ttl=ENTITLEMENT_TTL)
+        self.limiter = AsyncRateLimiter("featurecloud")
+        self.site_info = None
+        self.apps = {}
+
+
+    @classmethod
+    async def create(cls, username: str):
+        """
+        Create a user, authenticate it and fetch the app list
+
+        :param username: name on FeatureCloud.ai
+        :return: logged-in AsyncUser
+        """
+        user = cls(username=username)
+        await user.authenticate()
+        user.apps = (await AsyncAppTable.shared()).apps
+        return user
+
+
+    async def authenticate(self):
+        """
+        Reuse cached tokens if they are still valid, refresh them if possible,
+        and only log in with the password otherwise.
+        """
+        cached = self.tokens.load()
+        if cached:
+            self.access, self.refresh = cached["access"], cached["refresh"]
+        if not token_expired(self.access):
+            log(f"Using cached token of user {self.username}")
+            return
+        if not token_expired(self.refresh):
+            try:
+                await self.refresh_token()
+                return
+            except httpx.HTTPStatusError:
+                log(f"Failed to refresh token of user {self.username}")
+        await self.login()
+
+
+    def _set_tokens(self, data: dict):
+        self.access = data["access"]
+        self.refresh = data.get("refresh", self.refresh)
+        self.tokens.save(access=self.access, refresh=self.refresh)
+
+
+    def _login_request(self) -> httpx.Request:
+        return self.client.build_request(
+            "POST", "/api/auth/login/", json={"username": self.username, "password": self.password})
+
+
+    def _refresh_request(self) -> httpx.Request:
+        return self.client.build_request(
+            "POST", "/api/auth/token/refresh/", json={"refresh": self.refresh})
+
+
+    async def login(self):
+        """
+        Login as this user
+        """
+        log(f"Logging in user {self.username}...")
+        await self.limiter.wait()
+        r = await self.client.send(self._login_request(), auth=None)
+        r.raise_for_status()
+        self._set_tokens(r.json())
+
+
+    async def refresh_token(self):
+        """
+        Refresh the temporary access token
+        """
+        await self.limiter.wait()
+        r = await self.client.send(self._refresh_request(), auth=None)
+        r.raise_for_status()
+        self._set_tokens(r.json())
+
+
+    async def is_logged_in(self) -> bool:
+        """
+        Check if user is logged in by trying to access its info
+
+        :return: True if logged in
+        """
+        try:
+            await self.limiter.wait()
+            r = await self.client.get("/api/user/info/")
+            ok = r.status_code == 200
+            log(f"User {self.username} logged in: {ok}")
+            return ok
+        except httpx.HTTPError:
+            return False
+
+
+    async def get_site_info(self):
+        """
+        Download the site_info.json marker file used by the controller
+
+        :return: json snippet
+        """
+        await self.limiter.wait()
+        r = await self.client.get("/api/site/")
+        r.raise_for_status()
+        Path("data_fc").mkdir(parents=True, exist_ok=True)
+        with open("data_fc/site_info.json", "w") as f:
+            f.write(r.text)
+        return r.json()
+
+
+    async def ensure_site_info(self) -> dict:
+        """
+        Write the site_info.json marker once per user
+
+        :return: json snippet
+        """
+        if self.site_info is None:
+            self.site_info = await self.get_site_info()
+        return self.site_info
+
+
+    async def get_purchased_apps(self) -> dict:
+        """
+        Get the list of apps owned by this user on FeatureCloud.ai
+
+        :return: dict of app slugs and IDs
+        """
+        apps = await self.purchased.get(client=self.client, url="/api/apps/purchase/", limiter=self.limiter)
+        return {app["slug"]: app["id"] for app in apps}
+
+
+    async def owns_app(self, slug: str) -> bool:
+        """
+        Check whether the user owns a specific app on FeatureCloud.ai
+
+        :param slug: slug of the app to check
+        :return: bool ownership
+        """
+        app_id = self.apps.get(slug)
+        if app_id is None:
+            raise ValueError(f"App {slug} invalid")
+        owned_apps = await self.get_purchased_apps()
+        return app_id in owned_apps.values()
+
+
+    async def purchase_app(self, slug: str):
+        """
+        purchase an app on FeatureCloud.ai
+
+        :return: bool success
+        """
+        if await self.owns_app(slug):
+            log(f"User {self.username} already has app {slug}.")
+            return True
+        app_id = self.apps.get(slug)
+        await self.limiter.wait()
+        r = await self.client.post(f"/api/apps/{app_id}/purchase/")
+        self.purchased.invalidate()
+        r.raise_for_status()
+        return True
+
+
+    async def remove_app(self, slug: str):
+        """
+        Remove an app from the purchased apps of this user
+
+        :param slug: slug of the app to remove
+        :return: bool success
+        """
+        app_id = self.apps.get(slug)
+        if app_id is None:
+            raise ValueError(f"App {slug} invalid")
+        if not await self.owns_app(slug):
+            log(f"User {self.username} does not have app {slug}.")
+            return True
+        await self.limiter.wait()
+        r = await self.client.delete(f"/api/apps/{app_id}/purchase/")
+        self.purchased.invalidate()
+        r.raise_for_status()
+        return True
+
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+
+class AsyncFCC:
+
+    def __init__(self, user: AsyncUser, project: AsyncProject, controller: AsyncController):
+        """
+        Async User acting within a specific project. Use AsyncFCC.create() to verify the controller.
+
+        :param user: AsyncUser instance
+        :param project: AsyncProject instance
+        :param controller: AsyncController instance
+        """
+        self.controller = controller
+        self.project = project
+        self.user = user
+
+
+    @classmethod
+    async def create(cls, user: AsyncUser, project: AsyncProject, controller: AsyncController | None = None,
+                     controller_timeout: float = CONTROLLER_TIMEOUT):
+        controller = controller or AsyncController()
+        await controller.wait_until_ready(timeout=controller_timeout)
+        await user.ensure_site_info()
+        return cls(user=user, project=project, controller=controller)
+
+
+    async def is_project_coordinator(self) -> bool:
+        """
+        Check if the attached User is the project coordinator
+
+        :return: True if user is coordinator
+        """
+        return await self.project.get_role() == "coordinator"
+
+
+    async def _upload_file(self, path: Path, headers: dict) -> str:
+        """
+        Stream a single file to the controller, reading it in a worker thread
+
+        :param path: path of the file to upload
+        :param headers: request headers
+        :return: response text of the controller
+        """
+        size = path.stat().st_size
+        progress = TransferProgress(label=f"Upload {path.name}", total=size)
+        params = {
+            "projectId": self.project.project_id,
+            "fileName": path.name,
+            "finalize": "",
+            "consent": ""
+        }
+
+        async def read_chunks(f):
+            while chunk := await asyncio.to_thread(f.read, CHUNK_SIZE):
+                progress.update(len(chunk))
+                yield chunk
+
+        with open(path, "rb") as f:
+            await self.controller.limiter.wait()
+            r = await self.controller.client.post(
+                "/file-upload/",
+                params=params,
+                content=read_chunks(f),
+                headers={**headers, "Content-Length": str(size)}
+            )
+            r.raise_for_status()
+        progress.finish()
+        return r.text
+
+
+    async def upload_files(self, filepaths: list[str], jobs: int = 1) -> dict:
+        """
+        Upload files to a project as a specific FeatureCloud User
+
+        :param filepaths: paths to the files to upload
+        :param jobs: number of files to upload concurrently, defaults to 1
+        :raises PermissionError: First data upload needs to be done from the coordinator
+        :return: dict of responses for each uploaded file
+        """
+        status = await self.project.get_status()
+        log(f"Project {self.project.project_id} status: {status}")
+        if status in ["finished", "error", "failed", "stopped"]:
+            await self.project.reset_project()
+            log(f"Project {self.project.project_id} reset to 'ready' status.")
+        elif status == "running":
+            raise PermissionError("Cannot upload files to a running project.")
+
+        if not await self.project.is_prepping():
+            if not await self.is_project_coordinator():
+                raise PermissionError("Only the project coordinator can set the project to 'prepare' mode.")
+            log(f"Project {self.project.project_id} not in 'prepare' mode. Setting it now as coordinator.")
+            await self.project.set_status("prepare")
+            await async_wait_for(self.project.is_prepping, timeout=STATUS_TIMEOUT,
+                                 desc=f"project {self.project.project_id} to be in 'prepare' mode")
+
+        headers = {
+            "Origin": "https://featurecloud.ai",
+            "Accept": "application/json, text/plain, */*"
+        }
+        semaphore = asyncio.Semaphore(max(1, jobs))
+
+        async def upload(path):
+            async with semaphore:
+                return await self._upload_file(path=path, headers=headers)
+
+        paths = [Path(filepath) for filepath in filepaths]
+        responses = await asyncio.gather(*[upload(path) for path in paths])
+        results = {path.name: text for path, text in zip(paths, responses)}
+
+        params = {
+            "projectId": self.project.project_id,
+            "fileName": "",
+            "finalize": "true",
+            "consent": ""
+        }
+        await self.controller.limiter.wait()
+        r = await self.controller.client.post("/file-upload/", params=params, headers=headers, content=b"")
+        r.raise_for_status()
+        return results
+
+
+    async def watch_status(self, timeout: float | None = None, schedule: PollSchedule | None = None,
+                           prepare_timeout: float | None = PREPARE_TIMEOUT):
+        """
+        Poll the project status adaptively and yield each transition as it happens.
+        Stops after the project leaves the 'prepare' and 'running' states.
+
+        :param timeout: maximum time to watch in seconds after the project leaves 'prepare', defaults to no limit
+        :param schedule: PollSchedule for the polling intervals
+        :param prepare_timeout: maximum time in seconds the project may stay in 'prepare', None for no limit
+        :raises TimeoutError: if the project is still active after the timeout, or still in 'prepare'
+        :yield: tuples of (previous status, new status)
+        """
+        schedule = schedule or PollSchedule()
+        prepare_deadline = time.monotonic() + prepare_timeout if prepare_timeout is not None else None
+        deadline = None
+        previous = None
+        while True:
+            status = await self.project.get_status()
+            if status != previous:
+                yield previous, status
+                previous = status
+                schedule.reset()
+            if status not in ACTIVE_STATES:
+                return
+            delay = schedule.next(status)
+            if status == "prepare":
+                # pulling the apps can take long, so 'prepare' has its own timeout
+                limit, reason = prepare_deadline, f"did not leave 'prepare' within {prepare_timeout} seconds"
+            else:
+                if deadline is None and timeout is not None:
+                    deadline = time.monotonic() + timeout
+                limit, reason = deadline, f"did not finish within {timeout} seconds"
+            if limit is not None:
+                remaining = limit - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Project {self.project.project_id} {reason}.")
+                delay = min(delay, remaining)
+            await asyncio.sleep(delay)
+
+
+    async def monitor_project(self, timeout: int = 60, schedule: PollSchedule | None = None, callback=None,
+                              prepare_timeout: float | None = PREPARE_TIMEOUT) -> str:
+        """
+        Poll the project status until it changes from 'running'.
+
+        :param timeout: maximum time to wait for the running project to finish, defaults to 60
+        :param schedule: PollSchedule for the polling intervals
+        :param callback: called with (previous, status) on every status transition
+        :param prepare_timeout: maximum time to wait for the project to leave 'prepare', None for no limit
+        :raises TimeoutError: if not finishing within timeout
+        :return: final status
+        """
+        status = None
+        try:
+            async for previous, status in self.watch_status(timeout=timeout, schedule=schedule,
+                                                            prepare_timeout=prepare_timeout):
+                log(f"Project {self.project.project_id} status: {status}")
+                if callback is not None:
+                    callback(previous, status)
+        except TimeoutError:
+            if await self.project.get_status() == "running":
+                await self.project.set_status("shutdown")
+
+                async def stopped_status():
+                    status = await self.project.get_status()
+                    return status if status != "running" else None
+
+                status = await async_wait_for(stopped_status, timeout=STATUS_TIMEOUT,
+                                              desc=f"project {self.project.project_id} to shut down")
+                if status == "stopped":
+                    await self.project.reset_project()
+            raise
+        log(f"Project {self.project.project_id} ended with status: {status}")
+        return status
+
+
+    async def _get_project_runs(self):
+        """
+        Query the controller for the runs of the project that have been executed
+
+        :return: json snippet
+        """
+        r = await self.controller.client.get("/project-runs/", params={"projectId": self.project.project_id})
+        r.raise_for_status()
+        return r.json()
+
+
+    async def _download_file(self, endpoint: str, filetype: str, out_dir: str, run: int, step: int,
+                             retries: int = 3, force: bool = False) -> Path:
+        """
+        Generic method to stream a file from the controller client to disk,
+        resuming interrupted downloads with a Range and If-Range request as in FCC._download_file.
+        Existing complete files are kept as they are unless force is set.
+
+        :param endpoint: URL endpoint to query
+        :param filetype: Differs for logs and results
+        :param out_dir: Directory to store output in
+        :param run: Which number of run to download from
+        :param step: Which step of project to download for
+        :param retries: number of resume attempts after connection errors
+        :param force: whether to download the file again even if it exists
+        :return: Path of the downloaded file
+        """
+        params = {"projectId": self.project.project_id, "step": step, "run": run}
+        filename = f"p{self.project.project_id}_r{run}_s{step}.{filetype}"
+        filepath = Path(out_dir) / filename
+        partpath = filepath.with_name(filename + ".part")
+        tagpath = filepath.with_name(filename + ".part.tag")
+        if filepath.is_file() and not force:
+            log(f"Already downloaded {filepath}")
+            return filepath
+        # a .part file of an earlier download is only resumed if the controller can check it is unchanged
+        validator = tagpath.read_text() if tagpath.is_file() and not force else None
+        if validator is None:
+            partpath.unlink(missing_ok=True)
+
+        for attempt in range(retries + 1):
+            offset = partpath.stat().st_size if partpath.is_file() else 0
+            headers = {}
+            if offset:
+                headers["Range"] = f"bytes={offset}-"
+                if validator:
+                    headers["If-Range"] = validator
+            try:
+                await self.controller.limiter.wait()
+                async with self.controller.client.stream("GET", endpoint, params=params, headers=headers,
+                                                         extensions={"transfer": True}) as r:
+                    if r.status_code == 416:
+                        break
+                    r.raise_for_status()
+                    resumed = r.status_code == 206
+                    validator = (r.headers.get("ETag") or r.headers.get("Last-Modified")
+                                 or (validator if resumed else None))
+                    if validator:
+                        tagpath.write_text(validator)
+                    else:
+                        tagpath.unlink(missing_ok=True)
+                    length = r.headers.get("Content-Length")
+                    total = int(length) + (offset if resumed else 0) if length else None
+                    progress = TransferProgress(label=f"Download {filename}", total=total)
+                    progress.update(offset if resumed else 0)
+                    with open(partpath, "ab" if resumed else "wb") as f:
+                        async for chunk in r.aiter_bytes(CHUNK_SIZE):
+                            await asyncio.to_thread(f.write, chunk)
+                            progress.update(len(chunk))
+                progress.finish()
+                break
+            except httpx.TransportError as e:
+                if attempt == retries:
+                    raise
+                log(f"Download of {filename} interrupted ({e}), resuming...")
+
+        partpath.replace(filepath)
+        tagpath.unlink(missing_ok=True)
+        log(f"Downloaded {filepath}")
+        return filepath
+
+
+    async def download_outcome(self, out_dir: str, runs: str | list[int] = "latest", jobs: int = 4,
+                               force: bool = False) -> list[str]:
+        """
+        Download the log and result files of runs of the attached project.
+        All steps of the selected runs are fetched concurrently.
+
+        :param out_dir: Directory to save the output at
+        :param runs: 'latest', 'all' or a list of run numbers, defaults to 'latest'
+        :param jobs: maximum number of concurrent downloads, defaults to 4
+        :param force: whether to download files again that exist in out_dir
+        :return: list of downloaded files
+        """
+        Path(out_dir).mkdir(exist_ok=True, parents=True)
+        project_runs = await self._get_project_runs()
+        selected = select_runs(project_runs=project_runs, runs=runs)
+        log(f"Found {len(project_runs)} run(s). Downloading run(s) {[run['runNr'] for run in selected]}")
+        semaphore = asyncio.Semaphore(max(1, jobs))
+
+        async def fetch(endpoint, filetype, run_nr, step):
+            async with semaphore:
+                return await self._download_file(endpoint, filetype, out_dir, run_nr, step, force=force)
+
+        downloads = []
+        for run in selected:
+            downloads += [fetch("/logs-download/", "log", run['runNr'], step) for step in run.get("logSteps", [])]
+            downloads += [fetch("/file-download/", "zip", run['runNr'], step) for step in run.get("resultSteps", [])]
+        downloaded = await asyncio.gather(*downloads)
+        return [str(path) for path in downloaded]
+
+
+
+async def login_users(usernames: list[str]) -> list[AsyncUser]:
+    """
+    Log in several FeatureCloud users concurrently
+
+    :param usernames: FeatureCloud usernames with credentials in .env
+    :return: list of logged-in users, in the same order
+    """
+    users = await asyncio.gather(*[AsyncUser.create(username=u) for u in usernames])
+    return list(users)
+
+
+
+async def query_projects(users: list[AsyncUser], project_ids: list[str]) -> dict[str, str]:
+    """
+    Query the status of several projects concurrently, each with its own user
+
+    :param users: logged-in users
+    :param project_ids: project IDs, one per user
+    :return: dict of project IDs to status
+    """
+    projects = [AsyncProject(client=u.client) for u in users]
+    for proj, pid in zip(projects, project_ids):
+        proj.project_id = pid
+    statuses = await asyncio.gather(*[p.get_status() for p in projects])
+    return dict(zip(project_ids, statuses))
@@ -0,0 +1,322 @@
+import atexit
+from bisect import bisect_left
+import contextvars
+import json
+import os
+from pathlib import Path
+import re
+import threading
+import time
+
+import httpx
+
+
+
+# upper bounds in seconds of the request latency histogram
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# directory to which each process writes its metrics at exit, unset to disable
+METRICS_ENV = "FEDFLOW_METRICS"
+
+# seconds the current thread or task spent waiting for the rate limiter since its last request
+_BLOCKED = contextvars.ContextVar("fedflow_blocked", default=0.0)
+
+
+
+def endpoint_template(path: str) -> str:
+    """
+    Replace numeric path segments, e.g. /api/projects/42/ -> /api/projects/{id}/
+
+    :param path: URL path
+    :return: path template
+    """
+    return re.sub(r"/\d+(?=/|$)", "/{id}", path)
+
+
+
+def add_blocked(seconds: float):
+    """
+    Account time spent in RateLimiter.wait() to the next request of this thread or task
+
+    :param seconds: time spent waiting
+    """
+    _BLOCKED.set(_BLOCKED.get() + seconds)
+
+
+
+def take_blocked() -> float:
+    """
+    :return: time spent waiting for the rate limiter since the last call, resets the counter
+    """
+    blocked = _BLOCKED.get()
+    if blocked:
+        _BLOCKED.set(0.0)
+    return blocked
+
+
+
+class Metrics:
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        """
+        Request statistics per upstream, method and endpoint template: count, status codes,
+        latency histogram, response bytes, retries and time blocked by the rate limiter.
+        Latency runs from sending the request until the response headers arrive,
+        including retries and their backoff, blocked time is the wait before and between attempts.
+
+        :param buckets: upper bounds of the latency histogram
+        """
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.started = time.time()
+
+
+    def _entry(self, key: tuple) -> dict:
+        entry = self.endpoints.get(key)
+        if entry is None:
+            entry = {"count": 0, "errors": 0, "status": {}, "latency": 0.0, "histogram": [0] * (len(self.buckets) + 1),
+                     "bytes": 0, "retries": 0, "blocked": 0.0}
+            self.endpoints[key] = entry
+        return entry
+
+
+    def observe(self, key: tuple, status: int | None, latency: float, retries: int = 0, blocked: float = 0.0):
+        """
+        Record a finished request
+
+        :param key: (upstream, method, endpoint template)
+        :param status: status code of the final response, None if the request failed
+        :param latency: seconds until the response headers arrived
+        :param retries: number of retries of this request
+        :param blocked: seconds spent waiting for the rate limiter
+        """
+        with self.lock:
+            entry = self._entry(key)
+            entry["count"] += 1
+            if status is None:
+                entry["errors"] += 1
+            status = "error" if status is None else str(status)
+            entry["status"][status] = entry["status"].get(status, 0) + 1
+            entry["latency"] += latency
+            entry["histogram"][bisect_left(self.buckets, latency)] += 1
+            entry["retries"] += retries
+            entry["blocked"] += blocked
+
+
+    def add_bytes(self, key: tuple, n: int):
+        with self.lock:
+            self._entry(key)["bytes"] += n
+
+
+    def reset(self):
+        with self.lock:
+            self.endpoints.clear()
+            self.started = time.time()
+
+
+    def snapshot(self) -> dict:
+        """
+        :return: JSON-serializable copy of all statistics, with totals over all endpoints
+        """
+        with self.lock:
+            endpoints = []
+            for (upstream, method, endpoint), entry in sorted(self.endpoints.items()):
+                bounds = [str(b) for b in self.buckets] + ["+Inf"]
+                endpoints.append({
+                    "upstream": upstream, "method": method, "endpoint": endpoint,
+                    "count": entry["count"], "errors": entry["errors"], "status": dict(entry["status"]),
+                    "latency": entry["latency"], "histogram": dict(zip(bounds, entry["histogram"])),
+                    "bytes": entry["bytes"], "retries": entry["retries"], "blocked": entry["blocked"],
+                })
+            totals = {name: sum(e[name] for e in endpoints)
+                      for name in ("count", "errors", "latency", "bytes", "retries", "blocked")}
+            return {"pid": os.getpid(), "started": self.started, "duration": time.time() - self.started,
+                    "endpoints": endpoints, "totals": totals}
+
+
+    def prometheus(self) -> str:
+        """
+        :return: statistics in the Prometheus text exposition format
+        """
+        lines = [
+            "# TYPE fedflow_http_requests_total counter",
+            "# TYPE fedflow_http_request_duration_seconds histogram",
+            "# TYPE fedflow_http_response_bytes_total counter",
+            "# TYPE fedflow_http_retries_total counter",
+            "# TYPE fedflow_ratelimit_blocked_seconds_total counter",
+        ]
+        for e in self.snapshot()["endpoints"]:
+            labels = f'upstream="{e["upstream"]}",method="{e["method"]}",endpoint="{e["endpoint"]}"'
+            for status, count in sorted(e["status"].items()):
+                lines.append(f'fedflow_http_requests_total{{{labels},status="{status}"}} {count}')
+            cumulative = 0
+            for bound, count in e["histogram"].items():
+                cumulative += count
+                lines.append(f'fedflow_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"fedflow_http_request_duration_seconds_sum{{{labels}}} {e['latency']}")
+            lines.append(f"fedflow_http_request_duration_seconds_count{{{labels}}} {e['count']}")
+            lines.append(f"fedflow_http_response_bytes_total{{{labels}}} {e['bytes']}")
+            lines.append(f"fedflow_http_retries_total{{{labels}}} {e['retries']}")
+            lines.append(f"fedflow_ratelimit_blocked_seconds_total{{{labels}}} {e['blocked']}")
+        return "\n".join(lines) + "\n"
+
+
+    def dump(self, directory: str | Path) -> list[Path]:
+        """
+        Write the statistics of this process as metrics-<pid>.json and metrics-<pid>.prom
+
+        :param directory: output directory, created if necessary
+        :return: paths of the written files
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        stem = directory / f"metrics-{os.getpid()}"
+        json_path, prom_path = stem.with_suffix(".json"), stem.with_suffix(".prom")
+        json_path.write_text(json.dumps(self.snapshot(), indent=2))
+        prom_path.write_text(self.prometheus())
+        return [json_path, prom_path]
+
+
+
+_METRICS = Metrics()
+
+
+
+def get_metrics() -> Metrics:
+    """
+    :return: request statistics of this process
+    """
+    return _METRICS
+
+
+
+def _dump_at_exit():
+    directory = os.getenv(METRICS_ENV)
+    if directory and _METRICS.endpoints:
+        _METRICS.dump(directory)
+
+
+atexit.register(_dump_at_exit)
+
+
+
+
+class _CountingStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+
+    def __init__(self, stream, count):
+        """
+        Response body that reports the size of each chunk as it is read
+
+        :param stream: original body stream
+        :param count: function called with the size of each chunk
+        """
+        self.stream = stream
+        self.count = count
+
+
+    def __iter__(self):
+        for chunk in self.stream:
+            self.count(len(chunk))
+            yield chunk
+
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            self.count(len(chunk))
+            yield chunk
+
+
+    def close(self):
+        self.stream.close()
+
+
+    async def aclose(self):
+        await self.stream.aclose()
+
+
+
+def count_body(response: httpx.Response, count):
+    """
+    Report the size of a response body, as it is read if it is streamed
+
+    :param response: response as returned by the transport
+    :param count: function called with the number of bytes
+    """
+    if isinstance(response.stream, httpx.ByteStream):
+        # in-memory bodies, e.g. of a MockTransport, are already read
+        count(len(response.content))
+    else:
+        response.stream = _CountingStream(response.stream, count)
+
+
+
+class MetricsTransport(httpx.BaseTransport):
+
+    def __init__(self, transport: httpx.BaseTransport, upstream: str, metrics: Metrics | None = None):
+        """
+        Transport wrapper that records every request in the process metrics.
+        Wraps the RetryTransport, so that each request is counted once with its retries.
+
+        :param transport: transport that sends the requests
+        :param upstream: name of the upstream, e.g. 'featurecloud'
+        :param metrics: Metrics to record to, defaults to those of the process
+        """
+        self.transport = transport
+        self.upstream = upstream
+        self.metrics = metrics or _METRICS
+
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = (self.upstream, request.method, endpoint_template(request.url.path))
+        blocked = take_blocked()
+        start = time.monotonic()
+        try:
+            response = self.transport.handle_request(request)
+        except httpx.TransportError:
+            self.metrics.observe(key, None, time.monotonic() - start, request.extensions.get("retries", 0),
+                                 blocked + take_blocked())
+            raise
+        self.metrics.observe(key, response.status_code, time.monotonic() - start, request.extensions.get("retries", 0),
+                             blocked + take_blocked())
+        count_body(response, lambda n: self.metrics.add_bytes(key, n))
+        return response
+
+
+    def close(self):
+        self.transport.close()
+
+
+
+class AsyncMetricsTransport(httpx.AsyncBaseTransport):
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, upstream: str, metrics: Metrics | None = None):
+        """
+        Async counterpart of MetricsTransport
+
+        :param transport: transport that sends the requests
+        :param upstream: name of the upstream, e.g. 'featurecloud'
+        :param metrics: Metrics to record to, defaults to those of the process
+        """
+        self.transport = transport
+        self.upstream = upstream
+        self.metrics = metrics or _METRICS
+
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = (self.upstream, request.method, endpoint_template(request.url.path))
+        blocked = take_blocked()
+        start = time.monotonic()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except httpx.TransportError:
+            self.metrics.observe(key, None, time.monotonic() - start, request.extensions.get("retries", 0),
+                                 blocked + take_blocked())
+            raise
+        self.metrics.observe(key, response.status_code, time.monotonic() - start, request.extensions.get("retries", 0),
+                             blocked + take_blocked())
+        count_body(response, lambda n: self.metrics.add_bytes(key, n))
+        return response
+
+
+    async def aclose(self):
+        await self.transport.aclose()
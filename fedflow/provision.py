@@ -1,10 +1,13 @@
+import hashlib
+from pathlib import PurePosixPath
 
 
-bash_provision_ubuntu = f"""
-#!/bin/bash
-set -e 
+# fingerprint of the last provisioning of a node: hash of the script and versions of the packages it installs
+PROVISION_MARKER = "/var/lib/fedflow/provision"
+PROVISION_PACKAGES = "python3.12 python3-pip python3.12-venv zstd docker-ce"
 
 
+bash_provision_ubuntu = f"""
 DEPS_PY="python3.12 python3-pip python3.12-venv"
 
 if dpkg -s $DEPS_PY >/dev/null 2>&1; then
@@ -15,6 +18,15 @@ else
 fi
 
 
+# compression of streamed result archives
+if dpkg -s zstd >/dev/null 2>&1; then
+    echo "zstd is installed"
+else
+    sudo apt-get update
+    sudo apt-get install -y zstd
+fi
+
+
 if dpkg -s docker-ce >/dev/null 2>&1; then
     echo "Docker is installed"
 else
@@ -35,15 +47,68 @@ fi
 """
 
 
-def write_provision_script() -> str:
+def fingerprint_command(body: str = bash_provision_ubuntu) -> str:
+    """
+    Shell command that prints the fingerprint of a node, i.e. the hash of the provision script
+    and the versions of the packages it installs.
+
+    :param body: commands of the provision script
+    :return: shell command
+    """
+    digest = hashlib.sha256(body.encode()).hexdigest()
+    return f"echo {digest}; dpkg-query -W -f='${{Package}}=${{Version}}\\n' {PROVISION_PACKAGES} 2>/dev/null || true"
+
+
+
+def provision_check(body: str = bash_provision_ubuntu) -> str:
+    """
+    Shell command that prints 'provisioned' if the marker on a node matches its fingerprint,
+    i.e. the node has been provisioned with this script and its packages are unchanged since.
+
+    :param body: commands of the provision script
+    :return: shell command
+    """
+    return (f'if [ "$(cat {PROVISION_MARKER} 2>/dev/null)" = "$({fingerprint_command(body)})" ]; '
+            f'then echo provisioned; else echo outdated; fi')
+
+
+
+def provision_script(body: str = bash_provision_ubuntu) -> str:
+    """
+    Wrap the commands of a provision script, so that it exits early on a node with a matching
+    fingerprint (unless FEDFLOW_REPROVISION=1) and writes the fingerprint after provisioning.
+    This keeps the Vagrant provisioner idempotent as well.
+
+    :param body: commands of the provision script
+    :return: provision script
+    """
+    fingerprint = fingerprint_command(body)
+    return f"""#!/bin/bash
+set -e
+
+if [ "${{FEDFLOW_REPROVISION:-0}}" != 1 ] && [ "$(cat {PROVISION_MARKER} 2>/dev/null)" = "$({fingerprint})" ]; then
+    echo "Already provisioned"
+    exit 0
+fi
+
+{body.strip()}
+
+sudo mkdir -p {PurePosixPath(PROVISION_MARKER).parent}
+({fingerprint}) | sudo tee {PROVISION_MARKER} > /dev/null
+"""
+
+
+
+def write_provision_script(body: str = bash_provision_ubuntu) -> str:
     """
     Write the provision script to a file.
+
+    :param body: commands of the provision script
     :return: path to the provision script
     """
     script_name = "provision.sh"
     with open(script_name, "w") as prov:
-        prov.write(bash_provision_ubuntu)
-        prov.write("\n")
+        prov.write(provision_script(body))
     return script_name
     
     
@@ -1,12 +1,24 @@
+import hashlib
+import json
+import mmap
+import os
+from pathlib import Path
 import subprocess
 import random
 import string
 import logging
+import threading
+import time
 
 from fedflow.logger import log
 
 
 
+# local state of fedflow and fcauto, e.g. cached auth tokens, app lists and file digests
+CACHE_DIR = Path(os.getenv("FEDFLOW_CACHE_DIR", "~/.cache/fedflow")).expanduser()
+
+
+
 def randstr(l: int = 16) -> str:  # noqa: E741
     """
     Generate random alphanum string of length l
@@ -43,3 +55,177 @@ def execute(command: str):
     return stdout, stderr
     
 
+
+
+
+def file_digest(path: str | Path, mmap_threshold: int = 16 * 1024 * 1024) -> str:
+    """
+    SHA-256 of a file. Large files are mapped into memory and hashed in one call,
+    which avoids copying them through Python buffers and releases the GIL while hashing.
+
+    :param path: file to hash
+    :param mmap_threshold: files of at least this size are memory-mapped
+    :return: hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size >= mmap_threshold:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                digest.update(m)
+        else:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+
+class DigestCache:
+
+    def __init__(self, path: Path | None = None):
+        """
+        File digests that are reused as long as size and modification time of a file are unchanged,
+        so unchanged data isn't hashed again on every run.
+
+        :param path: cache file, defaults to digests.json in the fedflow cache directory
+        """
+        self.path = path or CACHE_DIR / "digests.json"
+        self.lock = threading.Lock()
+        try:
+            self.entries = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            self.entries = {}
+
+
+    def digest(self, path: str | Path) -> str:
+        """
+        :param path: file to hash
+        :return: hex SHA-256 digest, from the cache if the file is unchanged
+        """
+        key = str(Path(path).resolve())
+        st = os.stat(key)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime_ns:
+            return entry["sha256"]
+        sha256 = file_digest(key)
+        with self.lock:
+            self.entries[key] = {"size": st.st_size, "mtime": st.st_mtime_ns, "sha256": sha256}
+        return sha256
+
+
+    def save(self):
+        with self.lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(json.dumps(self.entries))
+
+
+
+def human_size(n: float) -> str:
+    """
+    Format a number of bytes for humans
+
+    :param n: number of bytes
+    :return: e.g. '1.5 GiB'
+    """
+    for unit in ["B", "KiB", "MiB", "GiB", "TiB"]:
+        if abs(n) < 1024 or unit == "TiB":
+            break
+        n /= 1024
+    return f"{n:.1f} {unit}"
+
+
+
+class TransferProgress:
+
+    def __init__(self, label: str, total: int | None = None, step: float = 0.25):
+        """
+        Log the progress and throughput of a file transfer
+
+        :param label: name of the transfer in the log
+        :param total: expected number of bytes, if known
+        :param step: fraction of the total between progress messages
+        """
+        self.label = label
+        self.total = total
+        self.step = step
+        self.done_bytes = 0
+        self.next_report = step
+        self.start = time.monotonic()
+
+
+    def update(self, n: int):
+        """
+        Register transferred bytes
+
+        :param n: number of bytes since the last update
+        """
+        self.done_bytes += n
+        if not self.total:
+            return
+        fraction = self.done_bytes / self.total
+        if fraction >= self.next_report and fraction < 1:
+            log(f"{self.label}: {fraction:.0%} of {human_size(self.total)}")
+            while self.next_report <= fraction:
+                self.next_report += self.step
+
+
+    def finish(self) -> float:
+        """
+        Log the summary of the transfer
+
+        :return: throughput in bytes per second
+        """
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        rate = self.done_bytes / elapsed
+        log(f"{self.label}: {human_size(self.done_bytes)} in {elapsed:.1f}s ({human_size(rate)}/s)")
+        return rate
+
+
+
+def poll_delays(timeout: float = 30, interval: float = 0.2, backoff: float = 1.5,
+                max_interval: float = 5, desc: str = "condition"):
+    """
+    Deadline and interval loop shared by wait_for and its async counterpart.
+    The deadline starts with the call, each next() gives the sleep before the next check.
+
+    :param timeout: seconds until giving up
+    :param interval: seconds before the first re-check
+    :param backoff: factor to increase the interval after each check
+    :param max_interval: upper bound of the interval
+    :param desc: description of the condition for the error message
+    :return: iterator of sleep durations, raising TimeoutError once the deadline has passed
+    """
+    deadline = time.monotonic() + timeout
+
+    def delays(interval):
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Timed out after {timeout}s waiting for {desc}.")
+            yield min(interval, remaining)
+            interval = min(interval * backoff, max_interval)
+
+    return delays(interval)
+
+
+
+def wait_for(condition, timeout: float = 30, interval: float = 0.2, backoff: float = 1.5,
+             max_interval: float = 5, desc: str = "condition"):
+    """
+    Poll a condition with exponential backoff until it is truthy or the deadline passes
+
+    :param condition: callable without arguments
+    :param timeout: seconds until giving up
+    :param interval: seconds before the first re-check
+    :param backoff: factor to increase the interval after each check
+    :param max_interval: upper bound of the interval
+    :param desc: description of the condition for the error message
+    :raises TimeoutError: if the condition is not met within the timeout
+    :return: the truthy value returned by the condition
+    """
+    delays = poll_delays(timeout=timeout, interval=interval, backoff=backoff, max_interval=max_interval, desc=desc)
+    while True:
+        result = condition()
+        if result:
+            return result
+        time.sleep(next(delays))
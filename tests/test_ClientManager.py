@@ -1,5 +1,11 @@
+from pathlib import Path
+import subprocess
+import time
+from types import SimpleNamespace
+
 import pytest
 
+from fedflow import utils
 from fedflow.ClientManager import ClientManager
 
 
@@ -28,3 +34,361 @@ def test_client_manager_initialization(client_manager_nosim):
     assert cm.participants[0]['fc_username'] == "USER1"
     
 
+
+
+
+class FakeConnection(dict):
+    """
+    Stand-in for a fabric Connection that records commands
+    """
+    def __init__(self, host, fail=False, stdout="", delay=0.0, user="user", port=22, **info):
+        super().__init__(**info)
+        self.host = host
+        self.user = user
+        self.port = port
+        self.fail = fail
+        self.stdout = stdout
+        self.delay = delay
+        self.commands = []
+        self.transferred = []
+
+    def run(self, cmd, **kwargs):
+        self.commands.append(cmd)
+        if self.fail:
+            raise RuntimeError(f"join failed on {self.host}")
+        return SimpleNamespace(stdout=self.stdout)
+
+    def get(self, remote, local):
+        time.sleep(self.delay)
+        self.transferred.append(remote)
+        with open(local, "w") as f:
+            f.write(remote)
+
+
+
+def test_join_project_reports_failed_sites(client_manager_nosim):
+    cm = client_manager_nosim
+    cm.participants = [
+        FakeConnection("host1", fc_username="USER1"),
+        FakeConnection("host2", fail=True, fc_username="USER2"),
+    ]
+    with pytest.raises(RuntimeError, match="1/2 nodes failed to join project 42: user@host2:22"):
+        cm.join_project(project_id="42", tokens=["tok1", "tok2"])
+    # every site is attempted, not only the ones before the failure
+    assert "fcauto join -t tok1 -u USER1 -p 42" in cm.participants[0].commands[0]
+    assert "fcauto join -t tok2 -u USER2 -p 42" in cm.participants[1].commands[0]
+
+
+
+def test_fetch_results_transfers_only_run_files(client_manager_nosim, tmp_path):
+    cm = client_manager_nosim
+    files = ["fedflow_results/42/p42_r2_s1.log", "fedflow_results/42/p42_r2_s1.zip", "fedflow_results/42/p42_r2_s2.zip"]
+    stdout = "downloading...\n" + "".join(f"FILE: {f}\n" for f in files)
+    cm.threadg = [FakeConnection("host0", stdout=stdout, fc_username="USER0")]
+    cm.fetch_results(outdir=str(tmp_path), pid="42")
+    cxn = cm.threadg[0]
+    assert "fcauto download -u USER0 -p 42 -o fedflow_results/42" in cxn.commands[0]
+    assert not any("tar" in cmd for cmd in cxn.commands)
+    assert cxn.transferred == files
+    # the result of the last step is kept at the usual path
+    assert (tmp_path / "results_USER0.zip").read_text() == files[-1]
+
+
+
+def test_fetch_results_collects_nodes_concurrently(client_manager_nosim, tmp_path):
+    cm = client_manager_nosim
+    stdout = "FILE: fedflow_results/42/p42_r1_s1.zip\n"
+    cm.threadg = [FakeConnection(f"host{i}", stdout=stdout, delay=0.3, fc_username=f"USER{i}") for i in range(3)]
+    start = time.monotonic()
+    report = cm.fetch_results(outdir=str(tmp_path), pid="42")
+    # close to the slowest node rather than the sum over all nodes
+    assert time.monotonic() - start < 0.8
+    assert sorted(report) == ["user@host0:22", "user@host1:22", "user@host2:22"]
+    assert report["user@host0:22"]["files"] == 1
+    assert report["user@host0:22"]["bytes"] == len("fedflow_results/42/p42_r1_s1.zip")
+    # a failing node doesn't stop the others
+    cm.threadg.append(FakeConnection("host3", fail=True, fc_username="USER3"))
+    with pytest.raises(RuntimeError, match="1/4 nodes failed .*host3"):
+        cm.fetch_results(outdir=str(tmp_path), pid="42")
+    # nodes behind one host are reported separately
+    cm.threadg = [FakeConnection("host0", stdout=stdout, port=port, fc_username=f"USER{port}") for port in (2222, 2223)]
+    assert sorted(cm.fetch_results(outdir=str(tmp_path), pid="42")) == ["user@host0:2222", "user@host0:2223"]
+
+
+
+class LocalChannel:
+    """
+    Stand-in for a paramiko channel that runs the command in a local directory
+    """
+    def __init__(self, cwd):
+        self.cwd = cwd
+
+    def exec_command(self, cmd):
+        self.proc = subprocess.Popen(cmd.replace("sudo ", ""), shell=True, executable="/bin/bash", cwd=self.cwd,
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def makefile(self, mode):
+        return self.proc.stdout
+
+    def makefile_stderr(self, mode):
+        return self.proc.stderr
+
+    def recv_exit_status(self):
+        return self.proc.wait()
+
+    def close(self):
+        self.proc.stdout.close()
+        self.proc.stderr.close()
+
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip"])
+def test_fetch_archive_streams_selected_paths(client_manager_nosim, tmp_path, compression):
+    home = tmp_path / "remote"
+    for run in (1, 2):
+        run_dir = home / f"data_fc/workflows/Project_42/Run_{run}"
+        run_dir.mkdir(parents=True)
+        (run_dir / f"results_pr42_run{run}_step1.zip").write_text(f"run {run}")
+        (run_dir / "app.tar").write_text("image")
+    (home / "data_fc/inputs").mkdir()
+    (home / "data_fc/inputs/data.csv").write_text("x")
+    cxn = FakeConnection("host0", fc_username="USER0")
+    channel = LocalChannel(cwd=home)
+    cxn.open = lambda: None
+    cxn.client = SimpleNamespace(get_transport=lambda: SimpleNamespace(open_session=lambda: channel))
+    cm = client_manager_nosim
+    cm.threadg = [cxn]
+    report = cm.fetch_results(outdir=str(tmp_path / "out"), pid="42", mode="archive",
+                              include=["workflows/Project_{pid}/", "workflows/Project_{pid}/Run_9/"],
+                              exclude=["*.tar"], compression=compression)
+    local = tmp_path / "out/USER0/data_fc"
+    assert (local / "workflows/Project_42/Run_1/results_pr42_run1_step1.zip").is_file()
+    assert not (local / "inputs").exists()
+    assert not list(local.rglob("*.tar"))
+    assert report["user@host0:22"]["bytes"] > 0
+    # no archive is left behind on either side
+    assert not list(home.glob("*.tar*")) and not list((tmp_path / "out").rglob("*.tar.gz"))
+    assert (tmp_path / "out/results_USER0.zip").read_text() == "run 2"
+
+
+
+def test_stream_archive_reports_remote_errors(tmp_path):
+    from fedflow.ClientManager import stream_archive
+    cxn = FakeConnection("host0")
+    channel = LocalChannel(cwd=tmp_path)
+    cxn.open = lambda: None
+    cxn.client = SimpleNamespace(get_transport=lambda: SimpleNamespace(open_session=lambda: channel))
+    # e.g. zstd missing on the node: nothing arrives, the remote error is reported instead of an empty archive
+    with pytest.raises(RuntimeError, match="exit status 127.*zstd-missing"):
+        stream_archive(cxn, "set -o pipefail; tar -cf - . | zstd-missing -c", dest=tmp_path / "out")
+
+
+
+class LocalNode(dict):
+    """
+    Stand-in for a fabric Connection whose home directory is a local directory
+    """
+    def __init__(self, host, home, user="user", port=22, **info):
+        super().__init__(**info)
+        self.host = host
+        self.user = user
+        self.port = port
+        self.home = home
+        self.uploads = []
+
+    def run(self, cmd, **kwargs):
+        res = subprocess.run(cmd, shell=True, executable="/bin/bash", cwd=self.home, capture_output=True, text=True)
+        return SimpleNamespace(stdout=res.stdout)
+
+    def put(self, local, remote):
+        self.uploads.append(remote)
+        data = local.read() if hasattr(local, "read") else Path(local).read_bytes()
+        (self.home / remote).write_bytes(data)
+
+
+
+def test_distribute_data_skips_unchanged_files(client_manager_nosim, tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "CACHE_DIR", tmp_path / "cache")
+    data = [tmp_path / "a.csv", tmp_path / "b.csv"]
+    for f in data:
+        f.write_text(f"content of {f.name}")
+    cm = client_manager_nosim
+    homes = [tmp_path / f"node{i}" for i in range(2)]
+    for home in homes:
+        home.mkdir()
+    cm.threadg = [LocalNode(f"host{i}", home, data=[str(f) for f in data]) for i, home in enumerate(homes)]
+    report = cm.distribute_data()
+    assert sorted(report["user@host0:22"]["uploaded"]) == ["a.csv", "b.csv"]
+    # nothing changed, nothing is sent
+    for node in cm.threadg:
+        node.uploads.clear()
+    report = cm.distribute_data()
+    assert report["user@host1:22"]["uploaded"] == [] and sorted(report["user@host1:22"]["skipped"]) == ["a.csv", "b.csv"]
+    assert cm.threadg[1].uploads == []
+    # a changed local file and a file modified on the node are sent again
+    data[0].write_text("new content")
+    (homes[1] / "b.csv").write_text("tampered")
+    report = cm.distribute_data()
+    assert report["user@host0:22"]["uploaded"] == ["a.csv"]
+    assert sorted(report["user@host1:22"]["uploaded"]) == ["a.csv", "b.csv"]
+    assert (homes[1] / "b.csv").read_text() == "content of b.csv"
+
+
+
+class InstallNode(LocalNode):
+    """
+    LocalNode that records venv and pip commands instead of running them
+    """
+    def __init__(self, host, home, **info):
+        super().__init__(host, home, **info)
+        self.installs = []
+
+    def run(self, cmd, **kwargs):
+        if "pip install" in cmd or "-m venv" in cmd:
+            self.installs.append(cmd)
+            return SimpleNamespace(stdout="")
+        return super().run(cmd, **kwargs)
+
+
+
+def test_install_package_skips_up_to_date_nodes(client_manager_nosim, tmp_path, monkeypatch):
+    import fedflow.ClientManager as client_manager
+    monkeypatch.chdir(tmp_path)
+    Path("dist").mkdir()
+    whl = Path("dist/fedflow-0.1-py3-none-any.whl")
+    whl.write_text("fedflow")
+    dep = Path("dist/httpx-0.28.1-py3-none-any.whl")
+    dep.write_text("httpx")
+    built = []
+
+    def build_wheelhouse(requirement, target, dest):
+        built.append(requirement)
+        return [dep, whl]
+
+    monkeypatch.setattr(client_manager, "build_wheelhouse", build_wheelhouse)
+    cm = client_manager_nosim
+    homes = [tmp_path / f"node{i}" for i in range(2)]
+    for home in homes:
+        (home / ".venv").mkdir(parents=True)
+    cm.threadg = [InstallNode(f"host{i}", home) for i, home in enumerate(homes)]
+    report = cm.install_package(extras=["http2"])
+    assert report["user@host0:22"]["installed"] and report["user@host0:22"]["wheels"] == 2
+    # one wheelhouse for nodes of the same platform, installed without an index
+    assert built == [f"{whl}[http2]"]
+    assert "pip install --no-index --find-links wheelhouse" in cm.threadg[1].installs[-1]
+    assert (homes[1] / "wheelhouse" / dep.name).read_text() == "httpx"
+    # nothing changed, nothing is installed
+    for node in cm.threadg:
+        node.installs.clear()
+    report = cm.install_package(extras=["http2"])
+    assert not report["user@host0:22"]["installed"] and cm.threadg[0].installs == []
+    # a new build of fedflow is installed, only its wheel is sent
+    whl.write_text("fedflow, rebuilt")
+    report = cm.install_package(extras=["http2"])
+    assert report["user@host1:22"]["installed"] and report["user@host1:22"]["wheels"] == 1
+    # pip would keep the installed fedflow of the same version
+    assert "--force-reinstall --no-deps wheelhouse/fedflow-0.1-py3-none-any.whl" in cm.threadg[1].installs[-1]
+    # reinstall forces the installation
+    report = cm.install_package(reinstall=True, extras=["http2"])
+    assert report["user@host0:22"]["installed"]
+    assert cm.threadg[0].installs[-1].endswith("--force-reinstall")
+
+
+
+def test_provision_skips_provisioned_nodes(client_manager_nosim, tmp_path, monkeypatch):
+    from fedflow import provision
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(provision, "PROVISION_MARKER", str(tmp_path / "var/provision"))
+    # sudo is a no-op for nodes in a local directory
+    (tmp_path / "bin").mkdir()
+    (tmp_path / "bin/sudo").write_text('#!/bin/sh\nexec "$@"\n')
+    (tmp_path / "bin/sudo").chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path / 'bin'}:{Path('/usr/bin')}:{Path('/bin')}")
+    body = "echo provisioning >> provision.log"
+    script = provision.write_provision_script(body)
+    check = provision.provision_check(body)
+    cm = client_manager_nosim
+    (tmp_path / "node0").mkdir()
+    cm.threadg = [LocalNode("host0", tmp_path / "node0")]
+    report = cm.provision(script_path=script, check=check)
+    assert report["user@host0:22"]["ran"]
+    assert (tmp_path / "node0/provision.log").read_text() == "provisioning\n"
+    # the marker matches, the script isn't even sent
+    cm.threadg[0].uploads.clear()
+    report = cm.provision(script_path=script, check=check)
+    assert not report["user@host0:22"]["ran"] and cm.threadg[0].uploads == []
+    # a changed script runs again, as does a forced run
+    body = "echo provisioning v2 >> provision.log"
+    script = provision.write_provision_script(body)
+    check = provision.provision_check(body)
+    assert cm.provision(script_path=script, check=check)["user@host0:22"]["ran"]
+    assert not cm.provision(script_path=script, check=check)["user@host0:22"]["ran"]
+    assert cm.provision(script_path=script, check=check, reprovision=True)["user@host0:22"]["ran"]
+    assert (tmp_path / "node0/provision.log").read_text().count("v2") == 2
+
+
+
+def test_start_controllers_reuses_healthy_controllers(client_manager_nosim):
+    from fedflow.ClientManager import controller_mismatch
+    warm = "running=true\nimage=sha256:1\nlatest=sha256:1\nmounts=/home/u/data_fc /var/run/docker.sock\n" \
+           "data_dir=/home/u/data_fc\nhealthy=true\n"
+    assert controller_mismatch(warm) is None
+    assert controller_mismatch(warm.replace("latest=sha256:1", "latest=sha256:2")) == "controller image is outdated"
+    assert controller_mismatch(warm.replace("mounts=/home/u/data_fc", "mounts=/tmp/data")) is not None
+    assert controller_mismatch(warm.replace("healthy=true", "healthy=")) == "controller does not answer"
+    cm = client_manager_nosim
+    cm.threadg = [FakeConnection("host0", stdout=warm),
+                  FakeConnection("host1", stdout=warm.replace("running=true", "running="))]
+    report = cm.start_featurecloud_controllers(reuse=True)
+    assert report["user@host0:22"]["reused"] and len(cm.threadg[0].commands) == 1
+    assert not report["user@host1:22"]["reused"]
+    assert any("featurecloud controller start --data-dir data_fc" in cmd for cmd in cm.threadg[1].commands)
+
+
+
+def test_controller_probe_pings_the_configured_controller(tmp_path):
+    from fedflow.ClientManager import CONTROLLER_PROBE
+    # stand-ins for docker and a curl that only reaches a controller on port 8001
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    (bin_dir / "docker").write_text("#!/bin/sh\nexit 1\n")
+    (bin_dir / "curl").write_text('#!/bin/sh\nfor a; do last=$a; done\n[ "$last" = http://localhost:8001/ping/ ]\n')
+    for tool in bin_dir.iterdir():
+        tool.chmod(0o755)
+    env = {"PATH": f"{bin_dir}:/usr/bin:/bin"}
+
+    def probe(**extra):
+        out = subprocess.run(["bash", "-c", CONTROLLER_PROBE], cwd=tmp_path, env={**env, **extra},
+                             capture_output=True, text=True).stdout
+        return dict(line.split("=", 1) for line in out.splitlines())
+
+    assert probe()["url"] == "http://localhost:8000"
+    assert probe()["healthy"] == ""
+    assert probe(FEDFLOW_CONTROLLER_URL="http://localhost:8001")["healthy"] == "true"
+    # the .env written by distribute_credentials takes precedence, as in fcauto
+    (tmp_path / ".env").write_text("USER0=secret\nFEDFLOW_CONTROLLER_URL=http://localhost:8001/\n")
+    state = probe(FEDFLOW_CONTROLLER_URL="http://localhost:8002")
+    assert state["url"] == "http://localhost:8001/"
+    assert state["healthy"] == "true"
+
+
+
+def test_build_wheelhouse_lists_older_manylinux_tags(tmp_path, monkeypatch):
+    import fedflow.ClientManager as client_manager
+    whl = tmp_path / "fedflow-0.1-py3-none-any.whl"
+    whl.write_text("fedflow")
+    calls = []
+
+    def run(cmd, **kwargs):
+        calls.append(cmd)
+        return SimpleNamespace(returncode=0, stderr="")
+
+    monkeypatch.setattr(client_manager.subprocess, "run", run)
+    client_manager.build_wheelhouse(str(whl), target="3.12 x86_64 glibc 2.39", dest=tmp_path / "wheelhouse")
+    platforms = [calls[0][i + 1] for i, arg in enumerate(calls[0]) if arg == "--platform"]
+    # binary dependencies ship e.g. manylinux2014 or manylinux_2_28 wheels
+    assert {"manylinux_2_39_x86_64", "manylinux_2_28_x86_64", "manylinux_2_17_x86_64", "manylinux2014_x86_64"} <= set(platforms)
+    assert "manylinux_2_16_x86_64" not in platforms
+    # the same requirement doesn't download again
+    client_manager.build_wheelhouse(str(whl), target="3.12 x86_64 glibc 2.39", dest=tmp_path / "wheelhouse")
+    assert len(calls) == 1
@@ -0,0 +1,102 @@
+import io
+import json
+import socket
+from types import SimpleNamespace
+
+import pytest
+
+from fedflow import featurecloud_api
+from fedflow.agent import Agent, AgentError, RemoteAgent
+
+
+
+def run_agent(agent: Agent, *requests) -> list[dict]:
+    instream = io.StringIO("".join(json.dumps(r) + "\n" for r in requests))
+    outstream = io.StringIO()
+    agent.serve(instream=instream, outstream=outstream)
+    return [json.loads(line) for line in outstream.getvalue().splitlines()]
+
+
+
+def test_agent_ping_and_unknown_method():
+    responses = run_agent(
+        Agent(),
+        {"jsonrpc": "2.0", "id": 1, "method": "ping"},
+        {"jsonrpc": "2.0", "id": 2, "method": "nope"},
+        {"jsonrpc": "2.0", "id": 3, "method": "ping", "params": {"extra": 1}},
+    )
+    assert responses[0]["id"] == 1 and "pid" in responses[0]["result"]
+    assert responses[1]["error"]["code"] == -32601
+    assert responses[2]["error"]["code"] == -32602
+
+
+
+def test_agent_reports_errors_inside_methods(monkeypatch):
+    def query_project(username, project_id, user):
+        raise TypeError("unsupported operand")
+
+    monkeypatch.setattr(featurecloud_api, "User", lambda username: object())
+    monkeypatch.setattr(featurecloud_api, "query_project", query_project)
+    responses = run_agent(Agent(), {"jsonrpc": "2.0", "id": 1, "method": "query",
+                                    "params": {"username": "USER0", "project_id": "42"}})
+    # a bug in the method is a server error, not invalid params
+    assert responses[0]["error"]["code"] == -32000
+    assert "TypeError: unsupported operand" in responses[0]["error"]["message"]
+
+
+
+def test_agent_reuses_user_and_stops_on_shutdown(monkeypatch):
+    created = []
+
+    class FakeUser:
+        def __init__(self, username):
+            created.append(username)
+
+    def query_project(username, project_id, user):
+        assert isinstance(user, FakeUser)
+        return "running"
+
+    monkeypatch.setattr(featurecloud_api, "User", FakeUser)
+    monkeypatch.setattr(featurecloud_api, "query_project", query_project)
+    responses = run_agent(
+        Agent(),
+        {"jsonrpc": "2.0", "id": 1, "method": "query", "params": {"username": "u", "project_id": "1"}},
+        {"jsonrpc": "2.0", "id": 2, "method": "query", "params": {"username": "u", "project_id": "1"}},
+        {"jsonrpc": "2.0", "id": 3, "method": "shutdown"},
+        {"jsonrpc": "2.0", "id": 4, "method": "ping"},
+    )
+    assert [r["result"] for r in responses[:2]] == [{"status": "running"}] * 2
+    assert created == ["u"]
+    # requests after shutdown are not answered
+    assert len(responses) == 3
+
+
+
+def test_remote_agent_times_out_without_reply():
+    local, remote = socket.socketpair()
+
+    class FakeChannel:
+        closed = False
+
+        def settimeout(self, timeout):
+            local.settimeout(timeout)
+
+        def close(self):
+            self.closed = True
+
+    agent = RemoteAgent(SimpleNamespace(host="host0"), timeout=0.05)
+    agent.channel = channel = FakeChannel()
+    agent.stdin, agent.stdout = local.makefile("wb"), local.makefile("rb")
+    # the reply to the first request arrives, the second one hangs
+    remote.sendall(b'{"jsonrpc": "2.0", "id": 1, "result": {"status": "ready"}}\n')
+    assert agent.call("query", username="USER0", project_id="42") == {"status": "ready"}
+    with pytest.raises(AgentError, match="did not reply to 'monitor' within 0.05s"):
+        agent.call("monitor", username="USER0", project_id="42")
+    requests = remote.makefile("rb")
+    assert [json.loads(requests.readline())["method"] for _ in range(2)] == ["query", "monitor"]
+    # a channel that may still carry the late reply isn't used again
+    assert channel.closed
+    with pytest.raises(AgentError, match="not running"):
+        agent.call("query", username="USER0", project_id="42")
+    local.close()
+    remote.close()
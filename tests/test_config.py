@@ -1,5 +1,7 @@
 from fabric import SerialGroup, ThreadingGroup
 
+from fedflow.config import HttpConfig
+
 
 def test_config(config_mean_trio, fc_creds):
     assert fc_creds["USER0"] == "PASS0"
@@ -21,3 +23,10 @@ def test_construct_connection_group(config_mean_trio_nosim):
     assert threadg is not None
     assert isinstance(serialg, SerialGroup)
     assert isinstance(threadg, ThreadingGroup)
+
+
+
+def test_http_config_env():
+    assert HttpConfig().env() == {}
+    http = HttpConfig(http2=True, read_timeout=30)
+    assert http.env() == {"FEDFLOW_HTTP2": "True", "FEDFLOW_READ_TIMEOUT": "30.0"}
@@ -0,0 +1,458 @@
+import base64
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+from pathlib import Path
+import stat
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from fedflow import featurecloud_api
+from fedflow.featurecloud_api import AppTable, FCC, RateLimiter, ResponseCache, TokenCache, User, FEATURECLOUD_URL
+
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(monkeypatch, tmp_path):
+    """
+    Keep tokens, cached responses and rate limit state out of the home directory.
+    """
+    monkeypatch.setattr(featurecloud_api, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(featurecloud_api, "_LIMITERS", {})
+
+
+
+def test_shared_sessions():
+    client_a = featurecloud_api.new_client(base_url=FEATURECLOUD_URL)
+    client_b = featurecloud_api.new_client(base_url=FEATURECLOUD_URL)
+    # separate clients for separate users, but one connection pool
+    assert client_a is not client_b
+    assert client_a._transport is client_b._transport
+    assert featurecloud_api.get_client(FEATURECLOUD_URL) is featurecloud_api.get_client(FEATURECLOUD_URL)
+
+
+
+def test_app_table_fetched_once(monkeypatch):
+    calls = []
+
+    def fake_app_list(self):
+        calls.append(1)
+        return {"mean-app": 1}
+
+    monkeypatch.setattr(AppTable, "_get_app_list", fake_app_list)
+    monkeypatch.setattr(AppTable, "_shared", None)
+    assert AppTable.shared().apps == {"mean-app": 1}
+    assert AppTable.shared() is AppTable.shared()
+    assert len(calls) == 1
+
+
+
+def make_jwt(exp: float) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).decode().rstrip("=")
+    return f"header.{payload}.signature"
+
+
+
+@pytest.fixture
+def mock_featurecloud(monkeypatch, tmp_path):
+    """
+    Route featurecloud.ai requests of User to a mock handler and record the paths.
+    """
+    calls = []
+    state = {"access": make_jwt(time.time() + 600)}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if request.url.path == "/api/auth/login/":
+            return httpx.Response(200, json={"access": state["access"], "refresh": make_jwt(time.time() + 6000)})
+        if request.url.path == "/api/auth/token/refresh/":
+            return httpx.Response(200, json={"access": state["access"]})
+        if request.headers.get("Authorization") != f"Bearer {state['access']}":
+            return httpx.Response(401)
+        if request.url.path == "/api/site/":
+            return httpx.Response(200, json={"id": 1})
+        return httpx.Response(200, json={})
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("USER0", "PASS0")
+    monkeypatch.setattr(featurecloud_api, "get_transport", lambda base_url: httpx.MockTransport(handler))
+    monkeypatch.setattr(AppTable, "_shared", SimpleNamespace(apps={"mean-app": 1}))
+    return calls, state
+
+
+
+def test_token_cache_permissions(tmp_path):
+    cache = TokenCache(username="federated.client+00@gmail.com", cache_dir=tmp_path)
+    assert cache.load() is None
+    cache.save(access="a", refresh="r")
+    assert cache.load()["access"] == "a"
+    assert stat.S_IMODE(os.stat(cache.path).st_mode) == 0o600
+    # concurrent writers don't share a temporary file
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: cache.save(access=f"a{i}", refresh="r"), range(50)))
+    assert cache.load()["access"].startswith("a")
+    assert [p.name for p in cache.path.parent.iterdir()] == [cache.path.name]
+
+
+
+def test_user_reuses_cached_token(mock_featurecloud):
+    calls, state = mock_featurecloud
+    User(username="USER0")
+    assert calls.count("/api/auth/login/") == 1
+    # second user of the same name picks up the cached token
+    User(username="USER0")
+    assert calls.count("/api/auth/login/") == 1
+
+
+
+def test_user_fetches_nothing_up_front(mock_featurecloud, tmp_path):
+    calls, state = mock_featurecloud
+    user = User(username="USER0")
+    # only the login, no user info, site info or app list
+    assert calls == ["/api/auth/login/"]
+    assert not (tmp_path / "data_fc").exists()
+    user.ensure_site_info()
+    user.ensure_site_info()
+    assert calls.count("/api/site/") == 1
+    assert (tmp_path / "data_fc" / "site_info.json").exists()
+
+
+
+def test_user_refreshes_rejected_token(mock_featurecloud):
+    calls, state = mock_featurecloud
+    user = User(username="USER0")
+    # server rotates the access token, the next request is rejected once and retried
+    state["access"] = make_jwt(time.time() + 600)
+    assert user.is_logged_in()
+    assert calls.count("/api/auth/token/refresh/") == 1
+    assert calls.count("/api/auth/login/") == 1
+    assert user.tokens.load()["access"] == state["access"]
+
+
+
+def test_response_cache_revalidates_with_etag(tmp_path):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, json=[{"slug": "mean-app", "id": 1}], headers={"ETag": '"v1"'})
+
+    client = httpx.Client(base_url=FEATURECLOUD_URL, transport=httpx.MockTransport(handler))
+    cache = ResponseCache(name="apps", ttl=60, cache_dir=tmp_path)
+    limiter = RateLimiter(rate=100)
+    first = cache.get(client=client, url="/api/apps/", limiter=limiter)
+    # fresh entries don't hit the server
+    assert cache.get(client=client, url="/api/apps/", limiter=limiter) == first
+    assert calls == [None]
+    # stale entries are revalidated
+    cache.expire()
+    assert cache.get(client=client, url="/api/apps/", limiter=limiter) == first
+    assert calls == [None, '"v1"']
+    # invalidated entries are downloaded again
+    cache.invalidate()
+    cache.get(client=client, url="/api/apps/", limiter=limiter)
+    assert calls == [None, '"v1"', None]
+
+
+
+def test_project_snapshot_coalesces_reads():
+    calls = []
+    state = {"status": "ready"}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "PUT":
+            state.update(json.loads(request.content))
+            return httpx.Response(200, json=state)
+        calls.append(request.url.path)
+        time.sleep(0.05)
+        return httpx.Response(200, json={"status": state["status"], "role": "coordinator"})
+
+    client = httpx.Client(base_url=FEATURECLOUD_URL, transport=httpx.MockTransport(handler))
+    project = featurecloud_api.Project(client=client)
+    project.project_id = "42"
+    project.limiter = RateLimiter(rate=100)
+    # concurrent callers share one in-flight request, later ones the snapshot
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        statuses = list(pool.map(lambda _: project.get_status(), range(8)))
+    assert statuses == ["ready"] * 8
+    assert project.is_ready() and project.get_role() == "coordinator"
+    assert len(calls) == 1
+    # writes invalidate the snapshot
+    project.set_status("prepare")
+    assert project.is_prepping()
+    assert len(calls) == 2
+
+
+
+@pytest.fixture
+def mock_controller(monkeypatch):
+    """
+    Route requests to the local controller to a mock handler and record the uploads.
+    """
+    uploads = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/ping/":
+            return httpx.Response(200)
+        if request.url.path == "/file-upload/":
+            body = request.read()
+            uploads.append((request.url.params["fileName"], request.headers.get("Content-Length"), body))
+            return httpx.Response(200, text="ok")
+        if request.url.path == "/project-runs/":
+            return httpx.Response(200, json=[
+                {"runNr": 1, "startedOn": "", "logSteps": [0], "resultSteps": [0]},
+                {"runNr": 2, "startedOn": "", "logSteps": [0], "resultSteps": [0]},
+            ])
+        if request.url.path in ["/logs-download/", "/file-download/"]:
+            content = f"{request.url.path}{request.url.params['run']}".encode() * 100
+            etag = f'"{hashlib.md5(content).hexdigest()}"'
+            # a Range request is only honoured if the file is unchanged since If-Range
+            if "Range" in request.headers and request.headers.get("If-Range", etag) == etag:
+                offset = int(request.headers["Range"].split("=")[1].rstrip("-"))
+                if offset >= len(content):
+                    return httpx.Response(416)
+                return httpx.Response(206, content=content[offset:], headers={"ETag": etag})
+            return httpx.Response(200, content=content, headers={"ETag": etag})
+        return httpx.Response(404)
+
+    monkeypatch.setattr(featurecloud_api, "_CLIENTS", {})
+    monkeypatch.setattr(featurecloud_api, "_CONTROLLERS", {})
+    monkeypatch.setattr(featurecloud_api, "get_transport", lambda base_url: httpx.MockTransport(handler))
+    monkeypatch.setattr(featurecloud_api.time, "sleep", lambda seconds: None)
+    return uploads
+
+
+
+def test_controller_url_is_read_from_env_file(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("FEDFLOW_CONTROLLER_URL", raising=False)
+    monkeypatch.setattr(featurecloud_api, "_CONTROLLERS", {})
+    assert featurecloud_api.get_controller().host == featurecloud_api.CONTROLLER_URL
+    # e.g. written by distribute_credentials after the module was imported
+    (tmp_path / ".env").write_text("FEDFLOW_CONTROLLER_URL=http://localhost:8123\n")
+    assert featurecloud_api.get_controller().host == "http://localhost:8123"
+
+
+
+def test_controller_waits_until_ready(monkeypatch):
+    pings = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        pings.append(request.url.port)
+        # port 8001 never comes up, 8000 after two refused connections
+        if request.url.port == 8001 or len(pings) < 3:
+            raise httpx.ConnectError("Connection refused", request=request)
+        return httpx.Response(200)
+
+    monkeypatch.setattr(featurecloud_api, "_CLIENTS", {})
+    monkeypatch.setattr(featurecloud_api, "_CONTROLLERS", {})
+    monkeypatch.setattr(featurecloud_api, "get_transport", lambda base_url: featurecloud_api.RetryTransport(
+        transport=httpx.MockTransport(handler), limiter=RateLimiter(rate=1000)))
+    controller = featurecloud_api.get_controller("http://localhost:8000")
+    assert featurecloud_api.get_controller("http://localhost:8000") is controller
+    assert controller.wait_until_ready(timeout=5, interval=0.01)
+    # each probe is a single request, the transport doesn't retry it
+    assert pings == [8000, 8000, 8000]
+    # readiness is only established once
+    assert controller.wait_until_ready(timeout=5)
+    assert len(pings) == 3
+    with pytest.raises(TimeoutError):
+        featurecloud_api.get_controller("http://localhost:8001").wait_until_ready(timeout=0.1, interval=0.01)
+
+
+
+def test_upload_files_streams_with_length(mock_controller, tmp_path):
+    uploads = mock_controller
+    data = tmp_path / "data.csv"
+    data.write_bytes(b"x" * (featurecloud_api.CHUNK_SIZE * 2 + 5))
+    other = tmp_path / "other.csv"
+    other.write_bytes(b"y")
+    project = SimpleNamespace(project_id="42", get_status=lambda: "prepare", is_prepping=lambda: True)
+    fcc = FCC(user=None, project=project)
+    results = fcc.upload_files(filepaths=[str(data), str(other)], jobs=2)
+    assert results == {"data.csv": "ok", "other.csv": "ok"}
+    received = {name: (length, body) for name, length, body in uploads}
+    assert received["data.csv"] == (str(data.stat().st_size), data.read_bytes())
+    # finalize request is sent after all files
+    assert uploads[-1][0] == ""
+
+
+
+def test_download_outcome_resumes_and_selects_runs(mock_controller, tmp_path):
+    project = SimpleNamespace(project_id="42")
+    fcc = FCC(user=None, project=project)
+    # a partial download from an earlier attempt is resumed
+    expected = b"/file-download/2" * 100
+    (tmp_path / "p42_r2_s0.zip.part").write_bytes(expected[:50])
+    downloaded = fcc.download_outcome(out_dir=str(tmp_path))
+    assert sorted(Path(p).name for p in downloaded) == ["p42_r2_s0.log", "p42_r2_s0.zip"]
+    assert (tmp_path / "p42_r2_s0.zip").read_bytes() == expected
+    assert not (tmp_path / "p42_r2_s0.zip.part").exists()
+    assert not (tmp_path / "p42_r2_s0.zip.part.tag").exists()
+    # an interrupted download is resumed if the controller confirms the file is unchanged
+    zippath = tmp_path / "p42_r2_s0.zip"
+    zippath.rename(tmp_path / "p42_r2_s0.zip.part")
+    (tmp_path / "p42_r2_s0.zip.part").write_bytes(expected[:10])
+    (tmp_path / "p42_r2_s0.zip.part.tag").write_text(f'"{hashlib.md5(expected).hexdigest()}"')
+    log_mtime = (tmp_path / "p42_r2_s0.log").stat().st_mtime_ns
+    fcc.download_outcome(out_dir=str(tmp_path))
+    assert zippath.read_bytes() == expected
+    assert not (tmp_path / "p42_r2_s0.zip.part.tag").exists()
+    assert (tmp_path / "p42_r2_s0.log").stat().st_mtime_ns == log_mtime
+    # stale part files are downloaded again, with a changed validator or without one
+    for tag in ['"stale"', None]:
+        zippath.unlink()
+        (tmp_path / "p42_r2_s0.zip.part").write_bytes(b"x" * (len(expected) + 5))
+        if tag:
+            (tmp_path / "p42_r2_s0.zip.part.tag").write_text(tag)
+        fcc.download_outcome(out_dir=str(tmp_path))
+        assert zippath.read_bytes() == expected
+    # existing files are kept unless the download is forced
+    zippath.write_bytes(b"x" * len(expected))
+    fcc.download_outcome(out_dir=str(tmp_path))
+    assert zippath.read_bytes() == b"x" * len(expected)
+    fcc.download_outcome(out_dir=str(tmp_path), force=True)
+    assert zippath.read_bytes() == expected
+    downloaded = fcc.download_outcome(out_dir=str(tmp_path), runs="all")
+    assert len(downloaded) == 4
+    with pytest.raises(ValueError):
+        fcc.download_outcome(out_dir=str(tmp_path), runs=[3])
+
+
+
+def test_watch_status_yields_transitions(monkeypatch):
+    statuses = iter(["prepare", "running", "running", "running", "finished"])
+    sleeps = []
+    monkeypatch.setattr(featurecloud_api.time, "sleep", sleeps.append)
+    project = SimpleNamespace(project_id="42", get_status=lambda: next(statuses))
+    fcc = FCC.__new__(FCC)
+    fcc.project = project
+    schedule = featurecloud_api.PollSchedule(min_interval=1, max_interval=10, backoff=2, jitter=0)
+    transitions = list(fcc.watch_status(schedule=schedule))
+    assert transitions == [(None, "prepare"), ("prepare", "running"), ("running", "finished")]
+    # fast polls after each transition, backoff while unchanged
+    assert sleeps == [1, 1, 2, 4]
+
+
+
+def test_watch_status_timeout_starts_after_prepare(monkeypatch):
+    clock = [0.0]
+    statuses = iter(["prepare"] * 10 + ["running"] * 10)
+    monkeypatch.setattr(featurecloud_api.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(featurecloud_api.time, "sleep", lambda s: clock.__setitem__(0, clock[0] + s))
+    project = SimpleNamespace(project_id="42", get_status=lambda: next(statuses))
+    fcc = FCC.__new__(FCC)
+    fcc.project = project
+    schedule = featurecloud_api.PollSchedule(min_interval=5, max_interval=5, jitter=0)
+    watch = fcc.watch_status(timeout=20, schedule=schedule)
+    # a long app pull does not use up the timeout
+    assert next(watch) == (None, "prepare")
+    assert next(watch) == ("prepare", "running")
+    assert clock[0] == 50
+    with pytest.raises(TimeoutError):
+        next(watch)
+    assert clock[0] == 70
+    # a project stuck in 'prepare' runs into its own timeout
+    statuses = iter(["prepare"] * 10)
+    watch = fcc.watch_status(timeout=20, schedule=schedule, prepare_timeout=30)
+    start = clock[0]
+    assert next(watch) == (None, "prepare")
+    with pytest.raises(TimeoutError, match="'prepare'"):
+        next(watch)
+    assert clock[0] - start == 30
+
+
+
+def test_rate_limiter_shared_between_instances(tmp_path):
+    # two limiters with the same name stand in for two processes on one host
+    first = RateLimiter(rate=2, per=10, name="featurecloud")
+    second = RateLimiter(rate=2, per=10, name="featurecloud")
+    assert first.reserve() == 0
+    assert second.reserve() == 0
+    assert first.reserve() > 0
+    # unnamed limiters keep their own budget
+    assert RateLimiter(rate=2, per=10).reserve() == 0
+
+
+
+def test_rate_limiter_queues_concurrent_callers():
+    limiter = RateLimiter(rate=2, per=1)
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        sleeps = sorted(pool.map(lambda _: limiter.reserve(), range(6)))
+    # callers beyond the burst are spaced by per/rate instead of all waking at once
+    assert sleeps[:2] == [0, 0]
+    assert sleeps[2:] == pytest.approx([0.5, 1.0, 1.5, 2.0], abs=0.05)
+
+
+
+def test_retry_transport_honours_throttling(monkeypatch):
+    monkeypatch.setattr(featurecloud_api.time, "sleep", lambda seconds: None)
+    responses = {"GET": [429, 200], "POST": [503, 200], "PUT": [429, 200]}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        status = responses[request.method].pop(0)
+        return httpx.Response(status, headers={"Retry-After": "0"})
+
+    limiter = RateLimiter(rate=3, per=1)
+    transport = featurecloud_api.RetryTransport(transport=httpx.MockTransport(handler), limiter=limiter)
+    client = httpx.Client(base_url=FEATURECLOUD_URL, transport=transport)
+    assert client.get("/api/projects/1/").status_code == 200
+    # throttling halves the rate, the healthy retry adds to it again
+    assert limiter.rate == pytest.approx(1.5 + 1 / 1.5)
+    # a 429 means the server didn't act on the request, so even POST/PUT are retried
+    assert client.put("/api/projects/1/", json={"status": "ready"}).status_code == 200
+    # a non-idempotent request may have been processed before a 503
+    assert client.post("/api/projects/", json={}).status_code == 503
+
+
+
+def test_adaptive_rate_uses_a_baseline_per_endpoint():
+    limiter = RateLimiter(rate=3, per=1)
+    # a fast ping doesn't make the usual latency of other endpoints count as slow
+    limiter.adapt(latency=0.01, endpoint="/ping/")
+    limiter.rate = 1
+    for _ in range(20):
+        limiter.adapt(latency=0.4, endpoint="/api/projects/{id}/")
+    assert limiter.rate > 1
+    # healthy responses never raise the rate above the configured budget
+    assert limiter.rate == 3
+    # a slowdown of one endpoint backs off once per window and doesn't recover while it lasts
+    for _ in range(10):
+        limiter.adapt(latency=5, endpoint="/api/projects/{id}/")
+    assert limiter.rate == 1.5
+    # transfers are no latency signal
+    limiter.adapt(latency=None, endpoint="/file-upload/")
+    assert "/file-upload/" not in limiter.base_latency
+
+
+
+def test_http_settings_from_env(monkeypatch):
+    monkeypatch.setenv("FEDFLOW_HTTP2", "1")
+    monkeypatch.setenv("FEDFLOW_MAX_CONNECTIONS", "4")
+    monkeypatch.setenv("FEDFLOW_READ_TIMEOUT", "30")
+    monkeypatch.setattr(featurecloud_api, "find_spec", lambda name: object())
+    settings = featurecloud_api.HttpSettings.from_env()
+    assert settings.http2
+    assert settings.limits().max_connections == 4
+    assert settings.timeout().read == 30
+    assert settings.timeout().connect == featurecloud_api.HTTP_DEFAULTS["connect_timeout"]
+    # without the h2 package, HTTP/1.1 is used instead of failing
+    monkeypatch.setattr(featurecloud_api, "find_spec", lambda name: None)
+    assert not featurecloud_api.HttpSettings.from_env().http2
+
+
+
+def test_http_settings_are_resolved_once(monkeypatch, capsys):
+    monkeypatch.setenv("FEDFLOW_HTTP2", "1")
+    monkeypatch.setattr(featurecloud_api, "find_spec", lambda name: None)
+    monkeypatch.setattr(featurecloud_api, "_HTTP_SETTINGS", None)
+    monkeypatch.setattr(featurecloud_api, "_TRANSPORTS", {})
+    for _ in range(3):
+        featurecloud_api.new_client(base_url="http://localhost:8000").close()
+    assert capsys.readouterr().out.count("h2 package is not installed") == 1
@@ -0,0 +1,161 @@
+import asyncio
+import fcntl
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+
+from fedflow import featurecloud_api
+from fedflow.featurecloud_api_async import AsyncFCC, AsyncProject, AsyncRateLimiter, new_async_client
+
+
+
+def mock_handler(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/api/projects/42/":
+        return httpx.Response(200, json={"id": 42, "status": "ready"})
+    if request.url.path == "/api/project-tokens/42/":
+        return httpx.Response(200, json={"token": "tok"})
+    return httpx.Response(404)
+
+
+
+def test_async_clients_share_a_pool(monkeypatch):
+    monkeypatch.setattr(featurecloud_api, "_ASYNC_TRANSPORTS", {})
+    pools, closed = [], []
+
+    async def aclose(self):
+        closed.append(self)
+
+    monkeypatch.setattr(httpx.AsyncHTTPTransport, "aclose", aclose)
+
+    def pool_of(client):
+        return client._transport.transport.transport.transport
+
+    async def run():
+        client_a = new_async_client(base_url=featurecloud_api.FEATURECLOUD_URL)
+        client_b = new_async_client(base_url=featurecloud_api.FEATURECLOUD_URL)
+        pools.extend([pool_of(client_a), pool_of(client_b)])
+        # closing a client leaves the pool of the others open
+        await client_a.aclose()
+        client_c = new_async_client(base_url=featurecloud_api.FEATURECLOUD_URL)
+        pools.append(pool_of(client_c))
+        await client_b.aclose()
+        await client_c.aclose()
+
+    asyncio.run(run())
+    assert pools[0] is pools[1] is pools[2]
+    assert closed == []
+    # a new event loop gets its own pool, the one of the finished loop is dropped
+    asyncio.run(run())
+    assert pools[3] is not pools[0]
+    assert len(featurecloud_api._ASYNC_TRANSPORTS) == 1
+    featurecloud_api.close_sessions()
+    assert featurecloud_api._ASYNC_TRANSPORTS == {}
+
+
+
+def test_async_project_tokens_and_status():
+    async def run():
+        transport = httpx.MockTransport(mock_handler)
+        async with httpx.AsyncClient(base_url="https://featurecloud.ai", transport=transport) as client:
+            proj = await AsyncProject.from_project_id(project_id="42", client=client)
+            tokens = await proj.create_project_tokens(n=3)
+            ready = await proj.is_ready()
+        return tokens, ready
+
+    tokens, ready = asyncio.run(run())
+    assert len(tokens) == 3
+    assert tokens[0]["token"] == "tok"
+    assert ready
+
+
+
+def test_async_project_snapshot_coalesces_reads():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.method)
+        return mock_handler(request)
+
+    async def run():
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(base_url="https://featurecloud.ai", transport=transport) as client:
+            proj = AsyncProject(client=client)
+            proj.project_id = "42"
+            statuses = await asyncio.gather(*[proj.get_status() for _ in range(5)])
+            await proj.set_status("ready")
+            await proj.get_status()
+        return statuses
+
+    assert asyncio.run(run()) == ["ready"] * 5
+    assert calls == ["GET", "PUT", "GET"]
+
+
+
+def test_async_rate_limiter_does_not_block_the_event_loop(monkeypatch, tmp_path):
+    monkeypatch.setattr(featurecloud_api, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(featurecloud_api, "_LIMITERS", {})
+    limiter = AsyncRateLimiter("featurecloud")
+    limiter.limiter.path.parent.mkdir(parents=True)
+    # another process holds the shared budget for a moment
+    f = open(limiter.limiter.path, "a+")
+    fcntl.flock(f, fcntl.LOCK_EX)
+    threading.Timer(0.3, f.close).start()
+    ticks = []
+
+    async def tick():
+        while len(ticks) < 5:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.02)
+
+    async def main():
+        start = time.monotonic()
+        await asyncio.gather(limiter.wait(), tick())
+        return start
+
+    start = asyncio.run(main())
+    # the other task kept running while the reservation waited for the lock
+    assert ticks[-1] - start < 0.25
+
+
+
+def test_async_upload_files_bounds_concurrency(tmp_path):
+    finalized = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        finalized.append(request.url.params["finalize"])
+        return httpx.Response(200)
+
+    async def status():
+        return "prepare"
+
+    async def is_prepping():
+        return True
+
+    async def wait():
+        pass
+
+    active, peak = [0], [0]
+
+    async def upload_file(path, headers):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.01)
+        active[0] -= 1
+        return path.name
+
+    async def run():
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(base_url="http://localhost:8000", transport=transport) as client:
+            project = SimpleNamespace(project_id="42", get_status=status, is_prepping=is_prepping)
+            controller = SimpleNamespace(client=client, limiter=SimpleNamespace(wait=wait))
+            fcc = AsyncFCC(user=None, project=project, controller=controller)
+            fcc._upload_file = upload_file
+            return await fcc.upload_files(filepaths=[str(tmp_path / f"{i}.csv") for i in range(6)], jobs=2)
+
+    results = asyncio.run(run())
+    assert results == {f"{i}.csv": f"{i}.csv" for i in range(6)}
+    assert peak[0] == 2
+    # finalize is only sent once all files are uploaded
+    assert finalized == ["true"]
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from fedflow import featurecloud_api
+from fedflow.metrics import Metrics, endpoint_template, get_metrics
+from benchmarks.mock_server import MockFeatureCloud
+
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(featurecloud_api, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(featurecloud_api, "_LIMITERS", {})
+    monkeypatch.setattr(featurecloud_api, "RATE_LIMITS", {"featurecloud": (1000, 1), "controller": (1000, 1)})
+    monkeypatch.setattr(featurecloud_api.AppTable, "_shared", None)
+    server = MockFeatureCloud()
+    server.add_site("USER0", password="PASS0")
+    monkeypatch.setenv("USER0", "PASS0")
+    get_metrics().reset()
+    with server:
+        yield server
+    get_metrics().reset()
+
+
+
+def test_endpoint_template():
+    assert endpoint_template("/api/projects/42/") == "/api/projects/{id}/"
+    assert endpoint_template("/api/apps/3/purchase/") == "/api/apps/{id}/purchase/"
+    assert endpoint_template("/api/apps/") == "/api/apps/"
+
+
+
+def test_histogram_and_prometheus():
+    metrics = Metrics(buckets=(0.1, 1))
+    key = ("featurecloud", "GET", "/api/projects/{id}/")
+    metrics.observe(key, 200, 0.05, blocked=0.2)
+    metrics.observe(key, 200, 0.5, retries=1)
+    metrics.observe(key, None, 5)
+    metrics.add_bytes(key, 100)
+    entry = metrics.snapshot()["endpoints"][0]
+    assert entry["histogram"] == {"0.1": 1, "1": 1, "+Inf": 1}
+    assert entry["status"] == {"200": 2, "error": 1}
+    assert (entry["count"], entry["errors"], entry["retries"], entry["bytes"]) == (3, 1, 1, 100)
+    text = metrics.prometheus()
+    labels = 'upstream="featurecloud",method="GET",endpoint="/api/projects/{id}/"'
+    assert f'fedflow_http_request_duration_seconds_bucket{{{labels},le="1"}} 2' in text
+    assert f'fedflow_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3' in text
+    assert f'fedflow_http_requests_total{{{labels},status="200"}} 2' in text
+    assert f"fedflow_ratelimit_blocked_seconds_total{{{labels}}} 0.2" in text
+
+
+
+def test_requests_are_recorded_per_endpoint(server, tmp_path):
+    project_id = server.add_project("USER0")
+    server.throttle = 0.3
+    server.retry_after = 0.01
+    assert featurecloud_api.query_project(username="USER0", project_id=project_id) == "ready"
+    snapshot = get_metrics().snapshot()
+    endpoints = {(e["method"], e["endpoint"]): e for e in snapshot["endpoints"]}
+    project = endpoints[("GET", "/api/projects/{id}/")]
+    assert project["count"] == 1
+    assert project["bytes"] > 0
+    assert snapshot["totals"]["retries"] == sum(1 for r in server.requests if r[3] == 429)
+    paths = get_metrics().dump(tmp_path / "metrics")
+    assert json.loads(paths[0].read_text())["totals"]["count"] == snapshot["totals"]["count"]
+    assert "fedflow_http_requests_total" in paths[1].read_text()
+
+
+
+def test_time_blocked_by_the_rate_limiter(server, monkeypatch):
+    monkeypatch.setattr(featurecloud_api, "RATE_LIMITS", {"featurecloud": (1, 1), "controller": (1, 1)})
+    project_id = server.add_project("USER0")
+    featurecloud_api.query_project(username="USER0", project_id=project_id)
+    # login, project: the second request waits for the budget of the first
+    assert get_metrics().snapshot()["totals"]["blocked"] > 0.1
@@ -0,0 +1,127 @@
+import asyncio
+from pathlib import Path
+import warnings
+
+import httpx
+import pytest
+
+from fedflow import featurecloud_api, featurecloud_api_async
+from benchmarks.mock_server import MockFeatureCloud
+
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    """
+    Three sites on an in-process FeatureCloud, without rate limits.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(featurecloud_api, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(featurecloud_api, "_LIMITERS", {})
+    monkeypatch.setattr(featurecloud_api, "RATE_LIMITS", {"featurecloud": (1000, 1), "controller": (1000, 1)})
+    monkeypatch.setattr(featurecloud_api.AppTable, "_shared", None)
+    monkeypatch.setattr(featurecloud_api_async.AsyncAppTable, "_shared", None)
+    server = MockFeatureCloud(run_time=0.2)
+    for i in range(3):
+        server.add_site(f"USER{i}", password=f"PASS{i}", controller=f"http://site{i}:8000")
+        monkeypatch.setenv(f"USER{i}", f"PASS{i}")
+    with server:
+        yield server
+
+
+
+def test_full_project_flow(server, tmp_path):
+    data = tmp_path / "data.csv"
+    data.write_text("x,y\n1,2\n")
+    project_id, tokens = featurecloud_api.create_project_and_tokens(username="USER0", tool="mean-app", n_participants=2)
+    for i, token in enumerate(tokens, start=1):
+        featurecloud_api.join_project(username=f"USER{i}", token=token, project_id=project_id)
+    # the coordinator contributes first, which sets the project to 'prepare'
+    for i in range(3):
+        featurecloud_api.contribute_data(username=f"USER{i}", project_id=project_id, data_list=[str(data)],
+                                         controller=f"http://site{i}:8000")
+    status = featurecloud_api.monitor_project(username="USER0", project_id=project_id, timeout=10,
+                                              controller="http://site0:8000")
+    assert status == "finished"
+    files = featurecloud_api.download_project(username="USER1", project_id=project_id, out_dir=str(tmp_path / "out"),
+                                              controller="http://site1:8000")
+    assert sorted(Path(f).name for f in files) == [f"p{project_id}_r1_s0.log", f"p{project_id}_r1_s0.zip"]
+    assert Path(files[0]).stat().st_size == server.result_size
+    counts = server.counts()
+    assert counts["POST /api/auth/login/"] == 3
+    assert counts["POST /file-upload/"] == 6
+
+
+
+def test_throttled_requests_are_retried(server):
+    project_id, _ = featurecloud_api.create_project_and_tokens(username="USER0", tool="mean-app", n_participants=0)
+    server.throttle = 0.3
+    server.retry_after = 0.01
+    # reseeded, so that the first request of the query is throttled whatever was sent before
+    server.random.seed(7)
+    assert featurecloud_api.query_project(username="USER0", project_id=project_id) == "ready"
+    throttled = [r for r in server.requests if r[3] == 429]
+    assert throttled
+    assert server.requests[-1][3] == 200
+
+
+
+def test_controller_refuses_connections_while_starting(server):
+    server.controller_delay = 60
+    server.add_site("USER3", controller="http://site3:8000")
+    with pytest.raises(httpx.ConnectError):
+        server.transport().handle_request(httpx.Request("GET", "http://site3:8000/ping/"))
+    assert not featurecloud_api.Controller(host="http://site3:8000").controller_is_running()
+
+
+
+def test_async_users_share_the_catalog_and_entitlements(server):
+    async def run():
+        users = await featurecloud_api_async.login_users(["USER0", "USER1", "USER2"])
+        user = users[0]
+        bought = await user.purchase_app("mean-app")
+        owned = await user.owns_app("mean-app")
+        removed = await user.remove_app("mean-app")
+        for u in users:
+            await u.aclose()
+        return bought, owned, removed
+
+    assert asyncio.run(run()) == (True, True, True)
+    counts = server.counts()
+    # one catalog download for all users
+    assert counts["GET /api/apps/"] == 1
+    # ownership is checked once per operation, a purchase invalidates the cached entitlements
+    assert counts["GET /api/apps/purchase/"] == 2
+    assert counts["POST /api/apps/{id}/purchase/"] == 1
+    assert counts["DELETE /api/apps/{id}/purchase/"] == 1
+
+
+
+def test_async_token_renewal_waits_for_the_limiter(server, monkeypatch):
+    # tokens expire within the safety margin, so every request renews them in the auth flow
+    server.token_ttl = 10
+    project_id, _ = featurecloud_api.create_project_and_tokens(username="USER0", tool="mean-app", n_participants=0)
+    waits = []
+    wait = featurecloud_api_async.AsyncRateLimiter.wait
+
+    async def counting_wait(self):
+        waits.append(1)
+        await wait(self)
+
+    monkeypatch.setattr(featurecloud_api_async.AsyncRateLimiter, "wait", counting_wait)
+
+    async def run():
+        users = await featurecloud_api_async.login_users(["USER0"])
+        logins = server.counts()["POST /api/auth/login/"]
+        waits.clear()
+        statuses = await featurecloud_api_async.query_projects(users, [project_id])
+        await users[0].aclose()
+        return statuses, logins
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        statuses, logins = asyncio.run(run())
+    assert statuses == {project_id: "ready"}
+    # the renewal went through the limiter as well as the query itself
+    assert server.counts()["POST /api/auth/login/"] + server.counts().get("POST /api/auth/token/refresh/", 0) > logins
+    assert len(waits) >= 2
@@ -0,0 +1,75 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from fedflow.featurecloud_api_async import async_wait_for
+from fedflow.utils import DigestCache, file_digest, poll_delays, wait_for
+
+
+
+def test_wait_for_returns_when_condition_met():
+    calls = []
+
+    def condition():
+        calls.append(1)
+        return len(calls) >= 3 and "done"
+
+    assert wait_for(condition, timeout=5, interval=0.01) == "done"
+    assert len(calls) == 3
+
+
+
+def test_wait_for_deadline():
+    with pytest.raises(TimeoutError):
+        wait_for(lambda: False, timeout=0.05, interval=0.01)
+
+
+
+def test_poll_delays_back_off_until_the_deadline(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr("fedflow.utils.time.monotonic", lambda: clock[0])
+    delays = poll_delays(timeout=10, interval=1, backoff=2, max_interval=4)
+    seen = []
+    with pytest.raises(TimeoutError):
+        for delay in delays:
+            seen.append(delay)
+            clock[0] += delay
+    # the last delay is cut short by the deadline
+    assert seen == [1, 2, 4, 3]
+
+
+
+def test_async_wait_for_shares_the_loop():
+    calls = []
+
+    async def condition():
+        calls.append(1)
+        return len(calls) >= 3 and "done"
+
+    assert asyncio.run(async_wait_for(condition, timeout=5, interval=0.01)) == "done"
+    assert len(calls) == 3
+
+    async def never():
+        return False
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(async_wait_for(never, timeout=0.05, interval=0.01))
+
+
+
+def test_file_digest_and_cache(tmp_path):
+    data = tmp_path / "data.bin"
+    data.write_bytes(b"x" * 3000)
+    expected = hashlib.sha256(b"x" * 3000).hexdigest()
+    # the memory-mapped and the buffered path agree
+    assert file_digest(data, mmap_threshold=1) == file_digest(data) == expected
+    cache = DigestCache(path=tmp_path / "digests.json")
+    assert cache.digest(data) == expected
+    cache.save()
+    # unchanged files are not read again
+    cached = DigestCache(path=tmp_path / "digests.json")
+    cached.entries[str(data.resolve())]["sha256"] = "cached"
+    assert cached.digest(data) == "cached"
+    data.write_bytes(b"y")
+    assert cached.digest(data) == hashlib.sha256(b"y").hexdigest()